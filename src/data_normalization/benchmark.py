@@ -0,0 +1,232 @@
+"""
+Load-time and memory benchmarks for the normalized dataset formats.
+
+Normalizes a raw fashion_mnist.npz into every output format (compressed
+.npz, manifest.json + .npy, and TFRecord shards) and measures, in a fresh
+process per format so memory numbers are not shared:
+  - open_s: time until the arrays are usable
+  - first_batch_ms: time to read one random batch of X_train
+  - scan_s: time to read all of X_train once
+  - rss_after_batch_mb / peak_rss_mb: resident memory after the first
+    batch and at the end
+
+    python benchmark.py --input fashion_mnist.npz --batch-size 32
+
+With --mode normalize it instead compares the cost of normalizing into
+each format with whole arrays (chunk_rows 0) and with streaming in chunks
+of --chunk-rows: wall time and peak RSS of a fresh process per run.
+
+    python benchmark.py --mode normalize --chunk-rows 4096 --synthetic-scale 4
+
+With --mode transfer it runs the whole function, normalize_fashion_mnist,
+against an in-memory storage backend that adds --latency-ms to every
+request, once with serial and once with concurrent uploads.
+
+    python benchmark.py --mode transfer --latency-ms 50 --num-shards 16
+
+Without --input a synthetic raw dataset of the Fashion MNIST shape is used,
+with --synthetic-scale times as many images.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from main import OUTPUT_FORMATS, MANIFEST_FILE, NPZ_OUTPUT_FILE, normalize_local, normalize_fashion_mnist
+from storage_io import MAX_WORKERS, MemoryStorage
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark loading of the normalized dataset formats')
+    parser.add_argument('--input', type=str, default=None, help='Raw fashion_mnist.npz (default: synthetic)')
+    parser.add_argument('--mode', type=str, default='load', choices=['load', 'normalize', 'transfer'],
+                        help='Benchmark reading the outputs, producing them, or the whole function')
+    parser.add_argument('--batch-size', type=int, default=32, help='Images in the first-batch read')
+    parser.add_argument('--chunk-rows', type=int, default=4096, help='Rows per chunk in streaming normalization')
+    parser.add_argument('--synthetic-scale', type=int, default=1, help='Multiplier for the synthetic dataset size')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Simulated storage latency per request')
+    parser.add_argument('--num-shards', type=int, default=16, help='TFRecord shards per split in transfer mode')
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS, help='Concurrent uploads in transfer mode')
+    parser.add_argument('--measure', nargs=2, metavar=('FORMAT', 'DIR'), help=argparse.SUPPRESS)
+    parser.add_argument('--measure-normalize', nargs=4, metavar=('FORMAT', 'CHUNK_ROWS', 'INPUT', 'DIR'),
+                        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def write_synthetic_input(path, scale=1):
+    rng = np.random.RandomState(42)
+    np.savez_compressed(
+        path,
+        X_train=rng.randint(0, 256, (48000 * scale, 28, 28), dtype=np.uint8),
+        y_train=rng.randint(0, 10, 48000 * scale).astype(np.uint8),
+        X_val=rng.randint(0, 256, (12000 * scale, 28, 28), dtype=np.uint8),
+        y_val=rng.randint(0, 10, 12000 * scale).astype(np.uint8),
+        X_test=rng.randint(0, 256, (10000 * scale, 28, 28), dtype=np.uint8),
+        y_test=rng.randint(0, 10, 10000 * scale).astype(np.uint8)
+    )
+
+
+def proc_status_mb(field):
+    # VmHWM rather than ru_maxrss: the latter survives exec and would report
+    # the parent's peak
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def read_tfrecord_images(directory, manifest, split):
+    # Fixed-size records: view every shard as rows of framing + label + image + crc
+    image_dtype = np.dtype(manifest['record']['image_dtype'])
+    image_shape = manifest['record']['image_shape']
+    record_size = 12 + 1 + image_dtype.itemsize * int(np.prod(image_shape)) + 4
+    rows = np.concatenate([np.fromfile(os.path.join(directory, shard['file']), np.uint8)
+                           for shard in manifest['splits'][split]['shards']]).reshape(-1, record_size)
+    return rows[:, 13:-4].copy().view(image_dtype).reshape(-1, *image_shape)
+
+
+def open_dataset(output_format, directory):
+    if output_format == 'npz':
+        # Compressed members have to be fully decompressed to be used
+        with np.load(os.path.join(directory, NPZ_OUTPUT_FILE)) as data:
+            return {key: data[key] for key in data.files}
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if output_format == 'tfrecord':
+        return {'X_train': read_tfrecord_images(directory, manifest, 'train')}
+    return {name: np.load(os.path.join(directory, entry['file']), mmap_mode='r')
+            for name, entry in manifest['arrays'].items()}
+
+
+def measure(output_format, directory, batch_size):
+    """Runs in a child process; prints one JSON result."""
+    start = time.perf_counter()
+    arrays = open_dataset(output_format, directory)
+    open_s = time.perf_counter() - start
+
+    X_train = arrays['X_train']
+    indices = np.sort(np.random.RandomState(0).choice(len(X_train), batch_size, replace=False))
+    start = time.perf_counter()
+    batch = X_train[indices]
+    first_batch_ms = (time.perf_counter() - start) * 1000
+    rss_after_batch_mb = proc_status_mb('VmRSS')
+
+    start = time.perf_counter()
+    total = float(np.sum(X_train, dtype=np.float64))
+    scan_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "format": output_format,
+        "open_s": open_s,
+        "first_batch_ms": first_batch_ms,
+        "scan_s": scan_s,
+        "rss_after_batch_mb": rss_after_batch_mb,
+        "peak_rss_mb": proc_status_mb('VmHWM'),
+        "checksum": total + float(batch.sum())
+    }))
+
+
+def measure_normalize(output_format, chunk_rows, input_file, directory):
+    """Runs in a child process; prints one JSON result."""
+    baseline_mb = proc_status_mb('VmRSS')
+    start = time.perf_counter()
+    normalize_local(input_file, directory, output_format, chunk_rows=chunk_rows)
+    print(json.dumps({
+        "format": output_format,
+        "chunk_rows": chunk_rows,
+        "seconds": time.perf_counter() - start,
+        "baseline_rss_mb": baseline_mb,
+        "peak_rss_mb": proc_status_mb('VmHWM')
+    }))
+
+
+def run_child(*args):
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), *args],
+        cwd=os.path.dirname(os.path.abspath(__file__)), text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark_normalize(input_file, temp_dir, chunk_rows):
+    results = []
+    for output_format in OUTPUT_FORMATS:
+        for rows in (0, chunk_rows):
+            output_dir = os.path.join(temp_dir, f"{output_format}-{rows}")
+            os.makedirs(output_dir)
+            results.append(run_child('--measure-normalize', output_format, str(rows), input_file, output_dir))
+            shutil.rmtree(output_dir)
+    return results
+
+
+def benchmark_transfer(input_file, args):
+    with open(input_file, 'rb') as f:
+        raw = f.read()
+    results = []
+    for output_format in OUTPUT_FORMATS:
+        for max_workers in (1, args.max_workers):
+            storage = MemoryStorage({'gs://bench/data/fashion_mnist.npz': raw,
+                                     'gs://bench/data/class_names.json': b'[]'},
+                                    latency=args.latency_ms / 1000, max_workers=max_workers)
+            start = time.perf_counter()
+            normalize_fashion_mnist('gs://bench/data/fashion_mnist.npz', 'gs://bench/data_normalized',
+                                    output_format, num_shards=args.num_shards, storage=storage)
+            results.append({
+                "format": output_format,
+                "max_workers": max_workers,
+                "objects_written": len(storage.objects) - 2,
+                "seconds": time.perf_counter() - start
+            })
+    return results
+
+
+def main():
+    args = parse_args()
+    if args.measure:
+        measure(args.measure[0], args.measure[1], args.batch_size)
+        return
+    if args.measure_normalize:
+        output_format, chunk_rows, input_file, directory = args.measure_normalize
+        measure_normalize(output_format, int(chunk_rows), input_file, directory)
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = args.input
+        if input_file is None:
+            input_file = os.path.join(temp_dir, 'fashion_mnist.npz')
+            write_synthetic_input(input_file, args.synthetic_scale)
+
+        if args.mode == 'transfer':
+            print(json.dumps(benchmark_transfer(input_file, args), indent=2))
+            return
+
+        if args.mode == 'normalize':
+            results = {
+                "input_mb": os.path.getsize(input_file) / (1024 * 1024),
+                "runs": benchmark_normalize(input_file, temp_dir, args.chunk_rows)
+            }
+            print(json.dumps(results, indent=2))
+            return
+
+        results = []
+        for output_format in OUTPUT_FORMATS:
+            output_dir = os.path.join(temp_dir, output_format)
+            os.makedirs(output_dir)
+            normalize_local(input_file, output_dir, output_format)
+            size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+
+            result = run_child('--measure', output_format, output_dir, '--batch-size', str(args.batch_size))
+            result["size_mb"] = size / (1024 * 1024)
+            results.append(result)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,12 +10,39 @@ Trigger: Cloud Storage (finalize/create) or HTTP trigger
 
 import numpy as np
 import os
+import re
+import struct
+import hashlib
+import zipfile
 import logging
 import tempfile
-from google.cloud import storage
+import google_crc32c
 import functions_framework
 import json
 import datetime
+from storage_io import GCSStorage
+
+# Output layouts; the storage trigger uses OUTPUT_FORMAT from the environment
+OUTPUT_FORMATS = ("npz", "npy", "tfrecord")
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "npz")
+NPZ_OUTPUT_FILE = "fashion_mnist_normalized.npz"
+MANIFEST_FILE = "manifest.json"
+
+# TFRecord shards written per split with output format "tfrecord"
+NUM_SHARDS = int(os.environ.get("NUM_SHARDS", 8))
+TFRECORD_SHARD_NAME = re.compile(r"(?P<split>.+)-\d{5}-of-\d{5}\.tfrecord")
+
+# Streaming mode: rows converted per step (0 loads whole arrays)
+CHUNK_ROWS = int(os.environ.get("CHUNK_ROWS", 0))
+
+# Pixel normalization: model input = (pixel - PIXEL_OFFSET) / PIXEL_SCALE.
+# With storage dtype "uint8" images are stored as-is and the scale/offset
+# are recorded instead (npz members pixel_scale/pixel_offset, or the
+# manifest's "normalization" entry) for consumers to apply per batch.
+STORAGE_DTYPES = ("float32", "uint8")
+STORAGE_DTYPE = os.environ.get("STORAGE_DTYPE", "float32")
+PIXEL_SCALE = 255.0
+PIXEL_OFFSET = 0.0
 
 # Configure logging
 logging.basicConfig(
@@ -24,125 +51,629 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def download_from_gcs(gcs_path, local_path):
-    """Download a file from Google Cloud Storage to local filesystem."""
-    # Parse the GCS path
-    if not gcs_path.startswith('gs://'):
-        raise ValueError(f"Invalid GCS path: {gcs_path}. Must start with 'gs://'")
-    
-    path_parts = gcs_path[5:].split('/', 1)
-    if len(path_parts) < 2:
-        raise ValueError(f"Invalid GCS path: {gcs_path}. Must be in format 'gs://bucket/path'")
-    
-    bucket_name = path_parts[0]
-    blob_name = path_parts[1]
-    
-    # Create a storage client
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(local_path), exist_ok=True)
-    
-    # Download the blob
-    logger.info(f"Downloading {gcs_path} to {local_path}")
-    blob.download_to_filename(local_path)
-    logger.info(f"Download complete")
-
-def upload_to_gcs(local_path, gcs_path):
-    """Upload a file from local filesystem to Google Cloud Storage."""
-    # Parse the GCS path
-    if not gcs_path.startswith('gs://'):
-        raise ValueError(f"Invalid GCS path: {gcs_path}. Must start with 'gs://'")
-    
-    path_parts = gcs_path[5:].split('/', 1)
-    if len(path_parts) < 2:
-        raise ValueError(f"Invalid GCS path: {gcs_path}. Must be in format 'gs://bucket/path'")
-    
-    bucket_name = path_parts[0]
-    blob_name = path_parts[1]
-    
-    # Create a storage client
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    
-    # Upload the blob
-    logger.info(f"Uploading {local_path} to {gcs_path}")
-    blob.upload_from_filename(local_path)
-    logger.info(f"Upload complete")
-
-def normalize_dataset(dataset):
-    """Normalize dataset by converting to float32 and scaling to [0,1]."""
+# Storage backend shared by every invocation in this instance, so the
+# Cloud Storage client and its connections are reused
+default_storage = GCSStorage()
+
+def normalize_array(key, array, storage_dtype="float32"):
+    """Normalize one array, or a chunk of its rows, as normalize_dataset does."""
+    if key.startswith('X_') and storage_dtype == "uint8":
+        return array.astype('uint8', copy=False)
+    if key.startswith('X_'):
+        # Convert to float32 and normalize to [0,1]
+        return array.astype('float32') / 255.0
+    # Keep labels as they are
+    return array
+
+def normalize_dataset(dataset, storage_dtype="float32"):
+    """Prepare the image arrays for storage as `storage_dtype`; labels pass through unchanged.
+    
+    With storage_dtype "float32" images are converted to float32 and scaled
+    to [0,1]. With "uint8" they are stored as uint8 pixels together with
+    PIXEL_SCALE and PIXEL_OFFSET, and consumers apply
+    (pixel - PIXEL_OFFSET) / PIXEL_SCALE when they read a batch.
+    """
     logger.info("Normalizing dataset")
     normalized = {}
     
     # Normalize image data (X arrays)
     for key in dataset.keys():
-        if key.startswith('X_'):
-            # Convert to float32 and normalize to [0,1]
-            normalized[key] = dataset[key].astype('float32') / 255.0
+        normalized[key] = normalize_array(key, dataset[key], storage_dtype)
+        if key.startswith('X_') and storage_dtype == "uint8":
+            logger.info(f"Kept {key} as uint8 with scale={PIXEL_SCALE}, offset={PIXEL_OFFSET}: "
+                        f"shape={normalized[key].shape}")
+        elif key.startswith('X_'):
             logger.info(f"Normalized {key}: shape={normalized[key].shape}, dtype={normalized[key].dtype}")
         else:
-            # Keep labels as they are
-            normalized[key] = dataset[key]
             logger.info(f"Kept {key} unchanged: shape={normalized[key].shape}, dtype={normalized[key].dtype}")
     
     return normalized
 
-def normalize_fashion_mnist(input_path, output_path):
-    """Main function to normalize Fashion MNIST dataset."""
+def new_manifest(output_format, storage_dtype="float32"):
+    """manifest.json fields shared by the "npy" and "tfrecord" layouts."""
+    return {
+        "format": output_format,
+        "created": datetime.datetime.now().isoformat(),
+        "normalization": {
+            "scale": PIXEL_SCALE,
+            "offset": PIXEL_OFFSET,
+            "applied": storage_dtype != "uint8"
+        }
+    }
+
+def save_npz_manifest(output_dir, storage_dtype="float32"):
+    """
+    Write the manifest.json of the "npz" layout, which records the
+    normalization and, once uploaded, the source it was made from.
+    
+    Returns:
+        str: The manifest's file name
+    """
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(dict(new_manifest("npz", storage_dtype), file=NPZ_OUTPUT_FILE), f, indent=2)
+    return MANIFEST_FILE
+
+def save_npy_dataset(dataset, output_dir, storage_dtype="float32"):
+    """
+    Save each array as an uncompressed .npy file plus a manifest.json index.
+    
+    Unlike a compressed .npz, every file can be opened with
+    np.load(path, mmap_mode='r'), so consumers page in only the samples
+    they touch instead of decompressing whole arrays into memory.
+    
+    Returns:
+        list: Names of the files written, manifest last
+    """
+    manifest = dict(new_manifest("npy", storage_dtype), arrays={})
+    files = []
+    for key, array in dataset.items():
+        file_name = f"{key}.npy"
+        np.save(os.path.join(output_dir, file_name), np.ascontiguousarray(array))
+        manifest["arrays"][key] = {
+            "file": file_name,
+            "shape": list(array.shape),
+            "dtype": str(array.dtype),
+            "bytes": int(array.nbytes)
+        }
+        files.append(file_name)
+    
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    files.append(MANIFEST_FILE)
+    
+    return files
+
+def _masked_crc32c(data):
+    """CRC32C of `data`, masked as in the TFRecord framing."""
+    crc = google_crc32c.value(data)
+    return (((crc >> 15) | (crc << 17)) + 0xa282ead8) & 0xffffffff
+
+def write_tfrecord_shard(path, chunks):
+    """
+    Write one TFRecord file with a record per sample, without TensorFlow.
+    
+    Each record is framed as uint64 length, masked CRC32C of the length,
+    payload, masked CRC32C of the payload (all little-endian), so
+    tf.data.TFRecordDataset reads and verifies it. The payload is the label
+    as one uint8 byte followed by the raw image bytes.
+    
+    Args:
+        path (str): Output file
+        chunks: Iterable of (labels, images) arrays, written in order
+    
+    Returns:
+        tuple: (number of bytes written, sha256 hex digest of the file)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        for labels, images in chunks:
+            if not len(labels):
+                continue
+            if labels.min() < 0 or labels.max() > 255:
+                raise ValueError(f"Labels written to {path} do not fit in one byte")
+            header = struct.pack('<Q', 1 + images[0].nbytes)
+            header += struct.pack('<I', _masked_crc32c(header))
+            for label, image in zip(labels.astype('uint8'), images):
+                payload = label.tobytes() + np.ascontiguousarray(image).tobytes()
+                record = header + payload + struct.pack('<I', _masked_crc32c(payload))
+                f.write(record)
+                digest.update(record)
+                size += len(record)
+    
+    return size, digest.hexdigest()
+
+def shard_ranges(num_rows, num_shards):
+    """(start, stop) rows of each shard; contiguous, sizes differing by at most one."""
+    num_shards = max(1, min(num_shards, num_rows))
+    bounds = np.cumsum([0] + [len(part) for part in np.array_split(np.arange(num_rows), num_shards)])
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+def tfrecord_shard_name(split, index, num_shards):
+    return f"{split}-{index:05d}-of-{num_shards:05d}.tfrecord"
+
+def stale_shards(file_names, manifest):
+    """
+    The TFRecord shards among `file_names` of a split in `manifest` that its shard lists do not name.
+    
+    A run with another shard count writes new `-of-NNNNN` names; the
+    previous layout's shards would otherwise stay next to them, where a
+    glob over the directory picks them up.
+    """
+    listed = {shard["file"] for entry in manifest["splits"].values() for shard in entry["shards"]}
+    stale = []
+    for file_name in file_names:
+        match = TFRECORD_SHARD_NAME.fullmatch(file_name)
+        if match and match.group("split") in manifest["splits"] and file_name not in listed:
+            stale.append(file_name)
+    return stale
+
+def remove_stale_shards(output_dir, manifest):
+    """Delete the shards in `output_dir` that `manifest` no longer lists."""
+    for file_name in stale_shards(os.listdir(output_dir), manifest):
+        logger.info(f"Removing stale TFRecord shard {file_name}")
+        os.remove(os.path.join(output_dir, file_name))
+
+def save_tfrecord_dataset(dataset, output_dir, num_shards=NUM_SHARDS, storage_dtype="float32"):
+    """
+    Save every split as `num_shards` TFRecord files plus a manifest.json index.
+    
+    Shards hold contiguous slices of a split, so multi-worker or parallel
+    readers can each take a disjoint subset of files. The manifest lists the
+    record layout and, per split, each shard's file, sample count, size and
+    sha256. Shards of an earlier layout of the same splits are deleted.
+    
+    Returns:
+        list: Names of the files written, manifest last
+    """
+    splits = [key[2:] for key in dataset if key.startswith('X_')]
+    manifest = dict(new_manifest("tfrecord", storage_dtype), record={
+        "label_dtype": "uint8",
+        "image_dtype": str(dataset[f"X_{splits[0]}"].dtype),
+        "image_shape": list(dataset[f"X_{splits[0]}"].shape[1:])
+    }, splits={})
+    files = []
+    for split in splits:
+        images, labels = dataset[f"X_{split}"], dataset[f"y_{split}"]
+        ranges = shard_ranges(len(images), num_shards)
+        shards = []
+        for index, (start, stop) in enumerate(ranges):
+            file_name = tfrecord_shard_name(split, index, len(ranges))
+            size, sha256 = write_tfrecord_shard(
+                os.path.join(output_dir, file_name), [(labels[start:stop], images[start:stop])]
+            )
+            shards.append({"file": file_name, "count": stop - start, "bytes": size, "sha256": sha256})
+            files.append(file_name)
+        manifest["splits"][split] = {"count": len(images), "shards": shards}
+        logger.info(f"Wrote {split} split as {len(ranges)} TFRecord shards ({len(images)} records)")
+    
+    remove_stale_shards(output_dir, manifest)
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    files.append(MANIFEST_FILE)
+    
+    return files
+
+def check_output_options(output_format, storage_dtype):
+    """Raise ValueError for an unknown output format or storage dtype."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output_format: {output_format}. Must be one of {OUTPUT_FORMATS}")
+    if storage_dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown storage_dtype: {storage_dtype}. Must be one of {STORAGE_DTYPES}")
+
+def read_npy_header(f):
+    """
+    Read the header of a .npy stream, leaving `f` at the start of the data.
+    
+    Returns:
+        tuple: (shape, dtype)
+    """
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    if fortran_order or dtype.hasobject:
+        raise ValueError("Streaming supports C-ordered arrays without objects only")
+    return shape, dtype
+
+def write_npy_header(f, shape, dtype):
+    """Write a .npy header so the data can follow in chunks."""
+    np.lib.format.write_array_header_1_0(f, {
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "fortran_order": False,
+        "shape": tuple(shape)
+    })
+
+def read_rows(f, shape, dtype, count):
+    """Read the next `count` rows of an array from a .npy stream past its header."""
+    row_shape = shape[1:]
+    nbytes = count * dtype.itemsize * int(np.prod(row_shape, dtype=np.int64))
+    data = f.read(nbytes)
+    if len(data) != nbytes:
+        raise ValueError("Unexpected end of array data")
+    return np.frombuffer(data, dtype=dtype).reshape((count,) + tuple(row_shape))
+
+def iter_row_chunks(f, shape, dtype, chunk_rows, start=0, stop=None):
+    """Yield rows start..stop of a .npy stream (read sequentially) in chunks."""
+    if not shape:
+        yield np.frombuffer(f.read(dtype.itemsize), dtype=dtype).reshape(())
+        return
+    stop = shape[0] if stop is None else stop
+    for begin in range(start, stop, chunk_rows):
+        yield read_rows(f, shape, dtype, min(chunk_rows, stop - begin))
+
+def normalize_stream(source, output_dir, output_format="npz", storage_dtype="float32",
+                     num_shards=NUM_SHARDS, chunk_rows=4096, keys=None):
+    """
+    Normalize a raw .npz from a file object, `chunk_rows` rows at a time.
+    
+    Archive members are decompressed incrementally and every output file is
+    written as its chunks are converted, so peak memory is set by
+    `chunk_rows` rather than by the dataset size. The output is identical
+    to normalize_local without chunking.
+    
+    Args:
+        source: Seekable binary file object of the raw .npz, e.g. a local
+            file or an object opened with Storage.open
+        output_dir (str): Directory for the output files
+        output_format (str): "npz", "npy" or "tfrecord", as in normalize_local
+        storage_dtype (str): "float32" or "uint8", as in normalize_local
+        num_shards (int): TFRecord shards per split with output_format "tfrecord"
+        chunk_rows (int): Rows converted per step
+        keys (list): Arrays to normalize (default: all)
+    
+    Returns:
+        list: Names of the files written to `output_dir`
+    """
+    check_output_options(output_format, storage_dtype)
+    with zipfile.ZipFile(source) as archive:
+        headers = {}
+        for member in archive.namelist():
+            if keys is None or member[:-len('.npy')] in keys:
+                with archive.open(member) as f:
+                    headers[member[:-len('.npy')]] = read_npy_header(f)
+        logger.info(f"Streaming dataset with keys: {list(headers)} in chunks of {chunk_rows} rows")
+        
+        def open_array(key):
+            f = archive.open(f"{key}.npy")
+            read_npy_header(f)
+            return f
+        
+        def output_dtype(key):
+            return normalize_array(key, np.empty(0, headers[key][1]), storage_dtype).dtype
+        
+        if output_format == "tfrecord":
+            splits = [key[2:] for key in headers if key.startswith('X_')]
+            manifest = dict(new_manifest("tfrecord", storage_dtype), record={
+                "label_dtype": "uint8",
+                "image_dtype": str(output_dtype(f"X_{splits[0]}")),
+                "image_shape": list(headers[f"X_{splits[0]}"][0][1:])
+            }, splits={})
+            files = []
+            for split in splits:
+                (x_shape, x_dtype), (y_shape, y_dtype) = headers[f"X_{split}"], headers[f"y_{split}"]
+                ranges = shard_ranges(x_shape[0], num_shards)
+                shards = []
+                # Labels are small, so read them whole before streaming the
+                # images: alternating between two members of a remote
+                # archive would cost a ranged GET on every switch
+                with open_array(f"y_{split}") as y_file:
+                    labels = read_rows(y_file, y_shape, y_dtype, y_shape[0])
+                with open_array(f"X_{split}") as x_file:
+                    for index, (start, stop) in enumerate(ranges):
+                        file_name = tfrecord_shard_name(split, index, len(ranges))
+                        chunks = ((labels[begin:begin + len(images)],
+                                   normalize_array(f"X_{split}", images, storage_dtype))
+                                  for begin, images in zip(
+                                      range(start, stop, chunk_rows),
+                                      iter_row_chunks(x_file, x_shape, x_dtype, chunk_rows, start, stop)))
+                        size, sha256 = write_tfrecord_shard(os.path.join(output_dir, file_name), chunks)
+                        shards.append({"file": file_name, "count": stop - start, "bytes": size, "sha256": sha256})
+                        files.append(file_name)
+                manifest["splits"][split] = {"count": x_shape[0], "shards": shards}
+                logger.info(f"Wrote {split} split as {len(ranges)} TFRecord shards ({x_shape[0]} records)")
+            
+            remove_stale_shards(output_dir, manifest)
+            with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            return files + [MANIFEST_FILE]
+        
+        def write_array(out, key):
+            shape, dtype = headers[key]
+            write_npy_header(out, shape, output_dtype(key))
+            with open_array(key) as f:
+                for chunk in iter_row_chunks(f, shape, dtype, chunk_rows):
+                    out.write(normalize_array(key, chunk, storage_dtype).tobytes())
+            logger.info(f"Streamed {key}: shape={shape}, dtype={output_dtype(key)}")
+        
+        if output_format == "npy":
+            manifest = dict(new_manifest("npy", storage_dtype), arrays={})
+            for key, (shape, _) in headers.items():
+                with open(os.path.join(output_dir, f"{key}.npy"), 'wb') as out:
+                    write_array(out, key)
+                dtype = output_dtype(key)
+                manifest["arrays"][key] = {
+                    "file": f"{key}.npy",
+                    "shape": list(shape),
+                    "dtype": str(dtype),
+                    "bytes": int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+                }
+            with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            return [manifest["arrays"][key]["file"] for key in headers] + [MANIFEST_FILE]
+        
+        # Same archive layout as np.savez_compressed, one member at a time
+        with zipfile.ZipFile(os.path.join(output_dir, NPZ_OUTPUT_FILE), 'w',
+                             compression=zipfile.ZIP_DEFLATED, allowZip64=True) as npz:
+            for key in headers:
+                with npz.open(f"{key}.npy", 'w', force_zip64=True) as out:
+                    write_array(out, key)
+            if storage_dtype == "uint8":
+                for key, value in (("pixel_scale", PIXEL_SCALE), ("pixel_offset", PIXEL_OFFSET)):
+                    with npz.open(f"{key}.npy", 'w') as out:
+                        np.lib.format.write_array(out, np.array(value))
+        return [NPZ_OUTPUT_FILE, save_npz_manifest(output_dir, storage_dtype)]
+
+def normalize_local(input_file, output_dir, output_format="npz", storage_dtype="float32",
+                    num_shards=NUM_SHARDS, chunk_rows=CHUNK_ROWS, keys=None):
+    """
+    Normalize a local fashion_mnist.npz into `output_dir`.
+    
+    Args:
+        input_file (str): Path of the raw .npz
+        output_dir (str): Directory for the output files
+        output_format (str): "npz" for a single compressed archive,
+            "npy" for one memory-mappable .npy per array plus manifest.json,
+            or "tfrecord" for sharded TFRecord files per split plus manifest.json
+        storage_dtype (str): "float32" to store scaled images, or "uint8" to
+            store raw pixels plus the scale/offset (4x smaller)
+        num_shards (int): TFRecord shards per split with output_format "tfrecord"
+        chunk_rows (int): If > 0, stream the arrays in chunks of this many
+            rows with bounded memory (see normalize_stream)
+        keys (list): Arrays to normalize (default: all); the output then
+            covers only these, for incremental updates
+    
+    Returns:
+        list: Names of the files written to `output_dir`
+    """
+    check_output_options(output_format, storage_dtype)
+    
+    if chunk_rows > 0:
+        with open(input_file, 'rb') as source:
+            return normalize_stream(source, output_dir, output_format, storage_dtype, num_shards, chunk_rows, keys)
+    
+    # Load the dataset
+    logger.info(f"Loading dataset from {input_file}")
+    with np.load(input_file) as data:
+        dataset = {key: data[key] for key in data.files if keys is None or key in keys}
+    logger.info(f"Dataset loaded with keys: {dataset.keys()}")
+    
+    # Normalize the dataset
+    normalized_dataset = normalize_dataset(dataset, storage_dtype)
+    
+    # Save the normalized dataset locally
+    if output_format == "npy":
+        logger.info(f"Saving normalized dataset as .npy files to {output_dir}")
+        return save_npy_dataset(normalized_dataset, output_dir, storage_dtype)
+    if output_format == "tfrecord":
+        logger.info(f"Saving normalized dataset as TFRecord shards to {output_dir}")
+        return save_tfrecord_dataset(normalized_dataset, output_dir, num_shards, storage_dtype)
+    
+    if storage_dtype == "uint8":
+        normalized_dataset["pixel_scale"] = np.array(PIXEL_SCALE)
+        normalized_dataset["pixel_offset"] = np.array(PIXEL_OFFSET)
+    local_output_file = os.path.join(output_dir, NPZ_OUTPUT_FILE)
+    logger.info(f"Saving normalized dataset to {local_output_file}")
+    np.savez_compressed(local_output_file, **normalized_dataset)
+    return [NPZ_OUTPUT_FILE, save_npz_manifest(output_dir, storage_dtype)]
+
+def source_checksums(source):
+    """
+    Per-array CRC-32 and size of a raw .npz file object.
+    
+    They come from the zip central directory at the end of the file, so
+    nothing is decompressed and only the tail of a remote object is read.
+    """
+    with zipfile.ZipFile(source) as archive:
+        return {info.filename[:-len('.npy')]: {"crc32": info.CRC, "bytes": info.file_size}
+                for info in archive.infolist()}
+
+def read_manifest(storage, uri):
+    """The JSON manifest at `uri`, or None if there is none."""
+    if storage.stat(uri) is None:
+        return None
+    with storage.open(uri) as f:
+        return json.load(f)
+
+def plan_update(source, previous, options):
+    """
+    Decide which arrays to normalize, given the manifest of the previous run.
+    
+    Arrays whose CRC-32 matches the previous run's source keep their output
+    when the layout allows it: per array for "npy", per split (images and
+    labels together) for "tfrecord". A single "npz" archive is rewritten
+    whenever any array changed.
+    
+    Returns:
+        tuple: (arrays to normalize, arrays whose previous output is reused)
+    """
+    keys = list(source["arrays"])
+    previous_source = (previous or {}).get("source")
+    if (previous_source is None or previous.get("options") != options
+            or set(previous_source["arrays"]) != set(keys)):
+        return keys, []
+    
+    changed = {key for key in keys if previous_source["arrays"][key] != source["arrays"][key]}
+    if options["output_format"] == "npz" and changed:
+        return keys, []
+    if options["output_format"] == "tfrecord":
+        changed |= {f"{prefix}_{key[2:]}" for key in changed for prefix in ("X", "y")}
+    return [key for key in keys if key in changed], [key for key in keys if key not in changed]
+
+def merge_manifest(manifest, previous, reused, source, options):
+    """Add the reused outputs of the previous run and the source record to a manifest."""
+    keys = list(source["arrays"])
+    if options["output_format"] == "npy":
+        arrays = dict(manifest.get("arrays", {}))
+        manifest["arrays"] = {key: previous["arrays"][key] if key in reused else arrays[key] for key in keys}
+    elif options["output_format"] == "tfrecord":
+        splits = dict(manifest.get("splits", {}))
+        manifest["splits"] = {key[2:]: previous["splits"][key[2:]] if key in reused else splits[key[2:]]
+                              for key in keys if key.startswith('X_')}
+    manifest["options"] = options
+    manifest["source"] = source
+    return manifest
+
+def normalize_fashion_mnist(input_path, output_path, output_format="npz", storage_dtype="float32",
+                            num_shards=NUM_SHARDS, chunk_rows=CHUNK_ROWS, storage=None, force=False):
+    """
+    Main function to normalize Fashion MNIST dataset.
+    
+    The output manifest records the source object's generation, MD5 and
+    per-array CRC-32. A run whose source generation or MD5 matches the
+    existing manifest (a duplicate event, or a re-upload of the same
+    content) is skipped; otherwise only the arrays that changed are
+    normalized and uploaded, unless `force` is set.
+    
+    `storage` is the backend for the gs:// paths (default: the shared
+    GCSStorage); a LocalStorage or MemoryStorage can stand in for it.
+    """
+    storage = storage or default_storage
+    options = {
+        "output_format": output_format,
+        "storage_dtype": storage_dtype,
+        "num_shards": num_shards if output_format == "tfrecord" else None
+    }
+    gcs_output_file = os.path.join(output_path, NPZ_OUTPUT_FILE if output_format == "npz" else MANIFEST_FILE)
+    result = {
+        "status": "success",
+        "input_path": input_path,
+        "output_path": output_path,
+        "normalized_file": gcs_output_file,
+        "output_format": output_format,
+        "storage_dtype": storage_dtype,
+        "num_shards": options["num_shards"],
+        "chunk_rows": chunk_rows
+    }
+    
+    # Compare the source with the one the existing output was made from
+    source_stat = storage.stat(input_path)
+    if source_stat is None:
+        raise FileNotFoundError(f"No such object: {input_path}")
+    previous = None if force else read_manifest(storage, os.path.join(output_path, MANIFEST_FILE))
+    previous_source = (previous or {}).get("source", {})
+    if previous is not None and previous.get("options") == options and (
+            previous_source.get("generation") == source_stat["generation"]
+            or (source_stat["md5"] and previous_source.get("md5") == source_stat["md5"])):
+        logger.info(f"{gcs_output_file} is up to date with {input_path}; skipping")
+        return dict(result, status="skipped", processed_arrays=[], reused_arrays=[],
+                    timestamp=datetime.datetime.now().isoformat())
+    
+    with storage.open(input_path) as source_file:
+        source = dict(uri=input_path, generation=source_stat["generation"], md5=source_stat["md5"],
+                      arrays=source_checksums(source_file))
+    keys, reused = plan_update(source, previous, options)
+    if reused:
+        logger.info(f"Unchanged since the last run, keeping their output: {reused}")
+    
     # Create temporary directory
     with tempfile.TemporaryDirectory() as temp_dir:
         # Define local paths
         local_input_file = os.path.join(temp_dir, "fashion_mnist.npz")
-        local_output_file = os.path.join(temp_dir, "fashion_mnist_normalized.npz")
-        
-        # Download the dataset
-        download_from_gcs(input_path, local_input_file)
+        local_output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(local_output_dir)
         
-        # Load the dataset
-        logger.info(f"Loading dataset from {local_input_file}")
-        dataset = dict(np.load(local_input_file))
-        logger.info(f"Dataset loaded with keys: {dataset.keys()}")
-        
-        # Normalize the dataset
-        normalized_dataset = normalize_dataset(dataset)
-        
-        # Save the normalized dataset locally
-        logger.info(f"Saving normalized dataset to {local_output_file}")
-        np.savez_compressed(local_output_file, **normalized_dataset)
+        if not keys:
+            # New object, same arrays: only the manifest's source record changes
+            output_files = [MANIFEST_FILE]
+            with open(os.path.join(local_output_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(previous, f)
+        elif chunk_rows > 0:
+            # Read the archive straight from Cloud Storage, chunk by chunk,
+            # instead of downloading it first
+            with storage.open(input_path) as source_file:
+                output_files = normalize_stream(
+                    source_file, local_output_dir, output_format, storage_dtype, num_shards, chunk_rows, keys
+                )
+        else:
+            # Download the dataset
+            storage.download(input_path, local_input_file)
+            
+            # Normalize and save locally
+            output_files = normalize_local(
+                local_input_file, local_output_dir, output_format, storage_dtype, num_shards, 0, keys
+            )
         
-        # Upload to GCS
-        gcs_output_file = os.path.join(output_path, "fashion_mnist_normalized.npz")
-        upload_to_gcs(local_output_file, gcs_output_file)
+        # Record the source, and the outputs kept from the previous run
+        manifest_path = os.path.join(local_output_dir, MANIFEST_FILE)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        with open(manifest_path, 'w') as f:
+            json.dump(merge_manifest(manifest, previous, reused, source, options), f, indent=2)
         
-        # Create and upload class names file if it exists
+        # Copy the class names file if it exists, server-side
         class_names_input = input_path.rsplit('/', 1)[0] + "/class_names.json"
-        class_names_local = os.path.join(temp_dir, "class_names.json")
         class_names_output = os.path.join(output_path, "class_names.json")
         
         try:
-            download_from_gcs(class_names_input, class_names_local)
-            upload_to_gcs(class_names_local, class_names_output)
+            storage.copy(class_names_input, class_names_output)
             logger.info(f"Copied class_names.json to {class_names_output}")
         except Exception as e:
             logger.warning(f"Could not copy class_names.json: {e}")
         
         # Create a README file
+        if output_format == "npy":
+            files_section = ("- `manifest.json`: Index of the arrays below (file, shape, dtype, bytes)\n"
+                             "- One uncompressed `<name>.npy` per array, memory-mappable:")
+            load_snippet = ("data = {name: np.load(f'{name}.npy', mmap_mode='r')\n"
+                            "        for name in ['X_train', 'y_train', 'X_val', 'y_val', 'X_test', 'y_test']}")
+        elif output_format == "tfrecord":
+            files_section = ("- `manifest.json`: Record layout, plus each split's shards (file, count, bytes, sha256)\n"
+                             "- `<split>-NNNNN-of-NNNNN.tfrecord`: TFRecord shards; each record is the label "
+                             "as one uint8 byte followed by the raw image bytes. The splits decode to:")
+            load_snippet = ("import json\n"
+                            "manifest = json.load(open('manifest.json'))\n"
+                            "# Stream with tf.data: read the files of manifest['splits'][split]['shards']\n"
+                            "# (not a glob) with tf.data.TFRecordDataset and decode with tf.io.decode_raw,\n"
+                            "# or read them with numpy:\n"
+                            "image_dtype = np.dtype(manifest['record']['image_dtype'])\n"
+                            "record_size = 12 + 1 + 28 * 28 * image_dtype.itemsize + 4  # framing, label, image, crc\n"
+                            "data = {}\n"
+                            "for split, entry in manifest['splits'].items():\n"
+                            "    rows = np.concatenate([np.fromfile(shard['file'], np.uint8)\n"
+                            "                           for shard in entry['shards']]).reshape(-1, record_size)\n"
+                            "    data[f'X_{split}'] = rows[:, 13:-4].copy().view(image_dtype).reshape(-1, 28, 28)\n"
+                            "    data[f'y_{split}'] = rows[:, 12].copy()")
+        else:
+            files_section = (f"- `manifest.json`: Normalization, and the source this output was made from\n"
+                             f"- `{NPZ_OUTPUT_FILE}`: Contains the following arrays:")
+            load_snippet = f"data = np.load('{NPZ_OUTPUT_FILE}')"
+        if storage_dtype == "uint8":
+            scale_record = "the manifest's `normalization` entry" if output_format in ("npy", "tfrecord") \
+                else "the `pixel_scale` and `pixel_offset` arrays"
+            image_desc = "raw pixels, dtype=uint8"
+            access_note = f"# uint8; use (x - {PIXEL_OFFSET}) / {PIXEL_SCALE} per batch"
+            preprocessing = (f"- Data type: uint8 on disk (4x smaller), float32 after scaling\n"
+                             f"- Normalization: applied by consumers per batch as (pixel - {PIXEL_OFFSET}) / {PIXEL_SCALE}, "
+                             f"recorded in {scale_record}")
+        else:
+            image_desc = "normalized to [0,1] range, dtype=float32"
+            access_note = "# Already normalized to [0,1]"
+            preprocessing = ("- Data type: float32\n"
+                             "- Normalization: Pixel values divided by 255 to scale from [0,255] to [0,1]")
         readme_local = os.path.join(temp_dir, "README.md")
         readme_content = f"""# Normalized Fashion MNIST Dataset
 
 This directory contains the normalized version of the Fashion MNIST dataset.
 
 ## Files
-- `fashion_mnist_normalized.npz`: Contains the following arrays:
-  - X_train: Training images, normalized to [0,1] range, dtype=float32
+{files_section}
+  - X_train: Training images, {image_desc}
   - y_train: Training labels
-  - X_val: Validation images, normalized to [0,1] range, dtype=float32
+  - X_val: Validation images, {image_desc}
   - y_val: Validation labels
-  - X_test: Test images, normalized to [0,1] range, dtype=float32
+  - X_test: Test images, {image_desc}
   - y_test: Test labels
 
 ## Usage
@@ -150,20 +681,19 @@ This directory contains the normalized version of the Fashion MNIST dataset.
 import numpy as np
 
 # Load the dataset
-data = np.load('fashion_mnist_normalized.npz')
+{load_snippet}
 
 # Access the arrays
-X_train = data['X_train']  # Already normalized to [0,1]
+X_train = data['X_train']  {access_note}
 y_train = data['y_train']
-X_val = data['X_val']      # Already normalized to [0,1]
+X_val = data['X_val']      {access_note}
 y_val = data['y_val']
-X_test = data['X_test']    # Already normalized to [0,1]
+X_test = data['X_test']    {access_note}
 y_test = data['y_test']
 ```
 
 ## Preprocessing
-- Data type: float32
-- Normalization: Pixel values divided by 255 to scale from [0,255] to [0,1]
+{preprocessing}
 - Shape: 28x28 pixels (original dimensions preserved)
 
 Created: {datetime.datetime.now().isoformat()}
@@ -172,18 +702,29 @@ Created: {datetime.datetime.now().isoformat()}
         with open(readme_local, 'w') as f:
             f.write(readme_content)
         
-        # Upload README
+        # Upload the data files and README concurrently, then the manifest,
+        # so a manifest is never visible before the files it lists
         readme_output = os.path.join(output_path, "README.md")
-        upload_to_gcs(readme_local, readme_output)
-        logger.info(f"Created and uploaded README.md to {readme_output}")
+        data_files = [file_name for file_name in output_files if file_name != MANIFEST_FILE]
+        storage.upload_many(
+            [(os.path.join(local_output_dir, file_name), os.path.join(output_path, file_name))
+             for file_name in data_files] + [(readme_local, readme_output)]
+        )
+        storage.upload(os.path.join(local_output_dir, MANIFEST_FILE), os.path.join(output_path, MANIFEST_FILE))
+        logger.info(f"Uploaded {len(output_files)} output files and README.md to {output_path}")
         
-        return {
-            "status": "success",
-            "input_path": input_path,
-            "output_path": output_path,
-            "normalized_file": gcs_output_file,
-            "timestamp": datetime.datetime.now().isoformat()
-        }
+        if output_format == "tfrecord":
+            # Only once the new manifest is visible, so no manifest ever lists a deleted shard
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            prefix = os.path.join(output_path, "")
+            names = [uri[len(prefix):] for uri in storage.list(prefix) if "/" not in uri[len(prefix):]]
+            for file_name in stale_shards(names, manifest):
+                logger.info(f"Removing stale TFRecord shard {prefix}{file_name}")
+                storage.delete(prefix + file_name)
+        
+        return dict(result, processed_arrays=keys, reused_arrays=reused,
+                    timestamp=datetime.datetime.now().isoformat())
 
 # HTTP Trigger version
 @functions_framework.http
@@ -194,6 +735,12 @@ def normalize_http(request):
         request (flask.Request): The request object with JSON payload containing:
             - input_path: GCS path to input .npz file
             - output_path: GCS path for output directory
+            - output_format (optional): "npz" (default), "npy" or "tfrecord"
+            - storage_dtype (optional): "float32" (default) or "uint8"
+            - num_shards (optional): TFRecord shards per split (default NUM_SHARDS)
+            - chunk_rows (optional): Stream in chunks of this many rows with
+              bounded memory; 0 loads whole arrays (default CHUNK_ROWS)
+            - force (optional): Normalize even if the output is up to date
     
     Returns:
         JSON response with normalization status
@@ -209,9 +756,16 @@ def normalize_http(request):
     
     input_path = request_json['input_path']
     output_path = request_json['output_path']
+    output_format = request_json.get('output_format', 'npz')
+    storage_dtype = request_json.get('storage_dtype', 'float32')
+    num_shards = int(request_json.get('num_shards', NUM_SHARDS))
+    chunk_rows = int(request_json.get('chunk_rows', CHUNK_ROWS))
+    force = bool(request_json.get('force', False))
     
     try:
-        result = normalize_fashion_mnist(input_path, output_path)
+        result = normalize_fashion_mnist(
+            input_path, output_path, output_format, storage_dtype, num_shards, chunk_rows, force=force
+        )
         return json.dumps(result), 200
     except Exception as e:
         logger.error(f"Error in normalization: {e}")
@@ -254,7 +808,7 @@ def normalize_gcs(cloud_event):
     logger.info(f"Output will be saved to {output_path}")
     
     try:
-        result = normalize_fashion_mnist(input_path, output_path)
+        result = normalize_fashion_mnist(input_path, output_path, OUTPUT_FORMAT, STORAGE_DTYPE)
         logger.info(f"Normalization result: {json.dumps(result)}")
     except Exception as e:
         logger.error(f"Error in normalization: {e}")
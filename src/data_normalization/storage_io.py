@@ -0,0 +1,316 @@
+"""
+Storage backends for the Fashion MNIST normalizer.
+
+The normalizer addresses objects by gs://bucket/path URIs and talks to a
+Storage backend instead of the Cloud Storage client directly:
+
+- GCSStorage: Cloud Storage through one shared, lazily created client.
+  Blobs above a size threshold are transferred in parallel chunks with
+  the client's transfer_manager.
+- LocalStorage: gs://bucket/path mapped to <root>/bucket/path, for running
+  the function against local files.
+- MemoryStorage: objects kept in a dict, with an optional simulated
+  per-request latency, for tests and benchmarks.
+
+All backends upload independent files concurrently with upload_many.
+"""
+
+import io
+import os
+import time
+import base64
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Concurrent requests per upload_many call or chunked transfer
+MAX_WORKERS = int(os.environ.get("STORAGE_MAX_WORKERS", 8))
+
+# Blobs at least this large are transferred in parallel chunks of CHUNK_SIZE
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+CHUNK_SIZE = 32 * 1024 * 1024
+
+# Read-ahead buffer for objects opened as file objects
+STREAM_BUFFER_BYTES = 4 * 1024 * 1024
+
+def parse_gcs_path(gcs_path):
+    """Split gs://bucket/path into (bucket, blob name)."""
+    if not gcs_path.startswith('gs://'):
+        raise ValueError(f"Invalid GCS path: {gcs_path}. Must start with 'gs://'")
+
+    path_parts = gcs_path[5:].split('/', 1)
+    if len(path_parts) < 2 or not path_parts[1]:
+        raise ValueError(f"Invalid GCS path: {gcs_path}. Must be in format 'gs://bucket/path'")
+
+    return path_parts[0], path_parts[1]
+
+class Storage:
+    """Interface of the storage backends; subclasses implement the single-object calls."""
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+
+    def download(self, uri, local_path):
+        """Copy the object at `uri` to `local_path`."""
+        raise NotImplementedError
+
+    def upload(self, local_path, uri):
+        """Copy `local_path` to the object at `uri`."""
+        raise NotImplementedError
+
+    def copy(self, source_uri, destination_uri):
+        """Copy one object to another without passing through local files."""
+        raise NotImplementedError
+
+    def open(self, uri):
+        """Open the object at `uri` as a seekable binary file object for reading."""
+        raise NotImplementedError
+
+    def list(self, prefix):
+        """URIs of the objects whose URI starts with `prefix` (gs://bucket/path/...)."""
+        raise NotImplementedError
+
+    def delete(self, uri):
+        """Delete the object at `uri`."""
+        raise NotImplementedError
+
+    def stat(self, uri):
+        """
+        Identify the current version of an object.
+
+        Returns:
+            dict: 'generation' (changes on every write), 'md5' (hex digest of
+            the content, None if unknown) and 'size'; None if there is no object
+        """
+        raise NotImplementedError
+
+    def upload_many(self, pairs):
+        """
+        Upload several independent files concurrently.
+
+        Args:
+            pairs: Iterable of (local_path, uri)
+
+        Raises:
+            The first upload error, after the remaining uploads have finished
+        """
+        pairs = list(pairs)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(pairs)))) as executor:
+            futures = [executor.submit(self.upload, local_path, uri) for local_path, uri in pairs]
+        for future in futures:
+            future.result()
+
+class GCSStorage(Storage):
+    """Cloud Storage with one client shared by every call and thread."""
+
+    def __init__(self, client=None, max_workers=MAX_WORKERS, parallel_threshold=PARALLEL_THRESHOLD,
+                 chunk_size=CHUNK_SIZE):
+        super().__init__(max_workers)
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = chunk_size
+
+    @property
+    def client(self):
+        # Created on first use, so importing the function never needs credentials
+        with self._client_lock:
+            if self._client is None:
+                from google.cloud import storage
+                self._client = storage.Client()
+            return self._client
+
+    def _blob(self, uri):
+        bucket_name, blob_name = parse_gcs_path(uri)
+        return self.client.bucket(bucket_name).blob(blob_name)
+
+    def download(self, uri, local_path):
+        from google.cloud.storage import transfer_manager
+
+        bucket_name, blob_name = parse_gcs_path(uri)
+        blob = self.client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"No such object: {uri}")
+
+        os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+        logger.info(f"Downloading {uri} to {local_path}")
+        if blob.size >= self.parallel_threshold:
+            # Ranged reads in parallel, written into place in the local file
+            transfer_manager.download_chunks_concurrently(
+                blob, local_path, chunk_size=self.chunk_size,
+                worker_type=transfer_manager.THREAD, max_workers=self.max_workers
+            )
+        else:
+            blob.download_to_filename(local_path)
+        logger.info(f"Download complete")
+
+    def upload(self, local_path, uri):
+        from google.cloud.storage import transfer_manager
+
+        blob = self._blob(uri)
+        logger.info(f"Uploading {local_path} to {uri}")
+        if os.path.getsize(local_path) >= self.parallel_threshold:
+            # XML API multipart upload; the parts are combined server-side
+            transfer_manager.upload_chunks_concurrently(
+                local_path, blob, chunk_size=self.chunk_size,
+                worker_type=transfer_manager.THREAD, max_workers=self.max_workers
+            )
+        else:
+            blob.upload_from_filename(local_path)
+        logger.info(f"Upload complete")
+
+    def copy(self, source_uri, destination_uri):
+        source_bucket, source_name = parse_gcs_path(source_uri)
+        destination_bucket, destination_name = parse_gcs_path(destination_uri)
+        bucket = self.client.bucket(source_bucket)
+        bucket.copy_blob(bucket.blob(source_name), self.client.bucket(destination_bucket), destination_name)
+
+    def open(self, uri):
+        logger.info(f"Streaming {uri}")
+        return self._blob(uri).open('rb', chunk_size=STREAM_BUFFER_BYTES)
+
+    def list(self, prefix):
+        bucket_name, blob_prefix = parse_gcs_path(prefix)
+        return [f"gs://{bucket_name}/{blob.name}" for blob in self.client.list_blobs(bucket_name, prefix=blob_prefix)]
+
+    def delete(self, uri):
+        logger.info(f"Deleting {uri}")
+        self._blob(uri).delete()
+
+    def stat(self, uri):
+        bucket_name, blob_name = parse_gcs_path(uri)
+        blob = self.client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            return None
+        # Composite objects have no MD5, only a CRC32C
+        md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else None
+        return {"generation": blob.generation, "md5": md5, "size": blob.size}
+
+class LocalStorage(Storage):
+    """A directory standing in for Cloud Storage: gs://bucket/path is <root>/bucket/path."""
+
+    def __init__(self, root, max_workers=MAX_WORKERS):
+        super().__init__(max_workers)
+        self.root = root
+
+    def path(self, uri):
+        bucket_name, blob_name = parse_gcs_path(uri)
+        return os.path.join(self.root, bucket_name, blob_name)
+
+    def download(self, uri, local_path):
+        if not os.path.exists(self.path(uri)):
+            raise FileNotFoundError(f"No such object: {uri}")
+        os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+        shutil.copyfile(self.path(uri), local_path)
+
+    def upload(self, local_path, uri):
+        os.makedirs(os.path.dirname(self.path(uri)), exist_ok=True)
+        shutil.copyfile(local_path, self.path(uri))
+
+    def copy(self, source_uri, destination_uri):
+        if not os.path.exists(self.path(source_uri)):
+            raise FileNotFoundError(f"No such object: {source_uri}")
+        os.makedirs(os.path.dirname(self.path(destination_uri)), exist_ok=True)
+        shutil.copyfile(self.path(source_uri), self.path(destination_uri))
+
+    def open(self, uri):
+        return open(self.path(uri), 'rb')
+
+    def list(self, prefix):
+        bucket_name, _ = parse_gcs_path(prefix)
+        bucket_dir = os.path.join(self.root, bucket_name)
+        uris = []
+        for directory, _, file_names in os.walk(bucket_dir):
+            for file_name in file_names:
+                relative = os.path.relpath(os.path.join(directory, file_name), bucket_dir).replace(os.sep, '/')
+                uris.append(f"gs://{bucket_name}/{relative}")
+        return sorted(uri for uri in uris if uri.startswith(prefix))
+
+    def delete(self, uri):
+        if not os.path.exists(self.path(uri)):
+            raise FileNotFoundError(f"No such object: {uri}")
+        os.remove(self.path(uri))
+
+    def stat(self, uri):
+        path = self.path(uri)
+        if not os.path.exists(path):
+            return None
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+                digest.update(chunk)
+        return {"generation": os.stat(path).st_mtime_ns, "md5": digest.hexdigest(), "size": os.path.getsize(path)}
+
+class MemoryStorage(Storage):
+    """
+    Objects held in memory as bytes, keyed by URI.
+
+    `latency` seconds are slept on every call to simulate a remote round
+    trip, so benchmarks can show the effect of concurrent transfers.
+    """
+
+    def __init__(self, objects=None, latency=0.0, max_workers=MAX_WORKERS):
+        super().__init__(max_workers)
+        self.objects = dict(objects or {})
+        self.generations = {uri: 1 for uri in self.objects}
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def _get(self, uri):
+        parse_gcs_path(uri)
+        time.sleep(self.latency)
+        with self._lock:
+            if uri not in self.objects:
+                raise FileNotFoundError(f"No such object: {uri}")
+            return self.objects[uri]
+
+    def _put(self, uri, data):
+        parse_gcs_path(uri)
+        time.sleep(self.latency)
+        with self._lock:
+            self.objects[uri] = data
+            self.generations[uri] = self.generations.get(uri, 0) + 1
+
+    def download(self, uri, local_path):
+        data = self._get(uri)
+        os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+        with open(local_path, 'wb') as f:
+            f.write(data)
+
+    def upload(self, local_path, uri):
+        with open(local_path, 'rb') as f:
+            self._put(uri, f.read())
+
+    def copy(self, source_uri, destination_uri):
+        self._put(destination_uri, self._get(source_uri))
+
+    def open(self, uri):
+        return io.BytesIO(self._get(uri))
+
+    def list(self, prefix):
+        parse_gcs_path(prefix)
+        time.sleep(self.latency)
+        with self._lock:
+            return sorted(uri for uri in self.objects if uri.startswith(prefix))
+
+    def delete(self, uri):
+        parse_gcs_path(uri)
+        time.sleep(self.latency)
+        with self._lock:
+            if uri not in self.objects:
+                raise FileNotFoundError(f"No such object: {uri}")
+            del self.objects[uri]
+            del self.generations[uri]
+
+    def stat(self, uri):
+        try:
+            data = self._get(uri)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            generation = self.generations[uri]
+        return {"generation": generation, "md5": hashlib.md5(data).hexdigest(), "size": len(data)}
@@ -0,0 +1,285 @@
+"""Tests for the normalizer: chunked streaming and incremental updates."""
+
+import io
+import os
+import json
+
+import numpy as np
+import pytest
+
+import main
+from main import (normalize_local, normalize_stream, normalize_fashion_mnist, plan_update, merge_manifest,
+                  source_checksums, MANIFEST_FILE, NPZ_OUTPUT_FILE)
+from storage_io import LocalStorage, MemoryStorage
+
+INPUT_URI = "gs://bucket/raw/fashion_mnist.npz"
+OUTPUT_URI = "gs://bucket/normalized"
+SPLITS = {"train": 50, "val": 20, "test": 30}
+
+
+def raw_dataset(seed=0):
+    rng = np.random.default_rng(seed)
+    dataset = {}
+    for split, count in SPLITS.items():
+        dataset[f"X_{split}"] = rng.integers(0, 256, (count, 28, 28), dtype=np.uint8)
+        dataset[f"y_{split}"] = rng.integers(0, 10, count, dtype=np.uint8)
+    return dataset
+
+
+def npz_bytes(dataset):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **dataset)
+    return buffer.getvalue()
+
+
+def read_outputs(output_dir, files):
+    """File contents by name, with the manifest's creation time dropped."""
+    outputs = {}
+    for file_name in files:
+        path = os.path.join(output_dir, file_name)
+        if file_name == MANIFEST_FILE:
+            with open(path) as f:
+                outputs[file_name] = dict(json.load(f), created=None)
+        elif file_name.endswith(".npz"):
+            with np.load(path) as data:
+                outputs[file_name] = {key: data[key] for key in data.files}
+        else:
+            with open(path, 'rb') as f:
+                outputs[file_name] = f.read()
+    return outputs
+
+
+def assert_same_outputs(actual, expected):
+    assert actual.keys() == expected.keys()
+    for file_name, value in expected.items():
+        if isinstance(value, dict) and file_name.endswith(".npz"):
+            assert actual[file_name].keys() == value.keys()
+            for key, array in value.items():
+                assert actual[file_name][key].dtype == array.dtype
+                np.testing.assert_array_equal(actual[file_name][key], array)
+        else:
+            assert actual[file_name] == value
+
+
+@pytest.mark.parametrize("output_format", ["npz", "npy", "tfrecord"])
+@pytest.mark.parametrize("storage_dtype", ["float32", "uint8"])
+def test_streaming_matches_whole_array_normalization(tmp_path, output_format, storage_dtype):
+    input_file = tmp_path / "fashion_mnist.npz"
+    input_file.write_bytes(npz_bytes(raw_dataset()))
+    whole_dir, stream_dir = tmp_path / "whole", tmp_path / "stream"
+    whole_dir.mkdir()
+    stream_dir.mkdir()
+
+    whole_files = normalize_local(str(input_file), str(whole_dir), output_format, storage_dtype,
+                                  num_shards=3, chunk_rows=0)
+    # A chunk size that divides neither the splits nor the shards
+    with open(input_file, 'rb') as source:
+        stream_files = normalize_stream(source, str(stream_dir), output_format, storage_dtype,
+                                        num_shards=3, chunk_rows=7)
+
+    assert sorted(stream_files) == sorted(whole_files)
+    assert_same_outputs(read_outputs(stream_dir, stream_files), read_outputs(whole_dir, whole_files))
+
+
+def test_streaming_normalizes_images_only(tmp_path):
+    dataset = raw_dataset()
+    input_file = tmp_path / "fashion_mnist.npz"
+    input_file.write_bytes(npz_bytes(dataset))
+    with open(input_file, 'rb') as source:
+        normalize_stream(source, str(tmp_path), "npy", "float32", chunk_rows=16)
+
+    images = np.load(tmp_path / "X_train.npy")
+    assert images.dtype == np.float32
+    np.testing.assert_array_equal(images, dataset["X_train"].astype('float32') / 255.0)
+    np.testing.assert_array_equal(np.load(tmp_path / "y_train.npy"), dataset["y_train"])
+
+
+@pytest.mark.parametrize("chunk_rows", [0, 16])
+def test_reshard_removes_the_previous_layout(tmp_path, chunk_rows):
+    input_file = tmp_path / "fashion_mnist.npz"
+    input_file.write_bytes(npz_bytes(raw_dataset()))
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    (output_dir / "notes-00000-of-00002.tfrecord").write_bytes(b"not a split of this dataset")
+
+    normalize_local(str(input_file), str(output_dir), "tfrecord", num_shards=3, chunk_rows=chunk_rows)
+    files = normalize_local(str(input_file), str(output_dir), "tfrecord", num_shards=2, chunk_rows=chunk_rows)
+
+    assert sorted(os.listdir(output_dir)) == sorted(files + ["notes-00000-of-00002.tfrecord"])
+    assert "train-00001-of-00002.tfrecord" in files
+
+
+def test_stale_shards_only_matches_manifest_splits():
+    manifest = {"splits": {"train": {"shards": [{"file": "train-00000-of-00001.tfrecord"}]}}}
+    names = ["train-00000-of-00001.tfrecord", "train-00001-of-00003.tfrecord",
+             "test-00000-of-00003.tfrecord", "train-00000-of-00003.tfrecord.tmp", "manifest.json"]
+    assert main.stale_shards(names, manifest) == ["train-00001-of-00003.tfrecord"]
+
+
+def source_record(dataset):
+    return dict(uri=INPUT_URI, generation=1, md5=None, arrays=source_checksums(io.BytesIO(npz_bytes(dataset))))
+
+
+def options(output_format):
+    return {"output_format": output_format, "storage_dtype": "float32",
+            "num_shards": 2 if output_format == "tfrecord" else None}
+
+
+def test_plan_update_without_previous_run_normalizes_everything():
+    source = source_record(raw_dataset())
+    keys, reused = plan_update(source, None, options("npy"))
+    assert keys == list(source["arrays"])
+    assert reused == []
+
+
+@pytest.mark.parametrize("output_format, expected_keys", [
+    ("npy", ["X_val"]),
+    ("tfrecord", ["X_val", "y_val"]),
+    ("npz", ["X_train", "y_train", "X_val", "y_val", "X_test", "y_test"]),
+])
+def test_plan_update_renormalizes_changed_arrays(output_format, expected_keys):
+    dataset = raw_dataset()
+    previous = {"options": options(output_format), "source": source_record(dataset)}
+    dataset["X_val"] = 255 - dataset["X_val"]
+    source = source_record(dataset)
+
+    keys, reused = plan_update(source, previous, options(output_format))
+
+    assert sorted(keys) == sorted(expected_keys)
+    assert sorted(keys + reused) == sorted(source["arrays"])
+
+
+def test_plan_update_renormalizes_everything_when_options_change():
+    dataset = raw_dataset()
+    previous = {"options": options("npy"), "source": source_record(dataset)}
+    keys, reused = plan_update(source_record(dataset), previous, dict(options("npy"), storage_dtype="uint8"))
+    assert reused == []
+
+
+def test_merge_manifest_keeps_reused_entries():
+    source = source_record(raw_dataset())
+    previous = {"arrays": {key: {"file": f"{key}.npy", "run": 1} for key in source["arrays"]}}
+    manifest = {"arrays": {"X_val": {"file": "X_val.npy", "run": 2}}}
+    reused = [key for key in source["arrays"] if key != "X_val"]
+
+    merged = merge_manifest(manifest, previous, reused, source, options("npy"))
+
+    assert list(merged["arrays"]) == list(source["arrays"])
+    assert merged["arrays"]["X_val"]["run"] == 2
+    assert all(merged["arrays"][key]["run"] == 1 for key in reused)
+    assert merged["source"] == source
+    assert merged["options"] == options("npy")
+
+
+@pytest.fixture(params=["memory", "local"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStorage()
+    return LocalStorage(str(tmp_path / "gcs"))
+
+
+def put(storage, uri, data, tmp_path):
+    local_path = tmp_path / "upload"
+    local_path.write_bytes(data)
+    storage.upload(str(local_path), uri)
+
+
+def read_npy(storage, uri):
+    with storage.open(uri) as f:
+        return np.load(io.BytesIO(f.read()))
+
+
+@pytest.mark.parametrize("chunk_rows", [0, 16])
+def test_incremental_update_against_fake_storage(storage, tmp_path, chunk_rows):
+    dataset = raw_dataset()
+    put(storage, INPUT_URI, npz_bytes(dataset), tmp_path)
+
+    first = normalize_fashion_mnist(INPUT_URI, OUTPUT_URI, "npy", chunk_rows=chunk_rows, storage=storage)
+    assert sorted(first["processed_arrays"]) == sorted(dataset)
+    np.testing.assert_array_equal(read_npy(storage, f"{OUTPUT_URI}/X_test.npy"),
+                                  dataset["X_test"].astype('float32') / 255.0)
+
+    # The same object again, e.g. a duplicate trigger event
+    duplicate = normalize_fashion_mnist(INPUT_URI, OUTPUT_URI, "npy", chunk_rows=chunk_rows, storage=storage)
+    assert duplicate["status"] == "skipped"
+
+    # A new upload with one array changed
+    dataset["X_test"] = 255 - dataset["X_test"]
+    put(storage, INPUT_URI, npz_bytes(dataset), tmp_path)
+    update = normalize_fashion_mnist(INPUT_URI, OUTPUT_URI, "npy", chunk_rows=chunk_rows, storage=storage)
+    assert update["processed_arrays"] == ["X_test"]
+    assert sorted(update["reused_arrays"]) == sorted(key for key in dataset if key != "X_test")
+    np.testing.assert_array_equal(read_npy(storage, f"{OUTPUT_URI}/X_test.npy"),
+                                  dataset["X_test"].astype('float32') / 255.0)
+
+    with storage.open(f"{OUTPUT_URI}/{MANIFEST_FILE}") as f:
+        manifest = json.load(f)
+    assert sorted(manifest["arrays"]) == sorted(dataset)
+    assert manifest["source"]["arrays"]["X_test"]["crc32"] == source_checksums(
+        io.BytesIO(npz_bytes(dataset)))["X_test"]["crc32"]
+
+
+def test_reshard_removes_stale_remote_shards(storage, tmp_path):
+    put(storage, INPUT_URI, npz_bytes(raw_dataset()), tmp_path)
+    put(storage, f"{OUTPUT_URI}/archive/train-00000-of-00003.tfrecord", b"kept", tmp_path)
+
+    normalize_fashion_mnist(INPUT_URI, OUTPUT_URI, "tfrecord", num_shards=3, storage=storage)
+    normalize_fashion_mnist(INPUT_URI, OUTPUT_URI, "tfrecord", num_shards=2, storage=storage)
+
+    with storage.open(f"{OUTPUT_URI}/{MANIFEST_FILE}") as f:
+        manifest = json.load(f)
+    listed = {f"{OUTPUT_URI}/{shard['file']}" for entry in manifest["splits"].values() for shard in entry["shards"]}
+    shards = {uri for uri in storage.list(f"{OUTPUT_URI}/") if uri.endswith(".tfrecord")}
+    assert shards == listed | {f"{OUTPUT_URI}/archive/train-00000-of-00003.tfrecord"}
+    assert all("-of-00002" in uri for uri in listed)
+
+
+def test_missing_source_raises(storage):
+    with pytest.raises(FileNotFoundError):
+        normalize_fashion_mnist(INPUT_URI, OUTPUT_URI, storage=storage)
+
+
+def test_npz_output_against_memory_storage(tmp_path):
+    storage = MemoryStorage()
+    dataset = raw_dataset()
+    put(storage, INPUT_URI, npz_bytes(dataset), tmp_path)
+
+    result = normalize_fashion_mnist(INPUT_URI, OUTPUT_URI, "npz", "uint8", chunk_rows=16, storage=storage)
+
+    assert result["normalized_file"] == f"{OUTPUT_URI}/{NPZ_OUTPUT_FILE}"
+    with storage.open(result["normalized_file"]) as f, np.load(f) as data:
+        np.testing.assert_array_equal(data["X_train"], dataset["X_train"])
+        assert float(data["pixel_scale"]) == main.PIXEL_SCALE
+
+
+class SeekCountingFile(io.BytesIO):
+    """A source that counts the jumps a remote reader would turn into new ranged requests."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.jumps = 0
+
+    def seek(self, offset, whence=0):
+        position = super().seek(offset, whence)
+        if whence == 0 and position != getattr(self, "_last", position):
+            self.jumps += 1
+        return position
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self._last = self.tell()
+        return data
+
+
+def test_streaming_tfrecords_does_not_alternate_between_members(tmp_path):
+    # Labels large enough that the zip reader cannot buffer them in one read
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    np.savez(buffer, X_train=rng.integers(0, 256, (4096, 28, 28), dtype=np.uint8),
+             y_train=rng.integers(0, 10, 4096).astype(np.int64))
+    source = SeekCountingFile(buffer.getvalue())
+
+    normalize_stream(source, str(tmp_path), "tfrecord", num_shards=3, chunk_rows=64)
+
+    # A few jumps per member opened, not one per label block read between image chunks
+    assert source.jumps <= 8
@@ -0,0 +1,216 @@
+"""Tests for the normalizer's storage backends."""
+
+import hashlib
+import threading
+
+import pytest
+
+import storage_io
+from storage_io import GCSStorage, LocalStorage, MemoryStorage, Storage, parse_gcs_path
+
+
+def test_parse_gcs_path():
+    assert parse_gcs_path("gs://bucket/a/b.npy") == ("bucket", "a/b.npy")
+    for path in ["bucket/a.npy", "gs://bucket", "gs://bucket/"]:
+        with pytest.raises(ValueError):
+            parse_gcs_path(path)
+
+
+@pytest.fixture(params=["memory", "local"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStorage()
+    return LocalStorage(str(tmp_path / "gcs"))
+
+
+def test_round_trip(storage, tmp_path):
+    local_path = tmp_path / "upload"
+    local_path.write_bytes(b"payload")
+
+    storage.upload(str(local_path), "gs://bucket/a/object")
+    storage.copy("gs://bucket/a/object", "gs://other/copy")
+    storage.download("gs://other/copy", str(tmp_path / "nested" / "download"))
+
+    assert (tmp_path / "nested" / "download").read_bytes() == b"payload"
+    with storage.open("gs://bucket/a/object") as f:
+        f.seek(3)
+        assert f.read() == b"load"
+
+
+def test_missing_objects_raise(storage, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        storage.download("gs://bucket/missing", str(tmp_path / "download"))
+    with pytest.raises(FileNotFoundError):
+        storage.copy("gs://bucket/missing", "gs://bucket/copy")
+
+
+def test_stat_identifies_the_current_version(storage, tmp_path):
+    local_path = tmp_path / "upload"
+    assert storage.stat("gs://bucket/object") is None
+
+    local_path.write_bytes(b"first")
+    storage.upload(str(local_path), "gs://bucket/object")
+    first = storage.stat("gs://bucket/object")
+    assert first["md5"] == hashlib.md5(b"first").hexdigest()
+    assert first["size"] == 5
+
+    local_path.write_bytes(b"second")
+    storage.upload(str(local_path), "gs://bucket/object")
+    second = storage.stat("gs://bucket/object")
+    assert second["md5"] == hashlib.md5(b"second").hexdigest()
+    if isinstance(storage, MemoryStorage):
+        # A local file's mtime may not tick between two quick writes
+        assert second["generation"] == first["generation"] + 1
+
+
+def test_list_and_delete(storage, tmp_path):
+    local_path = tmp_path / "upload"
+    local_path.write_bytes(b"payload")
+    for uri in ["gs://bucket/a/1", "gs://bucket/a/b/2", "gs://bucket/ab", "gs://other/a/3"]:
+        storage.upload(str(local_path), uri)
+
+    assert storage.list("gs://bucket/a/") == ["gs://bucket/a/1", "gs://bucket/a/b/2"]
+
+    storage.delete("gs://bucket/a/1")
+    assert storage.list("gs://bucket/a/") == ["gs://bucket/a/b/2"]
+    assert storage.stat("gs://bucket/a/1") is None
+    with pytest.raises(FileNotFoundError):
+        storage.delete("gs://bucket/a/1")
+
+
+class RecordingStorage(Storage):
+    """Counts how many uploads are in flight at once; `fail` uploads raise."""
+
+    def __init__(self, max_workers, fail=()):
+        super().__init__(max_workers)
+        self.fail = set(fail)
+        self.uploaded = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._all_started = threading.Barrier(max_workers, timeout=5)
+
+    def upload(self, local_path, uri):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Only returns once max_workers uploads have started together
+        self._all_started.wait()
+        with self._lock:
+            self.in_flight -= 1
+            self.uploaded.append(uri)
+        if uri in self.fail:
+            raise OSError(f"upload of {uri} failed")
+
+
+def test_upload_many_runs_uploads_concurrently():
+    storage = RecordingStorage(max_workers=4)
+    uris = [f"gs://bucket/{i}" for i in range(8)]
+
+    storage.upload_many((f"/tmp/{i}", uri) for i, uri in enumerate(uris))
+
+    assert sorted(storage.uploaded) == sorted(uris)
+    assert storage.max_in_flight == 4
+
+
+def test_upload_many_raises_after_the_other_uploads_finish():
+    storage = RecordingStorage(max_workers=4, fail=["gs://bucket/1"])
+    uris = [f"gs://bucket/{i}" for i in range(4)]
+
+    with pytest.raises(OSError, match="gs://bucket/1"):
+        storage.upload_many((f"/tmp/{i}", uri) for i, uri in enumerate(uris))
+    assert sorted(storage.uploaded) == sorted(uris)
+
+
+class FakeBlob:
+    def __init__(self, name, size=0):
+        self.name = name
+        self.size = size
+        self.calls = []
+
+    def download_to_filename(self, local_path):
+        self.calls.append("download")
+
+    def upload_from_filename(self, local_path):
+        self.calls.append("upload")
+
+
+class FakeBucket:
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def blob(self, name):
+        return self.blobs.setdefault(name, FakeBlob(name))
+
+    def get_blob(self, name):
+        return self.blobs.get(name)
+
+
+class FakeClient:
+    def __init__(self):
+        self.blobs = {}
+
+    def bucket(self, name):
+        return FakeBucket(self.blobs)
+
+
+@pytest.fixture
+def chunked_calls(monkeypatch):
+    """Record transfer_manager's chunked transfers instead of running them."""
+    from google.cloud.storage import transfer_manager
+
+    calls = []
+    monkeypatch.setattr(transfer_manager, "download_chunks_concurrently",
+                        lambda blob, path, **kwargs: calls.append(("download", blob.name, kwargs["chunk_size"])))
+    monkeypatch.setattr(transfer_manager, "upload_chunks_concurrently",
+                        lambda path, blob, **kwargs: calls.append(("upload", blob.name, kwargs["chunk_size"])))
+    return calls
+
+
+def test_gcs_storage_chunks_only_large_transfers(tmp_path, chunked_calls):
+    client = FakeClient()
+    client.blobs = {"small": FakeBlob("small", size=99), "large": FakeBlob("large", size=100)}
+    storage = GCSStorage(client=client, parallel_threshold=100, chunk_size=10)
+    small_file, large_file = tmp_path / "small", tmp_path / "large"
+    small_file.write_bytes(b"x" * 99)
+    large_file.write_bytes(b"x" * 100)
+
+    storage.download("gs://bucket/small", str(tmp_path / "out" / "small"))
+    storage.download("gs://bucket/large", str(tmp_path / "out" / "large"))
+    storage.upload(str(small_file), "gs://bucket/small")
+    storage.upload(str(large_file), "gs://bucket/large")
+
+    assert client.blobs["small"].calls == ["download", "upload"]
+    assert client.blobs["large"].calls == []
+    assert chunked_calls == [("download", "large", 10), ("upload", "large", 10)]
+    with pytest.raises(FileNotFoundError):
+        storage.download("gs://bucket/missing", str(tmp_path / "missing"))
+
+
+def test_gcs_storage_creates_one_shared_client(monkeypatch):
+    from google.cloud import storage
+
+    created = []
+    monkeypatch.setattr(storage, "Client", lambda: created.append(FakeClient()) or created[-1])
+    gcs = GCSStorage()
+    assert created == []
+
+    threads = [threading.Thread(target=lambda: gcs.client) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert gcs.client is created[0]
+
+
+def test_memory_storage_latency_is_paid_per_request(monkeypatch, tmp_path):
+    sleeps = []
+    monkeypatch.setattr(storage_io.time, "sleep", sleeps.append)
+    storage = MemoryStorage({"gs://bucket/a": b"a"}, latency=0.25)
+
+    storage.copy("gs://bucket/a", "gs://bucket/b")
+    storage.open("gs://bucket/b").close()
+
+    assert sleeps == [0.25, 0.25, 0.25]
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Augmentation and batch assembly benchmarks for the Fashion MNIST experimentation code.
+
+--mode augment (default) times ImageAugmenter.augment_image applied in a
+Python loop against ImageAugmenter.augment_batch for every batch size, and
+prints one JSON record per batch size with images/sec for both and the
+speedup. The pixel statistics of both outputs are reported next to each
+other, since the batched version must match the per-image one statistically
+rather than bit for bit:
+
+    python benchmark.py --batch-sizes 32 64 128 256 512 1024 --repeats 5 \\
+        --output augment_benchmark.json
+
+--mode generator times one epoch of DataGenerator over uint8 images for every
+batch size and assembly mode (fancy-index gather, reuse_buffers, contiguous,
+and both), and traces a second epoch with tracemalloc to report the bytes
+allocated per batch (peak above the memory in use before the batch) and the
+memory retained by the generator (allocations inside worker processes
+are not traced):
+
+    python benchmark.py --mode generator --batch-sizes 32 256 1024 --augment
+"""
+
+import json
+import time
+import argparse
+import datetime
+import tracemalloc
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from data import (ImageAugmenter, DataGenerator, load_dataset_arrays, normalize_pixels,
+                  DEFAULT_CACHE_DIR, DEFAULT_NORMALIZATION)
+
+# DataGenerator options of each assembly mode benchmarked with --mode generator
+ASSEMBLY_MODES = {
+    'gather': {},
+    'reuse_buffers': {'reuse_buffers': True},
+    'contiguous': {'contiguous': True},
+    'contiguous+reuse_buffers': {'contiguous': True, 'reuse_buffers': True}
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark augmentation and batch assembly')
+    parser.add_argument('--mode', type=str, default='augment', choices=['augment', 'generator'],
+                        help='Per-image vs batched augmentation, or DataGenerator batch assembly')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32, 64, 128, 256, 512, 1024],
+                        help='Batch sizes to benchmark')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed batches per batch size and method')
+    parser.add_argument('--data-uri', type=str, default=None,
+                        help='Local path or gs:// URI of a saved dataset (default: synthetic images)')
+    parser.add_argument('--data-cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help='Local cache for datasets read from gs://')
+    parser.add_argument('--num-samples', type=int, default=60000,
+                        help='Images per epoch in generator mode')
+    parser.add_argument('--augment', action='store_true', help='Augment batches in generator mode')
+    parser.add_argument('--num-workers', type=int, default=0, help='DataGenerator workers in generator mode')
+    parser.add_argument('--worker-type', type=str, default='thread', choices=['thread', 'process'],
+                        help='DataGenerator worker type in generator mode')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--output', type=str, default=None, help='Also write the JSON results to this file')
+    return parser.parse_args()
+
+
+def synthetic_images(num_images, seed):
+    # Smooth blobs on a zero background, so zoom/shift padding and contrast behave as on real images
+    rng = np.random.RandomState(seed)
+    noise = gaussian_filter(rng.rand(num_images, 28, 28), sigma=(0, 2, 2))
+    return np.clip(noise * 3 - 1, 0, 1).astype('float32')
+
+
+def load_images(args, num_images):
+    if args.data_uri is None:
+        return synthetic_images(num_images, args.seed)
+    arrays = load_dataset_arrays(args.data_uri, args.data_cache_dir)
+    images = np.asarray(arrays['X_train'][:num_images])
+    if np.issubdtype(images.dtype, np.integer):
+        images = normalize_pixels(images)
+    return images.reshape(-1, 28, 28)
+
+
+def load_uint8_dataset(args):
+    # Stored pixels and labels, as DataGenerator sees them with lazy normalization
+    if args.data_uri is None:
+        images = (synthetic_images(args.num_samples, args.seed) * 255).astype(np.uint8)
+        labels = np.random.default_rng(args.seed).integers(0, 10, args.num_samples).astype(np.uint8)
+        return images, labels, dict(DEFAULT_NORMALIZATION)
+    arrays = load_dataset_arrays(args.data_uri, args.data_cache_dir)
+    normalization = {'scale': float(arrays.get('pixel_scale', DEFAULT_NORMALIZATION['scale'])),
+                     'offset': float(arrays.get('pixel_offset', DEFAULT_NORMALIZATION['offset']))}
+    images = np.asarray(arrays['X_train'][:args.num_samples]).reshape(-1, 28, 28)
+    return images, np.asarray(arrays['y_train'][:len(images)]), normalization
+
+
+def pixel_stats(images):
+    return {
+        "mean": float(images.mean()),
+        "std": float(images.std()),
+        "image_mean_std": float(images.mean(axis=(1, 2)).std()),
+        "background_fraction": float((np.abs(images) < 1e-2).mean())
+    }
+
+
+def time_method(augment, batch, repeats):
+    # One untimed call, then the best of `repeats` timed calls
+    outputs = [augment(batch)]
+    best = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        outputs.append(augment(batch))
+        best = min(best, time.perf_counter() - start_time)
+    return best, np.concatenate(outputs)
+
+
+def benchmark_batch_size(augmenter, images, batch_size, repeats):
+    batch = images[:batch_size]
+
+    def per_image(X):
+        return np.stack([augmenter.augment_image(x) for x in X])
+
+    loop_s, loop_out = time_method(per_image, batch, repeats)
+    batch_s, batch_out = time_method(augmenter.augment_batch, batch, repeats)
+
+    return {
+        "batch_size": batch_size,
+        "per_image_ms": loop_s * 1000,
+        "batched_ms": batch_s * 1000,
+        "per_image_images_per_second": batch_size / loop_s,
+        "batched_images_per_second": batch_size / batch_s,
+        "speedup": loop_s / batch_s,
+        "per_image_stats": pixel_stats(loop_out),
+        "batched_stats": pixel_stats(batch_out)
+    }
+
+
+def benchmark_assembly(args, images, labels, normalization, batch_size, mode):
+    """Time one epoch of DataGenerator in an assembly mode, then trace the allocations of another."""
+    augmenter = ImageAugmenter(random_state=args.seed) if args.augment else None
+    generator = DataGenerator(images, labels, batch_size=batch_size, augmenter=augmenter, shuffle=True,
+                              random_state=args.seed, normalization=normalization,
+                              num_workers=args.num_workers, worker_type=args.worker_type,
+                              **ASSEMBLY_MODES[mode])
+    try:
+        # Untimed epoch: starts workers and allocates the reused buffers
+        for _ in generator:
+            pass
+
+        start_time = time.perf_counter()
+        num_batches = sum(1 for _ in generator)
+        elapsed = time.perf_counter() - start_time
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        batch_bytes = []
+        batches = iter(generator)
+        batch = None
+        while True:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                batch = next(batches)
+            except StopIteration:
+                break
+            batch_bytes.append(tracemalloc.get_traced_memory()[1] - before)
+        del batch
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+    finally:
+        generator.close()
+
+    batch_kib = np.array(batch_bytes) / 1024
+    return {
+        "mode": mode,
+        "batch_size": batch_size,
+        "batches": num_batches,
+        "elapsed_s": elapsed,
+        "batches_per_second": num_batches / elapsed,
+        "images_per_second": len(images) / elapsed,
+        "allocated_kib_per_batch": {
+            "mean": float(batch_kib.mean()),
+            "max": float(batch_kib.max())
+        },
+        "retained_kib_after_epoch": retained / 1024
+    }
+
+
+def run_generator_mode(args):
+    images, labels, normalization = load_uint8_dataset(args)
+
+    results = []
+    for batch_size in args.batch_sizes:
+        for mode in ASSEMBLY_MODES:
+            print(f"Benchmarking {mode} batch assembly at batch size {batch_size}...")
+            result = benchmark_assembly(args, images, labels, normalization, batch_size, mode)
+            print(f"  {result['images_per_second']:.0f} images/sec, "
+                  f"{result['allocated_kib_per_batch']['mean']:.1f} KiB allocated per batch")
+            results.append(result)
+    return results
+
+
+def run_augment_mode(args):
+    images = load_images(args, max(args.batch_sizes))
+    augmenter = ImageAugmenter(random_state=args.seed)
+
+    results = []
+    for batch_size in args.batch_sizes:
+        print(f"Benchmarking augmentation at batch size {batch_size}...")
+        result = benchmark_batch_size(augmenter, images, batch_size, args.repeats)
+        print(f"  per-image {result['per_image_ms']:.1f} ms, batched {result['batched_ms']:.1f} ms, "
+              f"speedup {result['speedup']:.1f}x")
+        results.append(result)
+    return results
+
+
+def main():
+    args = parse_args()
+
+    if args.mode == 'generator':
+        results = run_generator_mode(args)
+    else:
+        results = run_augment_mode(args)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "numpy": np.__version__,
+        "mode": args.mode,
+        "synthetic_data": args.data_uri is None,
+        "repeats": args.repeats,
+        "augment": args.augment,
+        "num_workers": args.num_workers,
+        "worker_type": args.worker_type,
+        "runs": results
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
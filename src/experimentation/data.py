@@ -6,18 +6,205 @@ including loading, normalization, augmentation, and batch generation.
 """
 
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.datasets import fashion_mnist
 from sklearn.model_selection import train_test_split
-from scipy.ndimage import rotate, shift, zoom
+from scipy.ndimage import rotate, shift, zoom, map_coordinates
 import os
+import json
+import queue
+import base64
+import hashlib
+import tempfile
 import logging
+import threading
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Index file of the uncompressed .npy and sharded TFRecord dataset layouts
+MANIFEST_FILE = 'manifest.json'
+
+# TFRecord framing around each record payload: uint64 length + masked
+# CRC32C before it, masked CRC32C after it
+RECORD_HEADER_BYTES = 12
+RECORD_FOOTER_BYTES = 4
+
+# Mapping from stored uint8 pixels to model inputs: (pixel - offset) / scale
+DEFAULT_NORMALIZATION = {'scale': 255.0, 'offset': 0.0}
+
+# Local cache for datasets read from gs://
+DEFAULT_CACHE_DIR = os.environ.get(
+    'DATA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'fashion-mnist')
+)
+
+
+def fetch_dataset(uri, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return a local path for a dataset file, downloading gs:// objects into a cache.
+    
+    Cache entries are keyed by the object's MD5 as reported by Cloud Storage,
+    so repeated runs reuse the local copy until the object changes.
+    
+    Args:
+        uri (str): Local file path or gs://bucket/path URI
+        cache_dir (str): Directory holding cached downloads
+        
+    Returns:
+        str: Path of a local file with the content of `uri`
+    """
+    if not uri.startswith('gs://'):
+        return uri
+    
+    from google.cloud import storage
+    
+    bucket_name, _, blob_name = uri[5:].partition('/')
+    blob = storage.Client().bucket(bucket_name).get_blob(blob_name)
+    if blob is None:
+        raise FileNotFoundError(f"No such object: {uri}")
+    
+    md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else f"gen{blob.generation}"
+    local_path = os.path.join(cache_dir, md5, os.path.basename(blob_name))
+    if os.path.exists(local_path):
+        logger.info(f"Using cached {uri} from {local_path}")
+        return local_path
+    
+    # Download to a temporary name so an interrupted download is never reused
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    logger.info(f"Downloading {uri} to {local_path}")
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(local_path), suffix='.part')
+    os.close(fd)
+    try:
+        blob.download_to_filename(temp_path)
+        digest = hashlib.md5()
+        with open(temp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+                digest.update(chunk)
+        if blob.md5_hash and digest.hexdigest() != md5:
+            raise IOError(f"Checksum mismatch downloading {uri}")
+        os.replace(temp_path, local_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    return local_path
+
+
+def normalize_pixels(images, normalization=DEFAULT_NORMALIZATION, out=None):
+    """
+    Map integer pixels to float32 model inputs as (pixel - offset) / scale.
+    
+    With the default normalization this is bit-identical to
+    images.astype('float32') / 255.0.
+    
+    Args:
+        images (numpy.ndarray): Integer image array of any shape
+        normalization (dict): 'scale' and 'offset' recorded with the dataset
+        out (numpy.ndarray): float32 array of the same shape to write into
+        
+    Returns:
+        numpy.ndarray: float32 array of the same shape (`out` if given)
+    """
+    if out is None:
+        normalized = images.astype('float32')
+    else:
+        normalized = out
+        np.copyto(normalized, images, casting='unsafe')
+    if normalization['offset']:
+        normalized -= np.float32(normalization['offset'])
+    normalized /= np.float32(normalization['scale'])
+    return normalized
+
+
+def read_tfrecord_split(uri, split, cache_dir=DEFAULT_CACHE_DIR, shard_index=0, num_readers=1,
+                        manifest=None):
+    """
+    Read the TFRecord shards of one split into (images, labels) arrays.
+    
+    Records have a fixed size (label byte followed by the raw image bytes),
+    so every shard is viewed as rows and sliced rather than parsed record by
+    record. Each shard is checked against the manifest's sha256 and count.
+    
+    Args:
+        uri (str): Path or gs:// URI of a directory written with output
+            format "tfrecord" (manifest.json plus shards)
+        split (str): Split name, e.g. 'train', 'val' or 'test'
+        cache_dir (str): Local cache for datasets read from gs://
+        shard_index (int): Index of this reader among `num_readers`
+        num_readers (int): Parallel readers sharing the split; reader i
+            gets shards i, i + num_readers, ... so readers never overlap
+        manifest (dict): Already loaded manifest.json, if any
+        
+    Returns:
+        tuple: (images, labels) numpy arrays
+    """
+    base_uri = uri.rstrip('/')
+    if manifest is None:
+        with open(fetch_dataset(f"{base_uri}/{MANIFEST_FILE}", cache_dir)) as f:
+            manifest = json.load(f)
+    
+    record = manifest['record']
+    label_dtype = np.dtype(record['label_dtype'])
+    image_dtype = np.dtype(record['image_dtype'])
+    payload_bytes = label_dtype.itemsize + image_dtype.itemsize * int(np.prod(record['image_shape']))
+    row_bytes = RECORD_HEADER_BYTES + payload_bytes + RECORD_FOOTER_BYTES
+    
+    images, labels = [], []
+    for shard in manifest['splits'][split]['shards'][shard_index::num_readers]:
+        data = np.fromfile(fetch_dataset(f"{base_uri}/{shard['file']}", cache_dir), dtype=np.uint8)
+        if hashlib.sha256(data).hexdigest() != shard['sha256'] or len(data) != shard['count'] * row_bytes:
+            raise IOError(f"Checksum mismatch reading {shard['file']}")
+        payload = data.reshape(-1, row_bytes)[:, RECORD_HEADER_BYTES:RECORD_HEADER_BYTES + payload_bytes]
+        labels.append(payload[:, :label_dtype.itemsize].copy().view(label_dtype).ravel())
+        images.append(payload[:, label_dtype.itemsize:].copy().view(image_dtype).reshape(-1, *record['image_shape']))
+    
+    return np.concatenate(images), np.concatenate(labels)
+
+
+def load_dataset_arrays(uri, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load the arrays of a saved Fashion MNIST dataset.
+    
+    Args:
+        uri (str): Path or gs:// URI of an .npz file, or of a directory with
+            manifest.json and one .npy per array or TFRecord shards per split
+        cache_dir (str): Local cache for datasets read from gs://
+        
+    Returns:
+        dict: Array name to numpy array; arrays from .npy directories are
+        read-only memory maps, so only the samples actually used are read.
+        Datasets stored as uint8 also carry pixel_scale and pixel_offset.
+    """
+    if uri.endswith('.npz'):
+        with np.load(fetch_dataset(uri, cache_dir)) as data:
+            return {key: data[key] for key in data.files}
+    
+    base_uri = uri.rstrip('/')
+    with open(fetch_dataset(f"{base_uri}/{MANIFEST_FILE}", cache_dir)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') == 'npz':
+        with np.load(fetch_dataset(f"{base_uri}/{manifest['file']}", cache_dir)) as data:
+            return {key: data[key] for key in data.files}
+    if manifest.get('format') == 'tfrecord':
+        arrays = {}
+        for split in manifest['splits']:
+            arrays[f'X_{split}'], arrays[f'y_{split}'] = read_tfrecord_split(
+                base_uri, split, cache_dir, manifest=manifest
+            )
+    else:
+        arrays = {
+            name: np.load(fetch_dataset(f"{base_uri}/{entry['file']}", cache_dir), mmap_mode='r')
+            for name, entry in manifest['arrays'].items()
+        }
+    if 'normalization' in manifest:
+        arrays['pixel_scale'] = np.array(manifest['normalization']['scale'])
+        arrays['pixel_offset'] = np.array(manifest['normalization']['offset'])
+    return arrays
+
+
 class FashionMNISTDataset:
     """Handles loading and processing of Fashion MNIST dataset."""
     
@@ -25,7 +212,8 @@ class FashionMNISTDataset:
     CLASS_NAMES = ['T-shirt/top', 'Trouser', 'Pullover', 'Dress', 'Coat',
                   'Sandal', 'Shirt', 'Sneaker', 'Bag', 'Ankle boot']
     
-    def __init__(self, val_split=0.2, random_state=42, normalize=True):
+    def __init__(self, val_split=0.2, random_state=42, normalize=True, data_uri=None,
+                 cache_dir=DEFAULT_CACHE_DIR, lazy_normalize=False):
         """
         Initialize the Fashion MNIST dataset manager.
         
@@ -33,13 +221,25 @@ class FashionMNISTDataset:
             val_split (float): Proportion of training data to use for validation
             random_state (int): Random seed for reproducibility
             normalize (bool): Whether to normalize the data
+            data_uri (str): Local path or gs:// URI of a raw or normalized .npz,
+                or of a manifest.json + .npy or TFRecord directory; downloads with
+                keras.datasets when None
+            cache_dir (str): Local cache for datasets read from gs://
+            lazy_normalize (bool): Keep uint8 images (4x less memory) and leave
+                normalization to DataGenerator, which applies `self.normalization`
+                per batch with identical results
         """
         self.val_split = val_split
         self.random_state = random_state
         self.normalize = normalize
+        self.data_uri = data_uri
+        self.cache_dir = cache_dir
+        self.lazy_normalize = lazy_normalize
+        self.normalization = dict(DEFAULT_NORMALIZATION)
         
-        # Set random seeds for reproducibility
-        np.random.seed(self.random_state)
+        # Seed TensorFlow; the split takes random_state directly, so the global NumPy state is left alone.
+        # Imported here so that DataGenerator worker processes, which import this module, skip it
+        import tensorflow as tf
         tf.random.set_seed(self.random_state)
         
         # Load data immediately
@@ -49,22 +249,37 @@ class FashionMNISTDataset:
         """Load Fashion MNIST dataset and prepare train/val/test splits."""
         logger.info("Loading Fashion MNIST dataset...")
         try:
-            # Load the raw dataset
-            (X_train_full, y_train_full), (X_test, y_test) = fashion_mnist.load_data()
+            if self.data_uri:
+                # Raw (uint8) or already normalized (float32) arrays
+                arrays = load_dataset_arrays(self.data_uri, self.cache_dir)
+                if 'pixel_scale' in arrays:
+                    self.normalization = {'scale': float(arrays.pop('pixel_scale')),
+                                          'offset': float(arrays.pop('pixel_offset', 0.0))}
+                X_train_full, y_train_full = arrays['X_train'], arrays['y_train']
+                X_test, y_test = arrays['X_test'], arrays['y_test']
+            else:
+                # Load the raw dataset
+                from tensorflow.keras.datasets import fashion_mnist
+                (X_train_full, y_train_full), (X_test, y_test) = fashion_mnist.load_data()
+                arrays = {}
             
-            # Create validation split
-            X_train, X_val, y_train, y_val = train_test_split(
-                X_train_full, y_train_full, 
-                test_size=self.val_split, 
-                random_state=self.random_state, 
-                stratify=y_train_full
-            )
+            # Use the stored validation split if there is one
+            if 'X_val' in arrays:
+                X_train, y_train = X_train_full, y_train_full
+                X_val, y_val = arrays['X_val'], arrays['y_val']
+            else:
+                X_train, X_val, y_train, y_val = train_test_split(
+                    X_train_full, y_train_full, 
+                    test_size=self.val_split, 
+                    random_state=self.random_state, 
+                    stratify=y_train_full
+                )
             
-            # Apply normalization if requested
-            if self.normalize:
-                self.X_train = X_train.astype('float32') / 255.0
-                self.X_val = X_val.astype('float32') / 255.0
-                self.X_test = X_test.astype('float32') / 255.0
+            # Apply normalization if requested; normalized files are already in [0,1]
+            if self.normalize and not self.lazy_normalize and np.issubdtype(X_train.dtype, np.integer):
+                self.X_train = normalize_pixels(X_train, self.normalization)
+                self.X_val = normalize_pixels(X_val, self.normalization)
+                self.X_test = normalize_pixels(X_test, self.normalization)
             else:
                 self.X_train = X_train
                 self.X_val = X_val
@@ -92,6 +307,12 @@ class FashionMNISTDataset:
         os.makedirs(output_path, exist_ok=True)
         file_path = os.path.join(output_path, 'fashion_mnist_processed.npz')
         
+        # uint8 images are stored with the scale/offset needed to normalize them
+        extra = {}
+        if np.issubdtype(self.X_train.dtype, np.integer):
+            extra = {'pixel_scale': np.array(self.normalization['scale']),
+                     'pixel_offset': np.array(self.normalization['offset'])}
+        
         np.savez_compressed(
             file_path,
             X_train=self.X_train,
@@ -99,10 +320,73 @@ class FashionMNISTDataset:
             X_val=self.X_val,
             y_val=self.y_val,
             X_test=self.X_test,
-            y_test=self.y_test
+            y_test=self.y_test,
+            **extra
         )
         
         logger.info(f"Dataset saved to {file_path}")
+    
+    def save_to_npy(self, output_path):
+        """
+        Save the processed dataset as one uncompressed .npy per array.
+        
+        A manifest.json indexes the files; each can be opened with
+        np.load(path, mmap_mode='r') without reading it into memory.
+        
+        Args:
+            output_path (str): Directory path to save the dataset
+        """
+        os.makedirs(output_path, exist_ok=True)
+        arrays = {
+            'X_train': self.X_train, 'y_train': self.y_train,
+            'X_val': self.X_val, 'y_val': self.y_val,
+            'X_test': self.X_test, 'y_test': self.y_test
+        }
+        
+        manifest = {
+            "format": "npy",
+            "normalization": dict(self.normalization,
+                                  applied=not np.issubdtype(self.X_train.dtype, np.integer)),
+            "arrays": {}
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(output_path, f"{name}.npy"), np.ascontiguousarray(array))
+            manifest["arrays"][name] = {
+                "file": f"{name}.npy",
+                "shape": list(array.shape),
+                "dtype": str(array.dtype),
+                "bytes": int(array.nbytes)
+            }
+        
+        with open(os.path.join(output_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        
+        logger.info(f"Dataset saved as .npy files to {output_path}")
+
+
+def _zoom_source_coordinates(size, zooms):
+    """
+    Input coordinates sampled along one axis by augment_image's zoom.
+    
+    scipy.ndimage.zoom resizes an axis to round(size * zoom) pixels and maps
+    output pixel p to input coordinate p * (size - 1) / (zoomed - 1);
+    augment_image then crops the centre of a larger result, or pads a
+    smaller one with zeros, at integer offsets.
+    
+    Args:
+        size (int): Length of the axis
+        zooms (numpy.ndarray): Zoom factor of each image
+    
+    Returns:
+        tuple: (coordinates, zoomed), both shaped (len(zooms), size); zoomed
+        is False where the output pixel falls in the zero padding
+    """
+    zoomed_size = np.rint(size * zooms).astype(int)
+    offset = np.where(zoomed_size >= size, -((zoomed_size - size) // 2), (size - zoomed_size) // 2)
+    position = np.arange(size) - offset[:, None]
+    zoomed = (position >= 0) & (position < zoomed_size[:, None])
+    # Multiply before dividing so the last pixel maps exactly onto size - 1
+    return position * (size - 1) / np.maximum(zoomed_size - 1, 1)[:, None], zoomed
 
 
 class ImageAugmenter:
@@ -126,7 +410,8 @@ class ImageAugmenter:
             shift_range (tuple): Min and max pixel shifts
             zoom_range (tuple): Min and max zoom factors
             horizontal_flip_prob (float): Probability of horizontal flip
-            random_state (int): Random seed for reproducibility
+            random_state (int or numpy.random.SeedSequence): Seed of the
+                augmenter's own Generator, used when no rng is passed in
         """
         self.rotation_range = rotation_range
         self.brightness_range = brightness_range
@@ -134,55 +419,57 @@ class ImageAugmenter:
         self.shift_range = shift_range
         self.zoom_range = zoom_range
         self.horizontal_flip_prob = horizontal_flip_prob
-        
-        if random_state is not None:
-            np.random.seed(random_state)
+        self.rng = np.random.default_rng(random_state)
     
-    def augment_image(self, image):
+    def augment_image(self, image, rng=None):
         """
         Apply random augmentations to an image.
         
         Args:
             image (numpy.ndarray): Input image to augment
+            rng (numpy.random.Generator): Source of the random draws;
+                the augmenter's own Generator when None
             
         Returns:
             numpy.ndarray: Augmented image
         """
+        rng = self.rng if rng is None else rng
+        
         # Convert to float if needed
         img = image.astype('float32') if image.dtype != 'float32' else image.copy()
         
         # Random horizontal flip
-        if np.random.random() < self.horizontal_flip_prob:
+        if rng.random() < self.horizontal_flip_prob:
             img = np.fliplr(img)
         
         # Random rotation
-        if np.random.random() > 0.4:
-            angle = np.random.uniform(*self.rotation_range)
+        if rng.random() > 0.4:
+            angle = rng.uniform(*self.rotation_range)
             img = rotate(img, angle, reshape=False, mode='nearest')
         
         # Random brightness adjustment
-        if np.random.random() > 0.3:
-            factor = np.random.uniform(*self.brightness_range)
+        if rng.random() > 0.3:
+            factor = rng.uniform(*self.brightness_range)
             img = img * factor
             img = np.clip(img, 0, 1)
         
         # Random contrast adjustment
-        if np.random.random() > 0.4:
+        if rng.random() > 0.4:
             mean = np.mean(img)
-            factor = np.random.uniform(*self.contrast_range)
+            factor = rng.uniform(*self.contrast_range)
             img = (img - mean) * factor + mean
             img = np.clip(img, 0, 1)
         
         # Random shift
-        if np.random.random() > 0.5:
-            dx = np.random.randint(*self.shift_range)
-            dy = np.random.randint(*self.shift_range)
+        if rng.random() > 0.5:
+            dx = rng.integers(*self.shift_range)
+            dy = rng.integers(*self.shift_range)
             img = shift(img, (dy, dx), mode='constant', cval=0)
         
         # Random zoom
-        if np.random.random() > 0.6:
+        if rng.random() > 0.6:
             h, w = img.shape
-            zoom_factor = np.random.uniform(*self.zoom_range)
+            zoom_factor = rng.uniform(*self.zoom_range)
             
             # Zoom in and crop or zoom out and pad
             if zoom_factor > 1:  # Zoom in
@@ -200,42 +487,266 @@ class ImageAugmenter:
                 img = result
             
         return img
+    
+    def augment_batch(self, X, rng=None, out=None):
+        """
+        Apply random augmentations to a batch of images at once.
+        
+        Draws every random parameter for the batch up front, with the same
+        probabilities and ranges as `augment_image`. Flip, rotation, shift and
+        zoom are composed into one affine map per image and resampled with a
+        single bilinear `map_coordinates` call over the whole batch; rotation
+        clamps to the nearest edge pixel and shift/zoom fill with 0, as in
+        `augment_image`. Brightness and contrast then follow as whole-array
+        operations, after the warp as `augment_image` applies them after the
+        rotation, so the clipping acts on the rotated pixels; the shift and
+        zoom padding is blended in last, so it stays 0.
+        
+        The batch path is bilinear, whereas `augment_image` resamples with
+        scipy's default cubic splines. Against `augment_image` with scipy's
+        bilinear (order=1) interpolation, each transform on its own gives the
+        same pixels, including zoom's output size rounding and crop/pad
+        offsets. An image with several transforms is resampled once rather
+        than once per transform, so it differs from the sequential result by
+        the intermediate interpolation, and the contrast mean leaves out the
+        pixels that shifting and zooming move out of view.
+        
+        Args:
+            X (numpy.ndarray): Batch of images, (N, H, W) or (N, H, W, 1)
+            rng (numpy.random.Generator): Source of the random draws, e.g.
+                one per DataGenerator worker; the augmenter's own when None
+            out (numpy.ndarray): Contiguous float32 array of X's shape to
+                write the batch into; may be X itself to augment in place
+        
+        Returns:
+            numpy.ndarray: Augmented float32 batch with the shape of X
+            (`out` if given)
+        """
+        if out is None:
+            batch = np.array(X, dtype='float32').reshape(X.shape[:3])
+        else:
+            if out is not X:
+                np.copyto(out, X, casting='unsafe')
+            batch = out.reshape(X.shape[:3])
+        n, h, w = batch.shape
+        if n == 0:
+            return batch.reshape(X.shape)
+        
+        # Draw the parameters for the whole batch
+        rng = self.rng if rng is None else rng
+        flip = rng.random(n) < self.horizontal_flip_prob
+        rotate_mask = rng.random(n) > 0.4
+        angles = np.where(rotate_mask, rng.uniform(*self.rotation_range, n), 0.0)
+        brightness_mask = rng.random(n) > 0.3
+        brightness = rng.uniform(*self.brightness_range, n)
+        contrast_mask = rng.random(n) > 0.4
+        contrast = rng.uniform(*self.contrast_range, n)
+        shift_mask = rng.random(n) > 0.5
+        dx = np.where(shift_mask, rng.integers(*self.shift_range, n), 0)
+        dy = np.where(shift_mask, rng.integers(*self.shift_range, n), 0)
+        zoom_mask = rng.random(n) > 0.6
+        zooms = np.where(zoom_mask, rng.uniform(*self.zoom_range, n), 1.0)
+        
+        geometric = flip | rotate_mask | shift_mask | zoom_mask
+        idx = np.flatnonzero(geometric)
+        if len(idx):
+            coverage = self._warp_batch(batch, idx, flip, angles, dx, dy, zooms)
+        
+        # Brightness and contrast follow the warp, and the shift and zoom
+        # padding is blended in last, in augment_image's order
+        if brightness_mask.any():
+            batch[brightness_mask] = np.clip(
+                batch[brightness_mask] * brightness[brightness_mask, None, None].astype('float32'), 0, 1
+            )
+        if contrast_mask.any():
+            selected = batch[contrast_mask]
+            if len(idx):
+                # Leave out the pixels that the padding replaces
+                weights = np.ones(batch.shape, dtype='float32')
+                weights[idx] = coverage
+                weights = weights[contrast_mask]
+                mean = ((selected * weights).sum(axis=(1, 2), keepdims=True) /
+                        np.maximum(weights.sum(axis=(1, 2), keepdims=True), 1))
+            else:
+                mean = selected.mean(axis=(1, 2), keepdims=True)
+            factor = contrast[contrast_mask, None, None].astype('float32')
+            batch[contrast_mask] = np.clip((selected - mean) * factor + mean, 0, 1)
+        if len(idx):
+            if len(idx) == n:
+                batch *= coverage
+            else:
+                batch[idx] *= coverage
+        
+        return batch.reshape(X.shape)
+    
+    @staticmethod
+    def _warp_batch(batch, idx, flip, angles, dx, dy, zooms):
+        """
+        Resample the images `idx` of `batch` in place (see augment_batch).
+        
+        Returns:
+            numpy.ndarray: (len(idx), H, W) share of the image content in
+            each pixel, to blend with the shift and zoom-out padding; 0 where
+            the padding replaces it
+        """
+        n, h, w = batch.shape
+        # Map each output pixel back through zoom, shift, rotation and flip
+        # (the reverse of the order augment_image applies them in). Zoom and
+        # shift act on each axis separately, so they are computed per row and
+        # per column and only the rotation is evaluated on the full grid
+        center_y, center_x = (h - 1) / 2.0, (w - 1) / 2.0
+        zoom_y, zoomed_y = _zoom_source_coordinates(h, zooms[idx])
+        zoom_x, zoomed_x = _zoom_source_coordinates(w, zooms[idx])
+        shift_y = (zoom_y - dy[idx, None])[:, :, None]
+        shift_x = (zoom_x - dx[idx, None])[:, None, :]
+        
+        # Weight of the image content at each pixel: 0 where zoom-out padding
+        # or shifting leaves it empty, and the bilinear share of the content
+        # where zooming in blends a row or column with the shift padding
+        coverage = ((zoomed_y * np.clip(1 - np.maximum(-shift_y[:, :, 0], shift_y[:, :, 0] - (h - 1)), 0, 1))
+                    [:, :, None] *
+                    (zoomed_x * np.clip(1 - np.maximum(-shift_x[:, 0, :], shift_x[:, 0, :] - (w - 1)), 0, 1))
+                    [:, None, :])
+        shift_y -= center_y
+        shift_x -= center_x
+        
+        # Rotation about the center, with the flip folded into the column sign
+        theta = np.deg2rad(angles[idx, None, None])
+        cos, sin = np.cos(theta), np.sin(theta)
+        sign = np.where(flip[idx, None, None], -1.0, 1.0)
+        
+        # Sampling coordinates in the images stacked into a single
+        # (len(idx) * h, w) plane, written into one array; clipping keeps
+        # every sample within its own image and gives the 'nearest' edge mode
+        coordinates = np.empty((2, len(idx), h, w))
+        source_y, source_x = coordinates
+        np.add(cos * shift_y, sin * shift_x, out=source_y)
+        source_y += center_y
+        np.clip(source_y, 0, h - 1, out=source_y)
+        source_y += (np.arange(len(idx)) * h)[:, None, None]
+        np.subtract(cos * shift_x, sin * shift_y, out=source_x)
+        source_x *= sign
+        source_x += center_x
+        np.clip(source_x, 0, w - 1, out=source_x)
+        
+        # One bilinear resampling for the whole batch
+        stacked = batch.reshape(-1, w) if len(idx) == n else batch[idx].reshape(-1, w)
+        resampled = map_coordinates(stacked, coordinates, order=1, mode='nearest', prefilter=False)
+        if len(idx) == n:
+            batch[...] = resampled
+        else:
+            batch[idx] = resampled
+        return coverage.astype('float32')
 
 
 class DataGenerator:
     """Generates batches of data with optional augmentation for model training."""
     
-    def __init__(self, X, y, batch_size=32, augmenter=None, shuffle=True, random_state=None):
+    WORKER_TYPES = ('thread', 'process')
+    
+    def __init__(self, X, y, batch_size=32, augmenter=None, shuffle=True, random_state=None,
+                 normalization=None, num_workers=0, prefetch=2, worker_type='thread',
+                 reuse_buffers=False, contiguous=False):
         """
         Initialize the data generator.
         
+        Randomness comes from a SeedSequence seeded with `random_state`: every
+        epoch spawns one child stream for the shuffle and one augmentation
+        stream per worker (the synchronous mode uses worker 0's), so the
+        batches of a seeded generator do not depend on the global NumPy state,
+        on scheduling, or on whether workers are threads or processes.
+        
+        With num_workers > 0, batches are built ahead of the consumer by a pool
+        of workers; batch i is always built by worker i % num_workers, so
+        num_workers=1 reproduces the synchronous mode. Batches are written into
+        preallocated slots (shared memory for processes, so they are never
+        pickled) and copied out when consumed, unless reuse_buffers is set.
+        Call close() to stop the workers.
+        
+        reuse_buffers and contiguous select the same samples in the same order
+        and only change how batches are assembled, so the batch values are
+        identical in every mode.
+        
         Args:
             X (numpy.ndarray): Input image data
             y (numpy.ndarray): Target labels
             batch_size (int): Size of batches to generate
             augmenter (ImageAugmenter): Optional augmenter for data augmentation
             shuffle (bool): Whether to shuffle data before batching
-            random_state (int): Random seed for reproducibility
+            random_state (int or numpy.random.SeedSequence): Root seed of the
+                shuffle and augmentation streams; fresh entropy when None
+            normalization (dict): 'scale'/'offset' applied to each batch of
+                integer images before augmentation; None leaves X as is
+            num_workers (int): Workers preparing batches in the background;
+                0 builds every batch synchronously in __next__
+            prefetch (int): Batches each worker may have ready or in progress
+            worker_type (str): 'thread', or 'process' for worker processes,
+                which parallelize augmentation past the GIL. They are
+                started with forkserver (spawn where it is unavailable),
+                never forked from a process that may have loaded TensorFlow,
+                and read X and y from one shared memory copy
+            reuse_buffers (bool): Gather with np.take into preallocated batch
+                buffers (the worker slots when prefetching) and normalize and
+                augment them in place, so no per-batch arrays are allocated.
+                A yielded batch is overwritten once the next one is requested
+            contiguous (bool): Gather X and y into a reused pre-shuffled copy
+                once per epoch (one more dataset-sized buffer) and take every
+                batch as a contiguous slice of it. Without normalization or
+                augmentation the batches are views of that copy, valid until
+                the next epoch starts
         """
+        if worker_type not in self.WORKER_TYPES:
+            raise ValueError(f"worker_type must be one of {self.WORKER_TYPES}, got {worker_type!r}")
+        
         self.X = X
         self.y = y
         self.batch_size = batch_size
         self.augmenter = augmenter
         self.shuffle = shuffle
+        self.normalization = normalization if np.issubdtype(X.dtype, np.integer) else None
+        self.random_state = random_state
+        self.seed_sequence = (random_state if isinstance(random_state, np.random.SeedSequence)
+                              else np.random.SeedSequence(random_state))
+        self.epoch = -1
+        self.num_workers = num_workers
+        self.prefetch = max(1, prefetch)
+        self.worker_type = worker_type
+        self.reuse_buffers = reuse_buffers
+        self.contiguous = contiguous
+        
+        # Reused buffers, created on first use
+        self._buffers = None
+        self._epoch_X = self._epoch_y = None
         
-        if random_state is not None:
-            np.random.seed(random_state)
+        # Prefetch state, created on the first epoch
+        self._workers = []
+        self._tasks = []
+        self._done = []
+        self._shared_memory = []
+        self._shared_arrays = {}
+        self._slot_X = self._slot_y = None
+        self._submitted = self._received = 0
+        self._held = False
     
     def __len__(self):
         """Return the number of batches in the dataset."""
         return int(np.ceil(len(self.X) / self.batch_size))
     
     def __iter__(self):
-        """Make the generator iterable."""
+        """Make the generator iterable; every call starts a new epoch."""
+        self.epoch += 1
         self.current_index = 0
+        if self.num_workers > 0:
+            # Workers must be done with the previous epoch before its buffers are refilled
+            self._drain()
         self.indices = np.arange(len(self.X))
         if self.shuffle:
-            np.random.shuffle(self.indices)
+            self.epoch_rng(0).shuffle(self.indices)
+        if self.contiguous:
+            self._gather_epoch()
+        self._augment_rng = self.epoch_rng(1)
+        if self.num_workers > 0:
+            self._start_epoch()
         return self
     
     def __next__(self):
@@ -243,30 +754,287 @@ class DataGenerator:
         if self.current_index >= len(self.X):
             raise StopIteration
         
-        batch_indices = self.indices[self.current_index:self.current_index + self.batch_size]
+        if self.num_workers > 0:
+            return self._next_prefetched()
+        
+        rows = self._rows(self.current_index)
         self.current_index += self.batch_size
+        if not self.reuse_buffers:
+            return self._make_batch(rows, self._augment_rng)
+        
+        if self._buffers is None:
+            self._buffers = (self._staging_buffer(),
+                             np.empty((self.batch_size,) + self.X.shape[1:], dtype=self._batch_dtype()),
+                             np.empty((self.batch_size,) + self.y.shape[1:], dtype=self.y.dtype))
+        stage, buffer_X, buffer_y = self._buffers
+        n = self._row_count(rows)
+        return self._make_batch(rows, self._augment_rng, (buffer_X[:n], buffer_y[:n]), stage)
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+    
+    def epoch_rng(self, stream, epoch=None):
+        """
+        Generator of one child stream of an epoch.
         
-        batch_X = self.X[batch_indices].copy()
-        batch_y = self.y[batch_indices].copy()
+        Equal to default_rng(self.seed_sequence.spawn(...)[epoch].spawn(...)[stream])
+        but computed directly from the spawn key, so worker processes derive
+        the same streams as the parent without sharing spawn counters.
         
-        # Apply augmentation if available
+        Args:
+            stream (int): 0 for the shuffle, 1 + i for worker i's augmentation
+            epoch (int): Epoch number; the current epoch when None
+            
+        Returns:
+            numpy.random.Generator: Independent, reproducible stream
+        """
+        epoch = self.epoch if epoch is None else epoch
+        seed = np.random.SeedSequence(self.seed_sequence.entropy,
+                                      spawn_key=self.seed_sequence.spawn_key + (epoch, stream),
+                                      pool_size=self.seed_sequence.pool_size)
+        return np.random.default_rng(seed)
+    
+    def _batch_dtype(self):
+        """dtype of the images in the yielded batches."""
+        return np.dtype('float32') if self.normalization is not None or self.augmenter else self.X.dtype
+    
+    def _staging_buffer(self):
+        """Batch-sized buffer in X's dtype that np.take gathers into before conversion, if needed."""
+        if self._batch_dtype() == self.X.dtype:
+            return None
+        return np.empty((self.batch_size,) + self.X.shape[1:], dtype=self.X.dtype)
+    
+    def _rows(self, start):
+        """Rows of the batch at `start`: a slice of the epoch copy, or indices into X."""
+        stop = min(start + self.batch_size, len(self.X))
+        return slice(start, stop) if self.contiguous else self.indices[start:stop]
+    
+    @staticmethod
+    def _row_count(rows):
+        return rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+    
+    def _gather_epoch(self):
+        """Copy X and y into the reused epoch buffers in this epoch's order."""
+        if self._epoch_X is None:
+            self._epoch_X = np.empty(self.X.shape, dtype=self.X.dtype)
+            self._epoch_y = np.empty(self.y.shape, dtype=self.y.dtype)
+        # The indices are always in range; mode='clip' lets np.take write
+        # straight into `out`, which the default mode='raise' buffers
+        np.take(self.X, self.indices, axis=0, out=self._epoch_X, mode='clip')
+        np.take(self.y, self.indices, axis=0, out=self._epoch_y, mode='clip')
+    
+    def _make_batch(self, rows, rng, out=None, stage=None):
+        """
+        Gather, normalize and augment one batch.
+        
+        Args:
+            rows: Indices into X, or a slice of the pre-shuffled epoch copy
+            rng (numpy.random.Generator): Augmentation stream
+            out (tuple): (X, y) buffers of the batch's length to fill in place;
+                new arrays are returned when None
+            stage (numpy.ndarray): Staging buffer from _staging_buffer()
+            
+        Returns:
+            tuple: (batch_X, batch_y)
+        """
+        source_X, source_y = (self._epoch_X, self._epoch_y) if self.contiguous else (self.X, self.y)
+        if out is None:
+            # Fancy indexing already copies; normalize only the rows of this batch
+            batch_X, batch_y = source_X[rows], source_y[rows]
+            if self.normalization is not None:
+                batch_X = normalize_pixels(batch_X, self.normalization)
+            if self.augmenter:
+                batch_X = self.augmenter.augment_batch(batch_X, rng)
+            return batch_X, batch_y
+        
+        batch_X, batch_y = out
+        if isinstance(rows, slice):
+            raw_X = source_X[rows]
+            np.copyto(batch_y, source_y[rows])
+        else:
+            # mode='clip' avoids the temporary that mode='raise' buffers `out` through
+            raw_X = np.take(source_X, rows, axis=0, mode='clip',
+                            out=batch_X if stage is None else stage[:len(rows)])
+            np.take(source_y, rows, axis=0, out=batch_y, mode='clip')
+        if self.normalization is not None:
+            normalize_pixels(raw_X, self.normalization, out=batch_X)
+        elif raw_X is not batch_X:
+            np.copyto(batch_X, raw_X, casting='unsafe')
         if self.augmenter:
-            for i in range(len(batch_X)):
-                batch_X[i] = self.augmenter.augment_image(batch_X[i])
+            self.augmenter.augment_batch(batch_X, rng, out=batch_X)
+        return batch_X, batch_y
+    
+    def _shared_array(self, name, shape, dtype):
+        """Array in a new shared memory block, which worker processes attach to as attribute `name`."""
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self._shared_memory.append(shm)
+        self._shared_arrays[name] = (shm, shape, dtype)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    
+    def __getstate__(self):
+        # What a worker process receives: the shared arrays travel as the
+        # names of their blocks, and the parent's workers and buffers stay behind
+        state = self.__dict__.copy()
+        for name in self._shared_arrays:
+            state[name] = None
+        state.update(_workers=[], _shared_memory=[], _buffers=None, indices=None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name, (shm, shape, dtype) in self._shared_arrays.items():
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    
+    def _start_workers(self):
+        """Allocate the batch slots and start the workers."""
+        x_shape = (self.num_workers, self.prefetch, self.batch_size) + self.X.shape[1:]
+        y_shape = (self.num_workers, self.prefetch, self.batch_size) + self.y.shape[1:]
         
+        if self.worker_type == 'process':
+            # Forking after TensorFlow has started its threads can deadlock the
+            # child, so workers start from a clean interpreter and attach to the
+            # slots and a shared copy of X and y by name (see __getstate__)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._slot_X = self._shared_array('_slot_X', x_shape, self._batch_dtype())
+            self._slot_y = self._shared_array('_slot_y', y_shape, self.y.dtype)
+            np.copyto(self._shared_array('X', self.X.shape, self.X.dtype), self.X)
+            np.copyto(self._shared_array('y', self.y.shape, self.y.dtype), self.y)
+            if self.contiguous:
+                self._epoch_X = self._shared_array('_epoch_X', self.X.shape, self.X.dtype)
+                self._epoch_y = self._shared_array('_epoch_y', self.y.shape, self.y.dtype)
+            self._tasks = [context.SimpleQueue() for _ in range(self.num_workers)]
+            self._done = [context.Queue() for _ in range(self.num_workers)]
+            worker_class = context.Process
+        else:
+            self._slot_X = np.empty(x_shape, dtype=self._batch_dtype())
+            self._slot_y = np.empty(y_shape, dtype=self.y.dtype)
+            self._tasks = [queue.SimpleQueue() for _ in range(self.num_workers)]
+            self._done = [queue.Queue() for _ in range(self.num_workers)]
+            worker_class = threading.Thread
+        
+        for worker_id in range(self.num_workers):
+            worker = worker_class(target=self._worker_loop, args=(worker_id,), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+    
+    def _worker_loop(self, worker_id):
+        """Build the batches submitted to one worker, in order, until told to stop."""
+        tasks, done = self._tasks[worker_id], self._done[worker_id]
+        stage = self._staging_buffer()
+        epoch, rng = None, None
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            task_epoch, batch_number, slot, rows = task
+            if task_epoch != epoch:
+                epoch, rng = task_epoch, self.epoch_rng(1 + worker_id, task_epoch)
+            try:
+                n = self._row_count(rows)
+                self._make_batch(rows, rng, (self._slot_X[worker_id, slot, :n], self._slot_y[worker_id, slot, :n]),
+                                 stage)
+                done.put((batch_number, None))
+            except Exception:
+                done.put((batch_number, traceback.format_exc()))
+    
+    def _slot(self, batch_number):
+        return batch_number % self.num_workers, (batch_number // self.num_workers) % self.prefetch
+    
+    def _submit(self):
+        """Hand the next batch of the epoch to its worker."""
+        batch_number = self._submitted
+        worker_id, slot = self._slot(batch_number)
+        self._tasks[worker_id].put((self.epoch, batch_number, slot, self._rows(batch_number * self.batch_size)))
+        self._submitted += 1
+    
+    def _receive(self):
+        """Wait for the oldest submitted batch to be ready in its slot."""
+        worker_id, slot = self._slot(self._received)
+        while True:
+            try:
+                batch_number, error = self._done[worker_id].get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not self._workers[worker_id].is_alive():
+                    raise RuntimeError(f"DataGenerator worker {worker_id} exited unexpectedly")
+        if error is not None:
+            raise RuntimeError(f"DataGenerator worker {worker_id} failed on batch {batch_number}:\n{error}")
+        self._received += 1
+        return worker_id, slot
+    
+    def _drain(self):
+        """Start the workers, or wait out the batches left from an unfinished epoch."""
+        if not self._workers:
+            self._start_workers()
+        while self._received < self._submitted:
+            self._receive()
+        self._submitted = self._received = 0
+        self._held = False
+    
+    def _start_epoch(self):
+        """Queue the first batches of the new epoch."""
+        while self._submitted < min(len(self), self.num_workers * self.prefetch):
+            self._submit()
+    
+    def _next_prefetched(self):
+        """Take the next batch out of its slot and refill the slot."""
+        if self._held:
+            # The consumer has moved on from the batch it was handed last time
+            self._held = False
+            if self._submitted < len(self):
+                self._submit()
+        
+        worker_id, slot = self._receive()
+        n = min(self.batch_size, len(self.X) - self.current_index)
+        self.current_index += self.batch_size
+        batch_X = self._slot_X[worker_id, slot, :n]
+        batch_y = self._slot_y[worker_id, slot, :n]
+        if self.reuse_buffers:
+            # Hand out the slot itself and refill it on the next call
+            self._held = True
+            return batch_X, batch_y
+        
+        batch_X, batch_y = batch_X.copy(), batch_y.copy()
+        
+        # The slot is free again: reuse it for the batch num_workers * prefetch ahead
+        if self._submitted < len(self):
+            self._submit()
         return batch_X, batch_y
     
+    def close(self):
+        """Stop the prefetch workers and release their shared memory."""
+        for tasks in self._tasks:
+            tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if self.worker_type == 'process' and worker.is_alive():
+                worker.terminate()
+        self._workers, self._tasks, self._done = [], [], []
+        self._slot_X = self._slot_y = None
+        if self._shared_memory:
+            self._epoch_X = self._epoch_y = None
+        for shm in self._shared_memory:
+            try:
+                shm.close()
+            except BufferError:
+                # A batch handed out with reuse_buffers still references the block
+                pass
+            shm.unlink()
+        self._shared_memory = []
+        self._shared_arrays = {}
+        self._submitted = self._received = 0
+        self._held = False
+    
     def generate(self):
         """Generator function to yield batches of data indefinitely."""
         while True:
-            # Reset the iterator
-            self.current_index = 0
-            if self.shuffle:
-                np.random.shuffle(self.indices)
-                
-            # Yield batches until data is exhausted
-            while self.current_index < len(self.X):
-                yield next(self)
+            # Each pass over iter() starts a new, reshuffled epoch
+            yield from iter(self)
 
 
 def load_fashion_mnist_dataset(val_split=0.2, random_state=42, normalize=True):
@@ -290,7 +1058,9 @@ def load_fashion_mnist_dataset(val_split=0.2, random_state=42, normalize=True):
             dataset.X_test, dataset.y_test)
 
 
-def create_train_generator(X_train, y_train, batch_size=32, augment=True, random_state=None):
+def create_train_generator(X_train, y_train, batch_size=32, augment=True, random_state=None,
+                           normalization=None, num_workers=0, prefetch=2, worker_type='thread',
+                           reuse_buffers=False, contiguous=False):
     """
     Create a data generator for training.
     
@@ -300,6 +1070,14 @@ def create_train_generator(X_train, y_train, batch_size=32, augment=True, random
         batch_size (int): Batch size
         augment (bool): Whether to apply augmentation
         random_state (int): Random seed for reproducibility
+        normalization (dict): Per-batch scale/offset for uint8 data
+            (e.g. `FashionMNISTDataset.normalization` with lazy_normalize)
+        num_workers (int): Background workers building batches ahead (0: none)
+        prefetch (int): Batches each worker may prepare ahead
+        worker_type (str): 'thread' or 'process'
+        reuse_buffers (bool): Assemble batches in reused buffers (each batch
+            is overwritten by the next)
+        contiguous (bool): Slice batches from a pre-shuffled copy per epoch
         
     Returns:
         DataGenerator: Generator for training data
@@ -310,10 +1088,13 @@ def create_train_generator(X_train, y_train, batch_size=32, augment=True, random
     
     return DataGenerator(X_train, y_train, batch_size=batch_size, 
                         augmenter=augmenter, shuffle=True, 
-                        random_state=random_state)
+                        random_state=random_state, normalization=normalization,
+                        num_workers=num_workers, prefetch=prefetch, worker_type=worker_type,
+                        reuse_buffers=reuse_buffers, contiguous=contiguous)
 
 
-def create_val_generator(X_val, y_val, batch_size=32, random_state=None):
+def create_val_generator(X_val, y_val, batch_size=32, random_state=None, normalization=None,
+                         reuse_buffers=False):
     """
     Create a data generator for validation.
     
@@ -322,6 +1103,9 @@ def create_val_generator(X_val, y_val, batch_size=32, random_state=None):
         y_val (numpy.ndarray): Validation labels
         batch_size (int): Batch size
         random_state (int): Random seed for reproducibility
+        normalization (dict): Per-batch scale/offset for uint8 data
+        reuse_buffers (bool): Assemble batches in a reused buffer (each batch
+            is overwritten by the next)
         
     Returns:
         DataGenerator: Generator for validation data
@@ -329,4 +1113,5 @@ def create_val_generator(X_val, y_val, batch_size=32, random_state=None):
     # No augmentation for validation data
     return DataGenerator(X_val, y_val, batch_size=batch_size, 
                         augmenter=None, shuffle=False, 
-                        random_state=random_state)
\ No newline at end of file
+                        random_state=random_state, normalization=normalization,
+                        reuse_buffers=reuse_buffers)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""Tests for the augmentation and batch generation in data.py."""
+
+import functools
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import scipy.ndimage
+
+import data
+from data import ImageAugmenter
+
+
+class AlwaysRng:
+    """Stand-in Generator that takes every augment_image/augment_batch branch with the lowest parameter."""
+
+    def random(self, size=None):
+        return 0.99 if size is None else np.full(size, 0.99)
+
+    def uniform(self, low, high, size=None):
+        return low if size is None else np.full(size, low)
+
+    def integers(self, low, high, size=None):
+        return low if size is None else np.full(size, low)
+
+
+IDENTITY = dict(rotation_range=(0, 0), brightness_range=(1, 1), contrast_range=(1, 1),
+                shift_range=(0, 1), zoom_range=(1, 1), horizontal_flip_prob=0.0)
+
+TRANSFORMS = {
+    'flip': dict(horizontal_flip_prob=1.0),
+    'rotate_15': dict(rotation_range=(15, 15)),
+    'rotate_-10': dict(rotation_range=(-10, -10)),
+    'shift_2': dict(shift_range=(2, 3)),
+    'shift_-2': dict(shift_range=(-2, -1)),
+    'zoom_0.9': dict(zoom_range=(0.9, 0.9)),
+    'zoom_0.95': dict(zoom_range=(0.95, 0.95)),
+    'zoom_1.05': dict(zoom_range=(1.05, 1.05)),
+    'zoom_1.1': dict(zoom_range=(1.1, 1.1)),
+    'brightness_1.2': dict(brightness_range=(1.2, 1.2)),
+    'contrast_0.7': dict(contrast_range=(0.7, 0.7)),
+}
+
+
+@pytest.fixture
+def images():
+    rng = np.random.default_rng(0)
+    blobs = scipy.ndimage.gaussian_filter(rng.random((32, 28, 28)), sigma=(0, 2, 2))
+    return np.clip(blobs * 3 - 1, 0, 1).astype('float32')
+
+
+@pytest.fixture
+def bilinear_scipy(monkeypatch):
+    # augment_image uses scipy's default cubic splines; augment_batch is bilinear
+    for name in ('rotate', 'shift', 'zoom'):
+        monkeypatch.setattr(data, name, functools.partial(getattr(scipy.ndimage, name), order=1))
+
+
+@pytest.mark.parametrize('transform', TRANSFORMS)
+def test_augment_batch_matches_scipy_per_transform(images, bilinear_scipy, transform):
+    augmenter = ImageAugmenter(**{**IDENTITY, **TRANSFORMS[transform]}, random_state=0)
+    expected = np.stack([augmenter.augment_image(image, rng=AlwaysRng()) for image in images])
+
+    augmented = augmenter.augment_batch(images)
+
+    # Each image either drew the transform or was left unchanged
+    transformed = np.abs(augmented - expected).max(axis=(1, 2)) < 1e-5
+    unchanged = np.abs(augmented - images).max(axis=(1, 2)) < 1e-5
+    assert transformed.any()
+    assert (transformed | unchanged).all()
+
+
+@pytest.mark.parametrize('zoom_factor', [0.9, 1.1])
+def test_augment_batch_approximates_scipy_with_every_transform(images, bilinear_scipy, zoom_factor):
+    augmenter = ImageAugmenter(rotation_range=(10, 10), brightness_range=(1.3, 1.3), contrast_range=(0.7, 0.7),
+                               shift_range=(2, 3), zoom_range=(zoom_factor, zoom_factor),
+                               horizontal_flip_prob=1.0)
+    expected = np.stack([augmenter.augment_image(image, rng=AlwaysRng()) for image in images])
+
+    augmented = augmenter.augment_batch(images, rng=AlwaysRng())
+
+    # One resampling instead of three, and a contrast mean over the pixels that stay in view
+    difference = np.abs(augmented - expected)
+    assert difference.mean() < 0.01
+    assert difference.max() < 0.05
+    # The shift and zoom padding stays empty
+    assert (augmented[expected == 0] == 0).all()
+
+
+def test_augment_batch_is_reproducible(images):
+    first = ImageAugmenter(random_state=7).augment_batch(images)
+    second = ImageAugmenter(random_state=7).augment_batch(images)
+    np.testing.assert_array_equal(first, second)
+    assert first.dtype == np.float32 and first.shape == images.shape
+
+
+def epochs_of(generator, num_epochs=2):
+    """Copies of every batch of `num_epochs` epochs; reused buffers are overwritten later."""
+    try:
+        return [[(X.copy(), y.copy()) for X, y in generator] for _ in range(num_epochs)]
+    finally:
+        generator.close()
+
+
+def make_generator(X, y, augment, **options):
+    augmenter = ImageAugmenter(random_state=0) if augment else None
+    normalization = dict(data.DEFAULT_NORMALIZATION) if X.dtype == np.uint8 else None
+    return data.DataGenerator(X, y, batch_size=16, augmenter=augmenter, shuffle=True, random_state=3,
+                              normalization=normalization, **options)
+
+
+def assert_same_epochs(actual, expected):
+    assert len(actual) == len(expected)
+    for actual_epoch, expected_epoch in zip(actual, expected):
+        assert len(actual_epoch) == len(expected_epoch)
+        for (X, y), (expected_X, expected_y) in zip(actual_epoch, expected_epoch):
+            assert X.dtype == expected_X.dtype
+            np.testing.assert_array_equal(y, expected_y)
+            np.testing.assert_array_equal(X, expected_X)
+
+
+ASSEMBLY_OPTIONS = [dict(), dict(reuse_buffers=True), dict(contiguous=True),
+                    dict(reuse_buffers=True, contiguous=True)]
+
+
+@pytest.fixture(params=['uint8', 'float32'])
+def dataset(request):
+    rng = np.random.default_rng(1)
+    # 100 rows: the last batch of each epoch is partial
+    X = rng.integers(0, 256, (100, 28, 28), dtype=np.uint8)
+    if request.param == 'float32':
+        X = data.normalize_pixels(X)
+    return X, rng.integers(0, 10, 100).astype(np.uint8)
+
+
+@pytest.mark.parametrize('augment', [False, True])
+@pytest.mark.parametrize('options', ASSEMBLY_OPTIONS + [
+    dict(num_workers=1, **assembly) for assembly in ASSEMBLY_OPTIONS
+] + [dict(num_workers=1, worker_type='process', reuse_buffers=True)])
+def test_generator_modes_match_synchronous_batches(dataset, augment, options):
+    X, y = dataset
+    expected = epochs_of(make_generator(X, y, augment))
+    assert_same_epochs(epochs_of(make_generator(X, y, augment, **options)), expected)
+
+
+@pytest.mark.parametrize('options', ASSEMBLY_OPTIONS + [dict(worker_type='process'),
+                                                        dict(worker_type='process', contiguous=True)])
+def test_worker_pool_modes_match_each_other(dataset, options):
+    X, y = dataset
+    expected = epochs_of(make_generator(X, y, True, num_workers=3))
+    assert_same_epochs(epochs_of(make_generator(X, y, True, num_workers=3, prefetch=1, **options)), expected)
+
+
+def test_worker_processes_start_without_tensorflow(dataset):
+    X, y = dataset
+    generator = make_generator(X, y, True, num_workers=1, worker_type='process')
+    try:
+        next(iter(generator))
+        worker = generator._workers[0]
+        # Not forked from a parent that may hold TensorFlow's threads, and importing data does not load it
+        assert worker._start_method in ('forkserver', 'spawn')
+        assert 'tensorflow' not in subprocess.run(
+            [sys.executable, '-c', 'import sys, data; print(sorted(sys.modules))'],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(data.__file__)).stdout
+    finally:
+        generator.close()
+
+
+def test_generator_covers_each_sample_once_per_epoch(dataset):
+    X, y = dataset
+    for epoch in epochs_of(make_generator(X, y, False, num_workers=2, contiguous=True)):
+        assert [len(batch_y) for _, batch_y in epoch] == [16] * 6 + [4]
+        np.testing.assert_array_equal(np.sort(np.concatenate([batch_y for _, batch_y in epoch])), np.sort(y))
+
+
+def test_generator_ignores_global_numpy_state(dataset):
+    X, y = dataset
+    np.random.seed(0)
+    first = epochs_of(make_generator(X, y, True))
+    np.random.seed(1)
+    np.random.random(100)
+    assert_same_epochs(epochs_of(make_generator(X, y, True)), first)
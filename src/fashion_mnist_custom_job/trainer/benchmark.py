@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Training throughput benchmark for the Fashion MNIST custom job.
+
+Runs warmup steps and then timed training steps for every combination of
+input pipeline and batch size, and prints one JSON record per run with
+steps/sec, images/sec, the fraction of step time spent waiting for input
+and the peak resident memory of the process (a high-water mark, so it
+covers every run up to and including the current one):
+
+    python -m trainer.benchmark --input-pipelines tfdata generator \\
+        --batch-sizes 32 128 --steps 200 --output benchmark.json
+
+--profile-dir captures a TensorBoard profiler trace of a window of the
+measured steps of each run (--profile-steps START END, counted from the
+first measured step).
+"""
+
+import os
+import json
+import time
+import argparse
+import datetime
+import resource
+import itertools
+import numpy as np
+import tensorflow as tf
+from trainer.train import load_data, build_model, create_data_generators
+from trainer.input_pipeline import create_tf_datasets
+from trainer.data_source import DEFAULT_CACHE_DIR, DEFAULT_INPUT_NORMALIZATION
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark training step throughput')
+    parser.add_argument('--input-pipelines', type=str, nargs='+', default=['tfdata'],
+                        choices=['tfdata', 'generator'], help='Input pipelines to benchmark')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32], help='Batch sizes to benchmark')
+    parser.add_argument('--warmup-steps', type=int, default=20, help='Untimed steps before measuring')
+    parser.add_argument('--steps', type=int, default=100, help='Measured steps per run')
+    parser.add_argument('--learning-rate', type=float, default=0.001, help='Learning rate')
+    parser.add_argument('--dropout-rate', type=float, default=0.25, help='Dropout rate for convolutional layers')
+    parser.add_argument('--dense-dropout-rate', type=float, default=0.5, help='Dropout rate for dense layer')
+    parser.add_argument('--data-uri', type=str, default=None,
+                        help='Local path or gs:// URI of a fashion_mnist .npz, or .npy or TFRecord directory (default: keras.datasets)')
+    parser.add_argument('--data-cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help='Local cache for datasets read from gs://')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Use random images instead of downloading Fashion MNIST')
+    parser.add_argument('--profile-dir', type=str, default=None,
+                        help='Capture a TensorBoard profiler trace into this directory')
+    parser.add_argument('--profile-steps', type=int, nargs=2, default=[10, 15], metavar=('START', 'END'),
+                        help='Measured-step window to trace')
+    parser.add_argument('--output', type=str, default=None, help='Also write the JSON results to this file')
+    return parser.parse_args()
+
+
+def synthetic_data(num_train=55000, num_valid=5000):
+    rng = np.random.RandomState(42)
+    X_train = rng.randint(0, 256, (num_train, 28, 28, 1), dtype=np.uint8)
+    y_train = rng.randint(0, 10, num_train).astype(np.uint8)
+    X_valid = rng.randint(0, 256, (num_valid, 28, 28, 1), dtype=np.uint8)
+    y_valid = rng.randint(0, 10, num_valid).astype(np.uint8)
+    return X_train, y_train, X_valid, y_valid
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_run(args, input_pipeline, batch_size, X_train, y_train, X_valid, y_valid,
+                  normalization=DEFAULT_INPUT_NORMALIZATION):
+    """
+    Time `args.steps` training steps after `args.warmup_steps` untimed ones.
+
+    Each step is split into fetching the next batch from the pipeline (input
+    wait) and running the compiled train step to completion.
+    """
+    if input_pipeline == 'tfdata':
+        train_data, _ = create_tf_datasets(X_train, y_train, X_valid, y_valid, batch_size, normalization)
+    else:
+        train_data, _ = create_data_generators(X_train, y_train, X_valid, y_valid, batch_size, normalization)
+    batches = iter(train_data)
+
+    model = build_model(args.dropout_rate, args.dense_dropout_rate, args.learning_rate)
+    train_step = tf.function(model.train_step, reduce_retracing=True)
+
+    def run_step(step_num=None):
+        fetch_start = time.perf_counter()
+        x, y = next(batches)
+        x, y = tf.convert_to_tensor(x), tf.convert_to_tensor(y)
+        fetch_end = time.perf_counter()
+        if step_num is None:
+            logs = train_step((x, y))
+        else:
+            with tf.profiler.experimental.Trace('train', step_num=step_num, _r=1):
+                logs = train_step((x, y))
+        # Block until the step has actually run
+        float(logs['loss'])
+        return fetch_end - fetch_start, time.perf_counter() - fetch_start
+
+    for _ in range(args.warmup_steps):
+        run_step()
+
+    profile_start, profile_end = args.profile_steps
+    profiling = False
+    input_wait = 0.0
+    step_times = []
+    start_time = time.perf_counter()
+    for step in range(args.steps):
+        if args.profile_dir and step == profile_start:
+            tf.profiler.experimental.start(
+                os.path.join(args.profile_dir, f"{input_pipeline}_bs{batch_size}")
+            )
+            profiling = True
+        wait, total = run_step(step if profiling else None)
+        input_wait += wait
+        step_times.append(total)
+        if profiling and step + 1 >= profile_end:
+            tf.profiler.experimental.stop()
+            profiling = False
+    elapsed = time.perf_counter() - start_time
+    if profiling:
+        tf.profiler.experimental.stop()
+
+    step_ms = np.array(step_times) * 1000
+    return {
+        "input_pipeline": input_pipeline,
+        "batch_size": batch_size,
+        "warmup_steps": args.warmup_steps,
+        "steps": args.steps,
+        "elapsed_s": elapsed,
+        "steps_per_second": args.steps / elapsed,
+        "images_per_second": args.steps * batch_size / elapsed,
+        "input_wait_fraction": input_wait / elapsed,
+        "step_ms": {
+            "p50": float(np.percentile(step_ms, 50)),
+            "p95": float(np.percentile(step_ms, 95)),
+            "max": float(step_ms.max())
+        },
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main():
+    args = parse_args()
+
+    np.random.seed(42)
+    tf.random.set_seed(42)
+
+    if args.synthetic:
+        X_train, y_train, X_valid, y_valid = synthetic_data()
+        normalization = dict(DEFAULT_INPUT_NORMALIZATION)
+    else:
+        X_train, y_train, X_valid, y_valid, _, _, normalization = load_data(args.data_uri, args.data_cache_dir)
+
+    results = []
+    for input_pipeline, batch_size in itertools.product(args.input_pipelines, args.batch_sizes):
+        print(f"Benchmarking {input_pipeline} pipeline at batch size {batch_size}...")
+        result = benchmark_run(args, input_pipeline, batch_size, X_train, y_train, X_valid, y_valid,
+                               normalization)
+        print(f"  {result['steps_per_second']:.1f} steps/sec, {result['images_per_second']:.1f} images/sec, "
+              f"input wait {result['input_wait_fraction']:.1%}")
+        results.append(result)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "tensorflow": tf.__version__,
+        "cpu_count": os.cpu_count(),
+        "model": {
+            "learning_rate": args.learning_rate,
+            "dropout_rate": args.dropout_rate,
+            "dense_dropout_rate": args.dense_dropout_rate
+        },
+        "synthetic_data": args.synthetic,
+        "profile_dir": args.profile_dir,
+        "runs": results
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with tf.io.gfile.GFile(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Resumable training-state checkpoints for preemptible training jobs.
+
+A checkpoint is a single .npz holding everything needed to continue
+training where it stopped: model weights, optimizer slots and iteration
+count, the current learning rate, the next epoch, NumPy's global RNG
+state, the state of TensorFlow's global tf.random.Generator and of the
+layers' own generators, and the internal state of the EarlyStopping,
+ReduceLROnPlateau and ModelCheckpoint callbacks.
+
+Keras only gives layers such as Dropout a tf.random.Generator when
+tf.keras.backend.experimental.enable_tf_random_generator() is called
+before the model is built. By default they use legacy stateful random
+ops, whose position in the stream lives inside the TF runtime and cannot
+be saved: a resumed job then draws new dropout masks from the op seeds
+derived from tf.random.set_seed, rather than continuing the interrupted
+run's sequence.
+
+The callback snapshots this state on the training thread at the end of an
+epoch (cheap host copies) and hands it to a background thread, which
+serializes it and writes it through tf.io.gfile, so local directories and
+gs:// paths behave the same. Files are written under a temporary name and
+renamed into place, and only the newest `keep` checkpoints are kept.
+"""
+
+import io
+import os
+import json
+import queue
+import threading
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback, EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
+
+CHECKPOINT_PATTERN = 'ckpt-{epoch:05d}.npz'
+
+# Per-callback attributes that Keras resets or accumulates during training
+CALLBACK_STATE = {
+    EarlyStopping: ('wait', 'stopped_epoch', 'best', 'best_epoch'),
+    ReduceLROnPlateau: ('wait', 'cooldown_counter', 'best'),
+    ModelCheckpoint: ('best',),
+}
+
+
+def _optimizer_variables(optimizer):
+    variables = optimizer.variables
+    # Legacy optimizers expose variables() as a method
+    if callable(variables) and not isinstance(variables, list):
+        variables = variables()
+    return list(variables)
+
+
+def _to_builtin(value):
+    if isinstance(value, (np.floating, np.integer)):
+        return value.item()
+    return value
+
+
+def _random_generators(model):
+    """
+    The tf.random.Generators that training draws from, in a stable order.
+
+    The global generator comes first, then the generator of each layer
+    that has one (see the module docstring), created now if the layer
+    has not been called yet.
+    """
+    generators = [tf.random.get_global_generator()]
+    for layer in model.submodules:
+        # Keras keeps the per-layer RNG in a private RandomGenerator wrapper
+        random_generator = getattr(layer, '_random_generator', None)
+        if getattr(random_generator, '_rng_type', None) != 'stateful':
+            continue
+        random_generator._maybe_init()
+        generators.append(random_generator._generator)
+    return generators
+
+
+def list_checkpoints(checkpoint_dir):
+    """Checkpoint paths in `checkpoint_dir`, oldest first."""
+    if not tf.io.gfile.exists(checkpoint_dir):
+        return []
+    names = [name for name in tf.io.gfile.listdir(checkpoint_dir)
+             if name.startswith('ckpt-') and name.endswith('.npz')]
+    return [os.path.join(checkpoint_dir, name) for name in sorted(names)]
+
+
+class TrainingStateCheckpoint(Callback):
+    """
+    Periodically checkpoints the full training state in the background.
+
+    Place it after the callbacks whose state it tracks: Keras resets their
+    state in on_train_begin, and restored values are applied afterwards.
+    """
+
+    def __init__(self, checkpoint_dir, every_n_epochs=1, keep=3, callbacks=(), write=True):
+        """
+        Args:
+            checkpoint_dir (str): Local or gs:// directory for checkpoints
+            every_n_epochs (int): Checkpoint frequency in epochs
+            keep (int): Number of most recent checkpoints to keep
+            callbacks: Other callbacks whose state is saved and restored
+            write (bool): False on replicas that only restore (non-chief workers)
+        """
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.every_n_epochs = max(1, every_n_epochs)
+        self.keep = max(1, keep)
+        self.tracked = [cb for cb in callbacks if type(cb) in CALLBACK_STATE]
+        self.write = write
+
+        self._pending_callback_state = None
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+
+    # Restoring
+
+    def restore(self, model):
+        """
+        Load the newest checkpoint into `model`, if there is one.
+
+        Call after the model is compiled (and inside the strategy scope when
+        distributed). Callback state is applied in on_train_begin.
+
+        Returns:
+            int: The epoch to resume from (pass as initial_epoch to fit)
+        """
+        checkpoints = list_checkpoints(self.checkpoint_dir)
+        if not checkpoints:
+            return 0
+
+        path = checkpoints[-1]
+        print(f"Resuming from checkpoint {path}...")
+        with tf.io.gfile.GFile(path, 'rb') as f:
+            with np.load(io.BytesIO(f.read()), allow_pickle=False) as data:
+                arrays = {key: data[key] for key in data.files}
+        state = json.loads(str(arrays.pop('state')))
+
+        model.set_weights([arrays[f'model/{i:04d}'] for i in range(state['num_model_weights'])])
+
+        optimizer = model.optimizer
+        if hasattr(optimizer, 'build'):
+            optimizer.build(model.trainable_variables)
+        for i, variable in enumerate(_optimizer_variables(optimizer)):
+            variable.assign(arrays[f'optimizer/{i:04d}'])
+        tf.keras.backend.set_value(optimizer.learning_rate, state['learning_rate'])
+
+        rng = state['numpy_rng']
+        np.random.set_state((rng['kind'], arrays['numpy_rng/keys'], rng['pos'],
+                             rng['has_gauss'], rng['cached_gaussian']))
+        generators = _random_generators(model)
+        num_saved = state.get('num_tf_generators', 0)
+        if len(generators) != num_saved:
+            print(f"Warning: checkpoint has {num_saved} TF random generator states, "
+                  f"the model uses {len(generators)}; restoring the first {min(num_saved, len(generators))}")
+        for i, generator in enumerate(generators[:num_saved]):
+            generator.reset(arrays[f'tf_rng/{i:04d}'])
+
+        self._pending_callback_state = (state['callbacks'], arrays)
+        print(f"Restored training state at epoch {state['epoch']}")
+        return state['epoch']
+
+    def on_train_begin(self, logs=None):
+        if self._pending_callback_state is None:
+            return
+        callback_state, arrays = self._pending_callback_state
+        for index, (callback, values) in enumerate(zip(self.tracked, callback_state)):
+            for name, value in values.items():
+                setattr(callback, name, value)
+            if isinstance(callback, EarlyStopping) and f'callback_{index}/best_weights/0000' in arrays:
+                count = len(callback.model.get_weights())
+                callback.best_weights = [arrays[f'callback_{index}/best_weights/{i:04d}'] for i in range(count)]
+        self._pending_callback_state = None
+
+    # Saving
+
+    def _snapshot(self, epoch):
+        """Copy the training state to host memory; runs on the training thread."""
+        model_weights = self.model.get_weights()
+        optimizer = self.model.optimizer
+        rng_kind, rng_keys, rng_pos, rng_has_gauss, rng_cached = np.random.get_state()
+
+        arrays = {f'model/{i:04d}': w for i, w in enumerate(model_weights)}
+        for i, variable in enumerate(_optimizer_variables(optimizer)):
+            arrays[f'optimizer/{i:04d}'] = variable.numpy()
+        arrays['numpy_rng/keys'] = rng_keys
+        generators = _random_generators(self.model)
+        for i, generator in enumerate(generators):
+            arrays[f'tf_rng/{i:04d}'] = generator.state.numpy()
+
+        callback_state = []
+        for index, callback in enumerate(self.tracked):
+            callback_state.append({name: _to_builtin(getattr(callback, name))
+                                   for name in CALLBACK_STATE[type(callback)] if hasattr(callback, name)})
+            best_weights = getattr(callback, 'best_weights', None)
+            if best_weights is not None:
+                for i, w in enumerate(best_weights):
+                    arrays[f'callback_{index}/best_weights/{i:04d}'] = np.array(w)
+
+        state = {
+            'epoch': epoch + 1,
+            'num_model_weights': len(model_weights),
+            'learning_rate': float(tf.keras.backend.get_value(optimizer.learning_rate)),
+            'numpy_rng': {'kind': rng_kind, 'pos': int(rng_pos),
+                          'has_gauss': int(rng_has_gauss), 'cached_gaussian': float(rng_cached)},
+            'num_tf_generators': len(generators),
+            'callbacks': callback_state
+        }
+        return epoch, state, arrays
+
+    def _write(self, epoch, state, arrays):
+        buffer = io.BytesIO()
+        np.savez(buffer, state=np.array(json.dumps(state)), **arrays)
+
+        path = os.path.join(self.checkpoint_dir, CHECKPOINT_PATTERN.format(epoch=epoch + 1))
+        temp_path = path + '.tmp'
+        tf.io.gfile.makedirs(self.checkpoint_dir)
+        with tf.io.gfile.GFile(temp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        tf.io.gfile.rename(temp_path, path, overwrite=True)
+
+        for old_path in list_checkpoints(self.checkpoint_dir)[:-self.keep]:
+            tf.io.gfile.remove(old_path)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    print(f"Warning: Could not write checkpoint for epoch {item[0] + 1}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self.write or (epoch + 1) % self.every_n_epochs != 0:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+            self._thread.start()
+        # Blocks only if the previous checkpoint is still being written
+        self._queue.put(self._snapshot(epoch))
+
+    def on_train_end(self, logs=None):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
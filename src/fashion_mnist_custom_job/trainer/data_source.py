@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Dataset loading from local paths or gs:// URIs for the training job.
+
+A dataset is either a single (compressed) .npz, or a directory written by
+the normalizer with a manifest.json index. With output_format "npz" the
+manifest names the .npz. With "npy" there is one uncompressed .npy per
+array, opened with mmap_mode='r' so only the pages actually read are
+loaded.
+
+With output_format "tfrecord" every split is stored as TFRecord shards
+listed in manifest.json. Its training split is not loaded: it is returned
+as a RecordSplit of shard URIs for the tf.data pipeline to stream with
+interleave. The smaller splits are read into arrays.
+
+Image arrays may be stored as float32 (already scaled) or as raw uint8
+pixels with a recorded scale/offset; see input_normalization.
+
+Remote datasets are streamed to a local cache once and reused by later
+jobs on the same machine. Cache entries are keyed by the object's MD5 as
+reported by Cloud Storage, so an updated dataset at the same URI is
+downloaded again while an unchanged one is not.
+"""
+
+import os
+import json
+import base64
+import hashlib
+import tempfile
+import numpy as np
+
+MANIFEST_FILE = 'manifest.json'
+RECORD_FORMAT = 'tfrecord'
+
+# TFRecord framing around each payload: uint64 length + masked CRC32C,
+# then a masked CRC32C of the payload
+RECORD_HEADER_BYTES = 12
+RECORD_FOOTER_BYTES = 4
+
+# Mapping from stored uint8 pixels to model inputs: (pixel - offset) / scale
+DEFAULT_INPUT_NORMALIZATION = {'scale': 255.0, 'offset': 0.0}
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'DATA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'fashion-mnist')
+)
+
+
+def _split_gcs_uri(uri):
+    bucket_name, _, blob_name = uri[5:].partition('/')
+    if not bucket_name or not blob_name:
+        raise ValueError(f"Invalid GCS path: {uri}. Must be in format 'gs://bucket/path'")
+    return bucket_name, blob_name
+
+
+def _file_md5(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch(uri, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return a local path for `uri`, downloading gs:// objects into the cache.
+
+    Args:
+        uri (str): Local file path or gs://bucket/path URI
+        cache_dir (str): Directory holding cached downloads
+
+    Returns:
+        str: Path of a local file with the content of `uri`
+    """
+    if not uri.startswith('gs://'):
+        return uri
+
+    from google.cloud import storage
+
+    bucket_name, blob_name = _split_gcs_uri(uri)
+    blob = storage.Client().bucket(bucket_name).get_blob(blob_name)
+    if blob is None:
+        raise FileNotFoundError(f"No such object: {uri}")
+
+    md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else f"gen{blob.generation}"
+    local_path = os.path.join(cache_dir, md5, os.path.basename(blob_name))
+    if os.path.exists(local_path):
+        print(f"Using cached {uri} from {local_path}")
+        return local_path
+
+    # Download next to the final path and rename, so a crashed job never
+    # leaves a partial file behind under the final name
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    print(f"Downloading {uri} to {local_path}...")
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(local_path), suffix='.part')
+    os.close(fd)
+    try:
+        blob.download_to_filename(temp_path)
+        if blob.md5_hash and _file_md5(temp_path) != md5:
+            raise IOError(f"Checksum mismatch downloading {uri}")
+        os.replace(temp_path, local_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return local_path
+
+
+def load_npz(uri, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load the arrays of a raw or normalized Fashion MNIST .npz.
+
+    Returns:
+        dict: Array name to numpy array (X_train, y_train, X_test, y_test,
+        and X_val, y_val when the file has a validation split)
+    """
+    path = fetch(uri, cache_dir)
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def load_npy_dir(uri, cache_dir=DEFAULT_CACHE_DIR, manifest=None):
+    """
+    Memory-map the arrays of a manifest.json + .npy dataset directory.
+
+    Returns:
+        dict: Array name to read-only numpy memmap, plus pixel_scale and
+        pixel_offset when the manifest records a normalization
+    """
+    if manifest is None:
+        with open(fetch(f"{uri.rstrip('/')}/{MANIFEST_FILE}", cache_dir)) as f:
+            manifest = json.load(f)
+    arrays = {
+        name: np.load(fetch(f"{uri.rstrip('/')}/{entry['file']}", cache_dir), mmap_mode='r')
+        for name, entry in manifest['arrays'].items()
+    }
+    if 'normalization' in manifest:
+        arrays['pixel_scale'] = np.array(manifest['normalization']['scale'])
+        arrays['pixel_offset'] = np.array(manifest['normalization']['offset'])
+    return arrays
+
+
+class RecordSplit:
+    """
+    The TFRecord shards of one dataset split, left on disk or in GCS.
+
+    Each record's payload is the label (`record['label_dtype']`) followed by
+    the raw image bytes (`record['image_dtype']`, `record['image_shape']`).
+    len() is the number of records; `checksums` are the shards' sha256.
+    """
+
+    def __init__(self, files, counts, record, checksums=None):
+        self.files = list(files)
+        self.counts = list(counts)
+        self.record = record
+        self.checksums = list(checksums) if checksums is not None else [None] * len(self.files)
+
+    def __len__(self):
+        return sum(self.counts)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.record['image_dtype'])
+
+    @property
+    def shape(self):
+        return (len(self), *self.record['image_shape'])
+
+    def split_shards(self, num_shards):
+        """Return (first `num_shards` shards, remaining shards) as two RecordSplits."""
+        return (RecordSplit(self.files[:num_shards], self.counts[:num_shards], self.record,
+                            self.checksums[:num_shards]),
+                RecordSplit(self.files[num_shards:], self.counts[num_shards:], self.record,
+                            self.checksums[num_shards:]))
+
+
+def read_tfrecord_shard(path, record, count=None, sha256=None):
+    """
+    Decode a TFRecord shard of fixed-size records into (images, labels) arrays.
+
+    Every record has the same payload size, so the file is viewed as rows
+    and sliced instead of being parsed record by record. The record CRCs are
+    not checked; pass the manifest's `sha256` to verify the whole file.
+    """
+    label_dtype = np.dtype(record['label_dtype'])
+    image_dtype = np.dtype(record['image_dtype'])
+    payload_bytes = label_dtype.itemsize + image_dtype.itemsize * int(np.prod(record['image_shape']))
+
+    data = np.fromfile(path, dtype=np.uint8)
+    if sha256 is not None and hashlib.sha256(data).hexdigest() != sha256:
+        raise IOError(f"Checksum mismatch reading {path}")
+    row_bytes = RECORD_HEADER_BYTES + payload_bytes + RECORD_FOOTER_BYTES
+    if len(data) % row_bytes:
+        raise ValueError(f"{path} is not a shard of {payload_bytes}-byte records")
+    rows = data.reshape(-1, row_bytes)
+    if np.any(rows[:, :8].copy().view('<u8') != payload_bytes) or (count is not None and len(rows) != count):
+        raise ValueError(f"Unexpected record layout in {path}")
+
+    payload = rows[:, RECORD_HEADER_BYTES:RECORD_HEADER_BYTES + payload_bytes]
+    labels = payload[:, :label_dtype.itemsize].copy().view(label_dtype).ravel()
+    images = payload[:, label_dtype.itemsize:].copy().view(image_dtype).reshape(-1, *record['image_shape'])
+    return images, labels
+
+
+def read_record_split(split, cache_dir=DEFAULT_CACHE_DIR):
+    """Read all shards of a RecordSplit into (images, labels) arrays."""
+    shards = [read_tfrecord_shard(fetch(uri, cache_dir), split.record, count, sha256)
+              for uri, count, sha256 in zip(split.files, split.counts, split.checksums)]
+    return np.concatenate([images for images, _ in shards]), np.concatenate([labels for _, labels in shards])
+
+
+def load_tfrecord_dir(uri, cache_dir=DEFAULT_CACHE_DIR, manifest=None, streamed_splits=('train',)):
+    """
+    Load a manifest.json + TFRecord shards dataset directory.
+
+    Returns:
+        dict: X_<split> as a RecordSplit for the splits in `streamed_splits`
+        (y_<split> is then None; the labels are in the records) and as arrays
+        for the others, plus pixel_scale and pixel_offset
+    """
+    base_uri = uri.rstrip('/')
+    if manifest is None:
+        with open(fetch(f"{base_uri}/{MANIFEST_FILE}", cache_dir)) as f:
+            manifest = json.load(f)
+
+    arrays = {}
+    for name, entry in manifest['splits'].items():
+        split = RecordSplit([f"{base_uri}/{shard['file']}" for shard in entry['shards']],
+                            [shard['count'] for shard in entry['shards']],
+                            manifest['record'],
+                            [shard['sha256'] for shard in entry['shards']])
+        if name in streamed_splits:
+            arrays[f'X_{name}'], arrays[f'y_{name}'] = split, None
+        else:
+            arrays[f'X_{name}'], arrays[f'y_{name}'] = read_record_split(split, cache_dir)
+    arrays['pixel_scale'] = np.array(manifest['normalization']['scale'])
+    arrays['pixel_offset'] = np.array(manifest['normalization']['offset'])
+    return arrays
+
+
+def load_arrays(uri, cache_dir=DEFAULT_CACHE_DIR):
+    """Load a dataset from an .npz file, or from a directory written by the normalizer."""
+    if uri.endswith('.npz'):
+        return load_npz(uri, cache_dir)
+    with open(fetch(f"{uri.rstrip('/')}/{MANIFEST_FILE}", cache_dir)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') == RECORD_FORMAT:
+        return load_tfrecord_dir(uri, cache_dir, manifest)
+    if manifest.get('format') == 'npz':
+        return load_npz(f"{uri.rstrip('/')}/{manifest['file']}", cache_dir)
+    return load_npy_dir(uri, cache_dir, manifest)
+
+
+def input_normalization(arrays):
+    """
+    Pop the recorded pixel scale/offset from loaded arrays.
+
+    Returns:
+        dict: {'scale': ..., 'offset': ...}; the default 255/0 when the
+        dataset records none. Only integer image arrays are scaled with it.
+    """
+    normalization = dict(DEFAULT_INPUT_NORMALIZATION)
+    if 'pixel_scale' in arrays:
+        normalization['scale'] = float(arrays.pop('pixel_scale'))
+    if 'pixel_offset' in arrays:
+        normalization['offset'] = float(arrays.pop('pixel_offset'))
+    return normalization
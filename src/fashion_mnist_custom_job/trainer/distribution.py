@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+tf.distribute helpers for the Fashion MNIST training job.
+
+Three modes are supported:
+  - default: the implicit single-device strategy
+  - mirrored: synchronous data parallelism across logical CPU devices of
+    one machine (or its GPUs, if any)
+  - multi_worker: synchronous data parallelism across processes/machines,
+    configured through the TF_CONFIG environment variable that Vertex AI
+    sets for every replica of a multi-pool custom job
+
+--batch-size stays the per-replica batch; the input pipeline is built with
+the global batch (per-replica batch x replicas in sync).
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import tensorflow as tf
+
+DISTRIBUTIONS = ('default', 'mirrored', 'multi_worker')
+
+
+def configure_cpu_replicas(num_replicas):
+    """
+    Split the physical CPU into `num_replicas` logical devices.
+
+    Must run before anything initializes the TF runtime.
+
+    Returns:
+        list: Names of the logical CPU devices
+    """
+    cpus = tf.config.list_physical_devices('CPU')
+    if num_replicas > 1:
+        tf.config.set_logical_device_configuration(
+            cpus[0], [tf.config.LogicalDeviceConfiguration() for _ in range(num_replicas)]
+        )
+    return [device.name for device in tf.config.list_logical_devices('CPU')]
+
+
+def create_strategy(distribution, num_cpu_replicas=1):
+    """
+    Create the tf.distribute strategy for a --distribution mode.
+
+    Args:
+        distribution (str): One of DISTRIBUTIONS
+        num_cpu_replicas (int): Logical CPU devices to mirror across when
+            there is no GPU (mirrored mode only)
+
+    Returns:
+        tf.distribute.Strategy
+    """
+    if distribution == 'default':
+        return tf.distribute.get_strategy()
+
+    if distribution == 'mirrored':
+        if tf.config.list_physical_devices('GPU'):
+            return tf.distribute.MirroredStrategy()
+        devices = configure_cpu_replicas(num_cpu_replicas)
+        # NCCL is GPU-only; reduce gradients on the host instead
+        return tf.distribute.MirroredStrategy(
+            devices=devices,
+            cross_device_ops=tf.distribute.ReductionToOneDevice()
+        )
+
+    if distribution == 'multi_worker':
+        if 'TF_CONFIG' not in os.environ:
+            raise ValueError("--distribution multi_worker requires the TF_CONFIG environment variable")
+        return tf.distribute.MultiWorkerMirroredStrategy(
+            communication_options=tf.distribute.experimental.CommunicationOptions(
+                implementation=tf.distribute.experimental.CommunicationImplementation.RING
+            )
+        )
+
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def is_chief(strategy):
+    """True on the replica that owns the job outputs (always true without multi-worker)."""
+    resolver = getattr(strategy, 'cluster_resolver', None)
+    if resolver is None or resolver.task_type is None:
+        return True
+    if resolver.task_type == 'chief':
+        return True
+    # Without a dedicated chief, worker 0 acts as chief
+    cluster_spec = resolver.cluster_spec().as_dict()
+    return resolver.task_type == 'worker' and resolver.task_id == 0 and 'chief' not in cluster_spec
+
+
+def num_workers(strategy):
+    """Number of worker processes in the cluster (1 without multi-worker)."""
+    resolver = getattr(strategy, 'cluster_resolver', None)
+    if resolver is None or resolver.task_type is None:
+        return 1
+    cluster_spec = resolver.cluster_spec()
+    return sum(cluster_spec.num_tasks(job) for job in ('chief', 'worker') if job in cluster_spec.jobs)
+
+
+def describe(strategy):
+    """One-line summary of the strategy for the job log."""
+    resolver = getattr(strategy, 'cluster_resolver', None)
+    task = ""
+    if resolver is not None and resolver.task_type is not None:
+        task = f", task {resolver.task_type}:{resolver.task_id}"
+    return f"{type(strategy).__name__} with {strategy.num_replicas_in_sync} replica(s) in sync{task}"
+
+
+def shard_by_data(dataset):
+    """
+    Shard a dataset across workers by element rather than by file.
+
+    The datasets are built from in-memory arrays, so there are no files to
+    split; every worker runs the same seeded pipeline and keeps its share of
+    each global batch.
+    """
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    return dataset.with_options(options)
+
+
+def shard_by_file(dataset):
+    """
+    Shard a file-based dataset across workers by input file.
+
+    Each worker reads only its own TFRecord shards, so there should be at
+    least as many shards as workers.
+    """
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.FILE
+    return dataset.with_options(options)
+
+
+def worker_output_dir(output_dir, strategy):
+    """
+    Directory a replica should write `output_dir` to.
+
+    Saving a distributed model is a collective operation, so every worker
+    has to save; only the chief writes to the real location, the others
+    write to a scratch directory that `cleanup_worker_output_dir` removes.
+    """
+    if is_chief(strategy):
+        return output_dir
+    resolver = strategy.cluster_resolver
+    return os.path.join(tempfile.gettempdir(), f"{resolver.task_type}_{resolver.task_id}",
+                        os.path.basename(output_dir.rstrip('/')))
+
+
+def cleanup_worker_output_dir(output_dir, strategy):
+    if not is_chief(strategy):
+        shutil.rmtree(os.path.dirname(worker_output_dir(output_dir, strategy)), ignore_errors=True)
+
+
+def local_tf_config(num_workers, index, base_port):
+    """TF_CONFIG for worker `index` of a cluster of `num_workers` processes on localhost."""
+    return json.dumps({
+        "cluster": {"worker": [f"localhost:{base_port + i}" for i in range(num_workers)]},
+        "task": {"type": "worker", "index": index}
+    })
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+tf.data input pipeline for the Fashion MNIST training job.
+
+Augmentation runs on-graph over whole batches: every image in a batch gets
+its own random rotation, shift, shear, zoom and horizontal flip, composed
+into a single projective transform and applied in one
+ImageProjectiveTransformV3 call. The ranges match the ImageDataGenerator
+settings in train.py (bilinear interpolation, nearest fill).
+
+Training data comes either from in-memory arrays or from the TFRecord
+shards of a RecordSplit, which are read with a parallel interleave and
+decoded a batch at a time.
+
+The training stream is a pure function of its seed: the shuffle order is
+drawn from a fixed seed and every batch is augmented with stateless random
+ops keyed by the batch's position in the stream, so a job resumed at
+epoch k sees exactly the batches an uninterrupted run would have.
+"""
+
+import math
+import time
+import numpy as np
+import tensorflow as tf
+from trainer.data_source import DEFAULT_INPUT_NORMALIZATION, RecordSplit
+
+AUTOTUNE = tf.data.experimental.AUTOTUNE
+
+# Same ranges as the ImageDataGenerator in train.create_data_generators
+ROTATION_RANGE = 15       # degrees
+WIDTH_SHIFT_RANGE = 0.15  # fraction of width
+HEIGHT_SHIFT_RANGE = 0.15 # fraction of height
+SHEAR_RANGE = 0.15        # degrees, as in Keras
+ZOOM_RANGE = 0.15         # zoom factor in [1 - z, 1 + z], independently per axis
+
+# Seed of the training shuffle and augmentation streams
+DEFAULT_SEED = 42
+
+
+def _matrices(rows):
+    """Stack per-image rows [[a, b, c], [d, e, f]] into (N, 3, 3) affine matrices."""
+    a, b, c, d, e, f = rows
+    zeros = tf.zeros_like(a)
+    ones = tf.ones_like(a)
+    return tf.reshape(tf.stack([a, b, c, d, e, f, zeros, zeros, ones], axis=1), [-1, 3, 3])
+
+
+def random_affine_transforms(batch_size, height, width, seed=None):
+    """
+    Draw one random transform per image, in ImageProjectiveTransform layout.
+
+    Follows Keras' apply_affine_transform: the (row, col) matrix is
+    rotation @ shift @ shear @ zoom about the image centre, mapping output
+    pixels to input pixels, followed by an optional horizontal flip.
+
+    With a shape [2] integer `seed` the draws are stateless, so the same
+    seed always gives the same transforms; otherwise they come from the
+    global TF random state.
+
+    Returns:
+        float32 tensor of shape (batch_size, 8)
+    """
+    n = [batch_size]
+    if seed is None:
+        u = tf.random.uniform([7, batch_size])
+    else:
+        u = tf.random.stateless_uniform([7, batch_size], seed=seed)
+    # Map each row of uniforms in [0, 1) to [low, high)
+    between = lambda i, low, high: low + (high - low) * u[i]
+    deg = math.pi / 180.0
+    theta = between(0, -ROTATION_RANGE, ROTATION_RANGE) * deg
+    tx = between(1, -HEIGHT_SHIFT_RANGE, HEIGHT_SHIFT_RANGE) * height
+    ty = between(2, -WIDTH_SHIFT_RANGE, WIDTH_SHIFT_RANGE) * width
+    shear = between(3, -SHEAR_RANGE, SHEAR_RANGE) * deg
+    zx = between(4, 1 - ZOOM_RANGE, 1 + ZOOM_RANGE)
+    zy = between(5, 1 - ZOOM_RANGE, 1 + ZOOM_RANGE)
+    flip = tf.cast(u[6] < 0.5, tf.float32)
+
+    zeros = tf.zeros(n)
+    ones = tf.ones(n)
+    rotation = _matrices([tf.cos(theta), -tf.sin(theta), zeros, tf.sin(theta), tf.cos(theta), zeros])
+    shift = _matrices([ones, zeros, tx, zeros, ones, ty])
+    shearing = _matrices([ones, -tf.sin(shear), zeros, zeros, tf.cos(shear), zeros])
+    zoom = _matrices([zx, zeros, zeros, zeros, zy, zeros])
+
+    # Conjugate with a translation so the transform acts about the image centre
+    center_row = (height - 1) / 2.0
+    center_col = (width - 1) / 2.0
+    to_center = _matrices([ones, zeros, center_row * ones, zeros, ones, center_col * ones])
+    from_center = _matrices([ones, zeros, -center_row * ones, zeros, ones, -center_col * ones])
+
+    # Flip the output columns: col -> (width - 1) - col
+    flipping = _matrices([ones, zeros, zeros, zeros, 1 - 2 * flip, flip * (width - 1)])
+
+    m = to_center @ rotation @ shift @ shearing @ zoom @ from_center @ flipping
+
+    # Reorder (row, col) to the (x=col, y=row) layout of ImageProjectiveTransform
+    return tf.stack([m[:, 1, 1], m[:, 1, 0], m[:, 1, 2],
+                     m[:, 0, 1], m[:, 0, 0], m[:, 0, 2],
+                     zeros, zeros], axis=1)
+
+
+def augment_batch(images, seed=None):
+    """Apply an independent random affine transform to each image of a float batch."""
+    shape = tf.shape(images)
+    transforms = random_affine_transforms(shape[0], tf.cast(shape[1], tf.float32), tf.cast(shape[2], tf.float32),
+                                          seed)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transforms,
+        output_shape=shape[1:3],
+        fill_value=0.0,
+        interpolation="BILINEAR",
+        fill_mode="NEAREST"
+    )
+
+
+def to_model_input(images, normalization=DEFAULT_INPUT_NORMALIZATION):
+    """
+    Convert a NumPy image array to the model's float32 input.
+
+    Integer pixels are mapped with (pixel - offset) / scale; float arrays
+    from the normalized dataset are already scaled and only cast.
+    """
+    if not np.issubdtype(images.dtype, np.integer):
+        return images.astype('float32', copy=False)
+    images = images.astype('float32')
+    if normalization['offset']:
+        images -= np.float32(normalization['offset'])
+    return images / np.float32(normalization['scale'])
+
+
+def _rescale(images, normalization=DEFAULT_INPUT_NORMALIZATION):
+    # Same float32 arithmetic as to_model_input, so train and test inputs match exactly
+    if not images.dtype.is_integer:
+        return tf.cast(images, tf.float32)
+    images = tf.cast(images, tf.float32)
+    if normalization['offset']:
+        images = images - normalization['offset']
+    return images / normalization['scale']
+
+
+def record_dataset(split):
+    """
+    Serialized records of a RecordSplit, read from its shards in parallel.
+
+    The interleave keeps its deterministic output order: the shuffle is
+    seeded, and only a fixed input order makes the shuffled stream (and a
+    resumed job's position in it) reproducible.
+    """
+    return tf.data.Dataset.from_tensor_slices(split.files).interleave(
+        tf.data.TFRecordDataset,
+        num_parallel_calls=AUTOTUNE,
+        deterministic=True
+    )
+
+
+def decode_records(records, record):
+    """Decode a batch of record payloads into (images, labels) tensors."""
+    label_dtype = tf.as_dtype(record['label_dtype'])
+    image_dtype = tf.as_dtype(record['image_dtype'])
+    image_bytes = image_dtype.size * int(np.prod(record['image_shape']))
+
+    labels = tf.io.decode_raw(tf.strings.substr(records, 0, label_dtype.size), label_dtype)[:, 0]
+    images = tf.io.decode_raw(tf.strings.substr(records, label_dtype.size, image_bytes), image_dtype)
+    return tf.reshape(images, [-1, *record['image_shape'], 1]), labels
+
+
+def create_tf_datasets(X_train, y_train, X_valid, y_valid, batch_size,
+                       normalization=DEFAULT_INPUT_NORMALIZATION, seed=DEFAULT_SEED, initial_epoch=0):
+    """
+    Build repeating, prefetched training and validation datasets.
+
+    The training set is cached as stored (uint8 when possible), shuffled,
+    batched and then rescaled and augmented per batch on parallel map calls.
+    X_train may be a RecordSplit (y_train is then unused): its serialized
+    records are cached and shuffled instead, and decoded after batching.
+
+    The shuffle and the augmentation of batch i are seeded from `seed` and
+    i, and every epoch is len(X_train) // batch_size batches. A job resumed
+    at `initial_epoch` skips the batches of the finished epochs before they
+    are decoded or augmented, and continues with the same batches an
+    uninterrupted run would see.
+    """
+    print("Creating tf.data pipelines with on-graph augmentation...")
+    if isinstance(X_train, RecordSplit):
+        print(f"Streaming {len(X_train)} training records from {len(X_train.files)} TFRecord shards")
+        source = record_dataset(X_train)
+        decode = lambda records: decode_records(records, X_train.record)
+    else:
+        source = tf.data.Dataset.from_tensor_slices((X_train, y_train))
+        decode = lambda batch: batch
+
+    def preprocess(index, batch):
+        images, labels = decode(batch)
+        # Batch `index` of the repeated stream always gets the same transforms
+        batch_seed = tf.stack([tf.constant(seed, tf.int64), index])
+        return augment_batch(_rescale(images, normalization), seed=batch_seed), labels
+
+    steps_per_epoch = len(X_train) // batch_size
+    train_dataset = (
+        source
+        .cache()
+        .shuffle(len(X_train), seed=seed, reshuffle_each_iteration=True)
+        .batch(batch_size, drop_remainder=True)
+        .repeat()
+        .enumerate()
+        .skip(initial_epoch * steps_per_epoch)
+        .map(preprocess, num_parallel_calls=AUTOTUNE)
+        .prefetch(AUTOTUNE)
+    )
+
+    validation_dataset = (
+        tf.data.Dataset.from_tensor_slices((X_valid, y_valid))
+        .batch(batch_size, drop_remainder=True)
+        .map(lambda x, y: (_rescale(x, normalization), y), num_parallel_calls=AUTOTUNE)
+        .cache()
+        .repeat()
+        .prefetch(AUTOTUNE)
+    )
+
+    return train_dataset, validation_dataset
+
+
+def measure_input_throughput(batches, steps, batch_size, warmup_steps=5):
+    """
+    Time how fast an input pipeline alone can produce batches.
+
+    Args:
+        batches: An iterator yielding (images, labels) batches
+        steps (int): Number of measured batches
+        batch_size (int): Images per batch
+        warmup_steps (int): Batches drawn before timing starts
+
+    Returns:
+        float: Images per second
+    """
+    for _ in range(warmup_steps):
+        next(batches)
+    start_time = time.perf_counter()
+    for _ in range(steps):
+        next(batches)
+    return steps * batch_size / (time.perf_counter() - start_time)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Run a multi-worker training job as several processes on one machine.
+
+Each worker gets a TF_CONFIG pointing at localhost ports, the same way
+Vertex AI configures the replicas of a multi-pool custom job. Workers use
+the tf.data input pipeline, which multi-worker training requires.
+Arguments after `--` are passed to trainer.train:
+
+    python -m trainer.launch_local_workers --num-workers 2 -- \\
+        --epochs 1 --batch-size 64 --model-dir /tmp/fashion-mnist-mw
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+from trainer.distribution import local_tf_config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Launch local multi-worker training processes')
+    parser.add_argument('--num-workers', type=int, default=2, help='Number of worker processes')
+    parser.add_argument('--base-port', type=int, default=23456, help='First localhost port of the cluster')
+    parser.add_argument('train_args', nargs=argparse.REMAINDER, help='Arguments for trainer.train (after --)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    train_args = [arg for arg in args.train_args if arg != '--']
+
+    processes = []
+    for index in range(args.num_workers):
+        env = dict(os.environ, TF_CONFIG=local_tf_config(args.num_workers, index, args.base_port))
+        command = [sys.executable, '-m', 'trainer.train', '--distribution', 'multi_worker',
+                   '--input-pipeline', 'tfdata'] + train_args
+        print(f"Starting worker {index}: {' '.join(command)}")
+        processes.append(subprocess.Popen(command, env=env))
+
+    # A failed worker leaves the others blocked in collectives, so stop them too
+    exit_code = 0
+    for index, process in enumerate(processes):
+        code = process.wait()
+        if code != 0:
+            print(f"Worker {index} exited with code {code}")
+            exit_code = exit_code or code
+            for other in processes:
+                if other.poll() is None:
+                    other.terminate()
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
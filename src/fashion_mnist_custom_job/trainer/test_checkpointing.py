@@ -0,0 +1,161 @@
+"""Tests for resumable training-state checkpoints."""
+
+import numpy as np
+import pytest
+import tensorflow as tf
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+from trainer.checkpointing import TrainingStateCheckpoint, list_checkpoints
+from trainer.input_pipeline import create_tf_datasets
+
+NUM_IMAGES = 64
+BATCH_SIZE = 16
+STEPS_PER_EPOCH = NUM_IMAGES // BATCH_SIZE
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 256, (NUM_IMAGES, 28, 28, 1), dtype=np.uint8)
+    y = rng.integers(0, 10, NUM_IMAGES, dtype=np.uint8)
+    return X, y
+
+
+def small_model(dropout_rate=0.0):
+    # Without dropout, training is a deterministic function of the batches
+    layers = [
+        tf.keras.layers.Conv2D(4, 3, strides=2, activation="relu", input_shape=(28, 28, 1)),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(10, activation="softmax")
+    ]
+    if dropout_rate:
+        layers.insert(2, tf.keras.layers.Dropout(dropout_rate, seed=3))
+    model = tf.keras.Sequential(layers)
+    model.compile(loss="sparse_categorical_crossentropy", optimizer=tf.keras.optimizers.Adam(1e-3))
+    return model
+
+
+def training_callbacks(checkpoint_dir, keep=3):
+    callbacks = [
+        EarlyStopping(monitor="val_loss", patience=10, restore_best_weights=True),
+        ReduceLROnPlateau(monitor="val_loss", factor=0.5, patience=1)
+    ]
+    checkpoint = TrainingStateCheckpoint(checkpoint_dir, keep=keep, callbacks=callbacks)
+    return callbacks + [checkpoint], checkpoint
+
+
+def fit(model, arrays, callbacks, epochs, initial_epoch=0):
+    X, y = arrays
+    tf.random.set_seed(42)
+    train_dataset, validation_dataset = create_tf_datasets(X, y, X[:BATCH_SIZE], y[:BATCH_SIZE], BATCH_SIZE,
+                                                           initial_epoch=initial_epoch)
+    model.fit(train_dataset, validation_data=validation_dataset, epochs=epochs, initial_epoch=initial_epoch,
+              steps_per_epoch=STEPS_PER_EPOCH, validation_steps=1, callbacks=callbacks, verbose=0)
+
+
+def test_restore_without_checkpoint_starts_at_epoch_zero(tmp_path):
+    _, checkpoint = training_callbacks(str(tmp_path / "checkpoints"))
+    assert checkpoint.restore(small_model()) == 0
+
+
+def test_restore_recovers_the_training_state(arrays, tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    model = small_model()
+    callbacks, _ = training_callbacks(checkpoint_dir, keep=2)
+    np.random.seed(7)
+    fit(model, arrays, callbacks, epochs=3)
+    numpy_state = np.random.get_state()
+
+    assert [path.rsplit('/', 1)[-1] for path in list_checkpoints(checkpoint_dir)] == \
+        ["ckpt-00002.npz", "ckpt-00003.npz"]
+
+    np.random.seed(0)
+    restored = small_model()
+    restored_callbacks, checkpoint = training_callbacks(checkpoint_dir)
+    assert checkpoint.restore(restored) == 3
+
+    for expected, actual in zip(model.get_weights(), restored.get_weights()):
+        np.testing.assert_array_equal(actual, expected)
+    for expected, actual in zip(model.optimizer.variables, restored.optimizer.variables):
+        np.testing.assert_array_equal(actual.numpy(), expected.numpy())
+    assert float(restored.optimizer.learning_rate.numpy()) == float(model.optimizer.learning_rate.numpy())
+    np.testing.assert_array_equal(np.random.get_state()[1], numpy_state[1])
+
+    # Callback state is applied once Keras has reset the callbacks
+    restored_callbacks[-1].set_model(restored)
+    restored_callbacks[0].set_model(restored)
+    restored_callbacks[0].on_train_begin()
+    restored_callbacks[-1].on_train_begin()
+    assert restored_callbacks[0].best == callbacks[0].best
+    assert restored_callbacks[0].best_weights is not None
+
+
+def test_resumed_training_matches_uninterrupted_training(arrays, tmp_path):
+    tf.keras.utils.set_random_seed(1)
+    initial_weights = small_model().get_weights()
+
+    uninterrupted = small_model()
+    uninterrupted.set_weights(initial_weights)
+    callbacks, _ = training_callbacks(str(tmp_path / "uninterrupted"))
+    fit(uninterrupted, arrays, callbacks, epochs=3)
+
+    # Preempted after epoch 2, then restarted from its checkpoint
+    interrupted = small_model()
+    interrupted.set_weights(initial_weights)
+    callbacks, _ = training_callbacks(str(tmp_path / "interrupted"))
+    fit(interrupted, arrays, callbacks, epochs=2)
+
+    resumed = small_model()
+    callbacks, checkpoint = training_callbacks(str(tmp_path / "interrupted"))
+    initial_epoch = checkpoint.restore(resumed)
+    assert initial_epoch == 2
+    fit(resumed, arrays, callbacks, epochs=3, initial_epoch=initial_epoch)
+
+    for expected, actual in zip(uninterrupted.get_weights(), resumed.get_weights()):
+        np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_restore_recovers_the_global_tf_generator(arrays, tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    tf.random.get_global_generator().reset_from_seed(5)
+    tf.random.get_global_generator().normal([3])
+    callbacks, _ = training_callbacks(checkpoint_dir)
+    fit(small_model(), arrays, callbacks, epochs=1)
+    saved_state = tf.random.get_global_generator().state.numpy()
+
+    tf.random.get_global_generator().reset_from_seed(0)
+    _, checkpoint = training_callbacks(checkpoint_dir)
+    checkpoint.restore(small_model())
+
+    np.testing.assert_array_equal(tf.random.get_global_generator().state.numpy(), saved_state)
+
+
+@pytest.fixture
+def tf_random_generator():
+    # Keras then gives Dropout a tf.random.Generator, whose state can be checkpointed
+    tf.keras.backend.experimental.enable_tf_random_generator()
+    yield
+    tf.keras.backend.experimental.disable_tf_random_generator()
+
+
+def test_resumed_dropout_masks_match_uninterrupted_training(arrays, tmp_path, tf_random_generator):
+    tf.keras.utils.set_random_seed(1)
+    initial_weights = small_model().get_weights()
+
+    uninterrupted = small_model(dropout_rate=0.5)
+    uninterrupted.set_weights(initial_weights)
+    callbacks, _ = training_callbacks(str(tmp_path / "uninterrupted"))
+    fit(uninterrupted, arrays, callbacks, epochs=3)
+
+    interrupted = small_model(dropout_rate=0.5)
+    interrupted.set_weights(initial_weights)
+    callbacks, _ = training_callbacks(str(tmp_path / "interrupted"))
+    fit(interrupted, arrays, callbacks, epochs=2)
+
+    # A fresh model's dropout stream starts over; the restore moves it to where epoch 2 left it
+    resumed = small_model(dropout_rate=0.5)
+    callbacks, checkpoint = training_callbacks(str(tmp_path / "interrupted"))
+    initial_epoch = checkpoint.restore(resumed)
+    fit(resumed, arrays, callbacks, epochs=3, initial_epoch=initial_epoch)
+
+    for expected, actual in zip(uninterrupted.get_weights(), resumed.get_weights()):
+        np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
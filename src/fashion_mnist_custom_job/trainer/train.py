@@ -6,52 +6,122 @@ Fashion MNIST Custom Training Job for Vertex AI
 """
 
 import os
+import uuid
 import argparse
+import datetime
 import time
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau, TensorBoard
+from tensorflow.keras.callbacks import Callback, EarlyStopping, ModelCheckpoint, ReduceLROnPlateau, TensorBoard
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from trainer.input_pipeline import create_tf_datasets, measure_input_throughput, to_model_input
+from trainer.data_source import (DEFAULT_CACHE_DIR, DEFAULT_INPUT_NORMALIZATION, RecordSplit, load_arrays,
+                                 input_normalization, read_record_split)
+from trainer.distribution import (DISTRIBUTIONS, create_strategy, is_chief, num_workers, describe,
+                                  shard_by_data, shard_by_file, worker_output_dir, cleanup_worker_output_dir)
+from trainer.checkpointing import TrainingStateCheckpoint
 
 # Define argument parser
 def parse_args():
     parser = argparse.ArgumentParser(description='Train a CNN model on Fashion MNIST dataset')
     parser.add_argument('--epochs', type=int, default=100, help='Number of epochs')
-    parser.add_argument('--batch-size', type=int, default=32, help='Batch size')
+    parser.add_argument('--batch-size', type=int, default=32, help='Batch size per replica')
     parser.add_argument('--learning-rate', type=float, default=0.001, help='Learning rate')
     parser.add_argument('--dropout-rate', type=float, default=0.25, help='Dropout rate for convolutional layers')
     parser.add_argument('--dense-dropout-rate', type=float, default=0.5, help='Dropout rate for dense layer')
     parser.add_argument('--model-dir', type=str, 
                   default=os.environ.get('AIP_MODEL_DIR', 'gs://fashion-mnist-dev/custom-model'),
                   help='Directory for saving the model')
+    parser.add_argument('--data-uri', type=str, default=None,
+                  help='Local path or gs:// URI of a raw or normalized fashion_mnist .npz, or of a '
+                       'manifest.json + .npy or TFRecord directory written by the normalizer '
+                       '(default: download with keras.datasets)')
+    parser.add_argument('--data-cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                  help='Local cache for datasets read from gs://')
+    parser.add_argument('--checkpoint-dir', type=str, default=os.environ.get('AIP_CHECKPOINT_DIR'),
+                  help='Directory for resumable training-state checkpoints (default: <model-dir>/checkpoints)')
+    parser.add_argument('--checkpoint-every-epochs', type=int, default=1,
+                  help='Write a training-state checkpoint every N epochs')
+    parser.add_argument('--checkpoints-to-keep', type=int, default=3,
+                  help='Number of most recent training-state checkpoints to keep')
+    parser.add_argument('--input-pipeline', type=str, default='generator', choices=['tfdata', 'generator'],
+                  help='The Keras ImageDataGenerator, or opt in to tf.data with on-graph augmentation '
+                       '(required for --distribution and TFRecord datasets)')
+    parser.add_argument('--input-benchmark-steps', type=int, default=0,
+                  help='If > 0, time this many batches from both input pipelines before training')
+    parser.add_argument('--distribution', type=str, default='default', choices=DISTRIBUTIONS,
+                  help='tf.distribute strategy: single device, mirrored across local devices, '
+                       'or multi-worker configured by TF_CONFIG')
+    parser.add_argument('--num-cpu-replicas', type=int, default=2,
+                  help='Logical CPU devices to mirror across in mirrored mode when there is no GPU')
+    parser.add_argument('--tflite-quantization', type=str, default='dynamic',
+                  choices=['none', 'dynamic', 'float16', 'int8'],
+                  help='Post-training quantization for the TFLite export (none skips the export)')
+    parser.add_argument('--calibration-samples', type=int, default=500,
+                  help='Training images used to calibrate int8 quantization')
 
     return parser.parse_args()
 
 # Load and preprocess data
-def load_data():
-    print("Loading Fashion MNIST dataset...")
-    fashion_mnist = keras.datasets.fashion_mnist
-    (X_train_full, y_train_full), (X_test, y_test) = fashion_mnist.load_data()
+def load_data(data_uri=None, cache_dir=DEFAULT_CACHE_DIR):
+    if data_uri:
+        # Normalized float32 arrays, or uint8 pixels scaled per batch with the
+        # recorded scale/offset
+        print(f"Loading Fashion MNIST dataset from {data_uri}...")
+        arrays = load_arrays(data_uri, cache_dir)
+        normalization = input_normalization(arrays)
+        X_train_full, y_train_full = arrays['X_train'], arrays['y_train']
+        X_test, y_test = arrays['X_test'], arrays['y_test']
+    else:
+        print("Loading Fashion MNIST dataset...")
+        fashion_mnist = keras.datasets.fashion_mnist
+        (X_train_full, y_train_full), (X_test, y_test) = fashion_mnist.load_data()
+        arrays = {}
+        normalization = dict(DEFAULT_INPUT_NORMALIZATION)
     
-    # Reshape data to include channel dimension
-    X_train_full = X_train_full.reshape((60000, 28, 28, 1))
-    X_test = X_test.reshape((10000, 28, 28, 1))
+    # Reshape data to include channel dimension; streamed TFRecord training
+    # data stays in its shards
+    if not isinstance(X_train_full, RecordSplit):
+        X_train_full = X_train_full.reshape((-1, 28, 28, 1))
+    X_test = X_test.reshape((-1, 28, 28, 1))
     
-    # Split into train and validation sets
-    X_valid, X_train = X_train_full[:5000], X_train_full[5000:]
-    y_valid, y_train = y_train_full[:5000], y_train_full[5000:]
+    # Use the file's validation split if it has one, otherwise hold out
+    # the first 5000 training images (the first shard of TFRecord data)
+    if 'X_val' in arrays:
+        X_train, y_train = X_train_full, y_train_full
+        X_valid, y_valid = arrays['X_val'].reshape((-1, 28, 28, 1)), arrays['y_val']
+    elif isinstance(X_train_full, RecordSplit):
+        held_out, X_train = X_train_full.split_shards(1)
+        if not X_train.files:
+            raise ValueError("A TFRecord dataset without a validation split needs at least 2 training shards")
+        X_valid, y_valid = read_record_split(held_out, cache_dir)
+        X_valid, y_train = X_valid.reshape((-1, 28, 28, 1)), None
+    else:
+        X_valid, X_train = X_train_full[:5000], X_train_full[5000:]
+        y_valid, y_train = y_train_full[:5000], y_train_full[5000:]
     
-    print(f"Training data: {X_train.shape}, Validation data: {X_valid.shape}, Test data: {X_test.shape}")
+    print(f"Training data: {X_train.shape} {X_train.dtype}, Validation data: {X_valid.shape}, "
+          f"Test data: {X_test.shape}")
     
-    return X_train, y_train, X_valid, y_valid, X_test, y_test
+    return X_train, y_train, X_valid, y_valid, X_test, y_test, normalization
 
 # Create data generators with augmentation
-def create_data_generators(X_train, y_train, X_valid, y_valid, batch_size):
+def create_data_generators(X_train, y_train, X_valid, y_valid, batch_size,
+                           normalization=DEFAULT_INPUT_NORMALIZATION):
     print("Creating data generators with augmentation...")
+    if isinstance(X_train, RecordSplit):
+        raise ValueError("TFRecord datasets are streamed; use --input-pipeline tfdata")
+    # Normalized float datasets are already in [0, 1]
+    rescale, shift = None, None
+    if np.issubdtype(X_train.dtype, np.integer):
+        rescale = 1. / normalization['scale']
+        if normalization['offset']:
+            shift = lambda x: x - normalization['offset']
     train_datagen = ImageDataGenerator(
-        rescale=1./255,
+        rescale=rescale,
+        preprocessing_function=shift,
         rotation_range=15,
         width_shift_range=0.15,
         height_shift_range=0.15,
@@ -60,7 +130,7 @@ def create_data_generators(X_train, y_train, X_valid, y_valid, batch_size):
         horizontal_flip=True,
         fill_mode='nearest'
     )
-    validation_datagen = ImageDataGenerator(rescale=1./255)
+    validation_datagen = ImageDataGenerator(rescale=rescale, preprocessing_function=shift)
     
     train_generator = train_datagen.flow(X_train, y_train, batch_size=batch_size)
     validation_generator = validation_datagen.flow(X_valid, y_valid, batch_size=batch_size)
@@ -99,15 +169,43 @@ def build_model(conv_dropout_rate, dense_dropout_rate, learning_rate):
     model.summary()
     return model
 
+# Report training throughput per epoch
+class ThroughputCallback(Callback):
+    def __init__(self, batch_size, steps_per_epoch):
+        super().__init__()
+        self.images_per_epoch = batch_size * steps_per_epoch
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+    
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.epoch_start
+        print(f"Epoch {epoch + 1}: {self.images_per_epoch / elapsed:.1f} images/sec (including validation)")
+
+# Compare how fast each input pipeline can feed the model
+def benchmark_input_pipelines(X_train, y_train, X_valid, y_valid, batch_size, steps, normalization):
+    print(f"Benchmarking input pipelines over {steps} batches...")
+    train_dataset, _ = create_tf_datasets(X_train, y_train, X_valid, y_valid, batch_size, normalization)
+    
+    results = {}
+    # The generator needs the training set in memory
+    if not isinstance(X_train, RecordSplit):
+        train_generator, _ = create_data_generators(X_train, y_train, X_valid, y_valid, batch_size, normalization)
+        results["generator"] = measure_input_throughput(iter(train_generator), steps, batch_size)
+    results["tfdata"] = measure_input_throughput(iter(train_dataset), steps, batch_size)
+    for name, images_per_second in results.items():
+        print(f"  {name}: {images_per_second:.1f} images/sec")
+    if "generator" in results:
+        print(f"  tfdata speedup: {results['tfdata'] / results['generator']:.1f}x")
+    
+    return results
+
 # Setup callbacks
 def create_callbacks(model_dir):
     print("Setting up training callbacks...")
     # Make sure the model directory exists
-    if model_dir.startswith('gs://'):
-        checkpoint_path = os.path.join(model_dir, 'best_model.h5')
-    else:
-        os.makedirs(model_dir, exist_ok=True)
-        checkpoint_path = os.path.join(model_dir, 'best_model.h5')
+    tf.io.gfile.makedirs(model_dir)
+    checkpoint_path = os.path.join(model_dir, 'best_model.h5')
     
     callbacks = [
         EarlyStopping(
@@ -132,17 +230,16 @@ def create_callbacks(model_dir):
         )
     ]
     
-    # Only add TensorBoard if not using GCS path
-    if not model_dir.startswith('gs://'):
-        log_dir = os.path.join(model_dir, 'logs')
-        os.makedirs(log_dir, exist_ok=True)
-        callbacks.append(TensorBoard(log_dir=log_dir))
+    # TensorBoard writes through tf.io.gfile, so gs:// log dirs work too
+    log_dir = os.path.join(model_dir, 'logs')
+    tf.io.gfile.makedirs(log_dir)
+    callbacks.append(TensorBoard(log_dir=log_dir))
     
     return callbacks
 
 # Train model
 def train_model(model, train_generator, validation_generator, epochs, callbacks, batch_size,
-                X_train, X_valid):
+                X_train, X_valid, initial_epoch=0):
     print(f"Training model for {epochs} epochs...")
     steps_per_epoch = len(X_train) // batch_size
     validation_steps = len(X_valid) // batch_size
@@ -152,6 +249,7 @@ def train_model(model, train_generator, validation_generator, epochs, callbacks,
     history = model.fit(
         train_generator,
         epochs=epochs,
+        initial_epoch=initial_epoch,
         steps_per_epoch=steps_per_epoch,
         validation_data=validation_generator,
         validation_steps=validation_steps,
@@ -165,10 +263,10 @@ def train_model(model, train_generator, validation_generator, epochs, callbacks,
     return history
 
 # Evaluate model
-def evaluate_model(model, X_test, y_test):
+def evaluate_model(model, X_test, y_test, normalization=DEFAULT_INPUT_NORMALIZATION):
     print("Evaluating model on test data...")
     # Normalize test data
-    X_test = X_test.astype('float32') / 255.0
+    X_test = to_model_input(X_test, normalization)
     
     test_loss, test_accuracy = model.evaluate(X_test, y_test, verbose=0)
     print(f"Test accuracy: {test_accuracy:.4f}")
@@ -176,8 +274,68 @@ def evaluate_model(model, X_test, y_test):
     
     return test_accuracy, test_loss
 
+# Evaluate a TFLite flatbuffer with the interpreter
+def evaluate_tflite(tflite_model, X_test, y_test, normalization=DEFAULT_INPUT_NORMALIZATION, batch_size=256):
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    
+    X_test = to_model_input(X_test, normalization)
+    correct = 0
+    current_batch = None
+    for start in range(0, len(X_test), batch_size):
+        batch = X_test[start:start + batch_size]
+        if len(batch) != current_batch:
+            interpreter.resize_tensor_input(input_index, [len(batch), 28, 28, 1])
+            interpreter.allocate_tensors()
+            current_batch = len(batch)
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        predictions = interpreter.get_tensor(output_index)
+        correct += int(np.sum(np.argmax(predictions, axis=1) == y_test[start:start + batch_size]))
+    
+    return correct / len(X_test)
+
+# Export a quantized TFLite model alongside the SavedModel
+def export_tflite(model, model_dir, quantization, X_calibration, X_test, y_test, float_accuracy,
+                  normalization=DEFAULT_INPUT_NORMALIZATION):
+    print(f"Exporting TFLite model with {quantization} quantization...")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    
+    if quantization in ('dynamic', 'float16', 'int8'):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        # Calibrate activation ranges on a sample of the training set; inputs and
+        # outputs stay float32 so the serving contract is unchanged
+        calibration = to_model_input(X_calibration, normalization)
+        def representative_dataset():
+            for i in range(len(calibration)):
+                yield [calibration[i:i + 1]]
+        converter.representative_dataset = representative_dataset
+    
+    tflite_model = converter.convert()
+    
+    tflite_path = os.path.join(model_dir, 'model.tflite')
+    with tf.io.gfile.GFile(tflite_path, 'wb') as f:
+        f.write(tflite_model)
+    
+    tflite_accuracy = evaluate_tflite(tflite_model, X_test, y_test, normalization)
+    print(f"TFLite model saved to {tflite_path} ({len(tflite_model) / 1024:.1f} KiB)")
+    print(f"TFLite test accuracy: {tflite_accuracy:.4f} (delta {tflite_accuracy - float_accuracy:+.4f})")
+    
+    return {
+        "path": tflite_path,
+        "quantization": quantization,
+        "size_bytes": len(tflite_model),
+        "calibration_samples": len(X_calibration) if quantization == 'int8' else 0,
+        "accuracy": float(tflite_accuracy),
+        "accuracy_delta": float(tflite_accuracy - float_accuracy)
+    }
+
 # Save final model
-def save_model(model, model_dir, test_accuracy):
+def save_model(model, model_dir, test_accuracy, tflite_info=None, normalization=DEFAULT_INPUT_NORMALIZATION):
     print(f"Saving model to {model_dir}...")
     
     # Define class names for metadata
@@ -188,12 +346,18 @@ def save_model(model, model_dir, test_accuracy):
     model_path = os.path.join(model_dir, 'model')
     model.save(model_path)
     
-    # Save model metadata
+    # Save model metadata; serving keys its prediction cache on the version,
+    # so every export gets a new one
     metadata = {
+        "version": f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}",
         "framework": "tensorflow",
         "accuracy": float(test_accuracy),
-        "classes": class_names
+        "classes": class_names,
+        # How serving maps uint8 pixels to model inputs: (pixel - offset) / scale
+        "input_normalization": normalization
     }
+    if tflite_info is not None:
+        metadata["tflite"] = tflite_info
     
     # Write metadata to file
     try:
@@ -215,28 +379,76 @@ def save_model(model, model_dir, test_accuracy):
 def main():
     # Parse arguments
     args = parse_args()
+    if args.distribution != 'default' and args.input_pipeline != 'tfdata':
+        raise ValueError("--distribution requires --input-pipeline tfdata")
+    
+    # The strategy has to exist before anything else touches the TF runtime
+    strategy = create_strategy(args.distribution, args.num_cpu_replicas)
+    global_batch_size = args.batch_size * strategy.num_replicas_in_sync
+    print(f"Distribution: {describe(strategy)}, global batch size {global_batch_size}")
+    
+    # Non-chief workers write to scratch space
+    output_dir = worker_output_dir(args.model_dir, strategy)
     
     # Set seeds for reproducibility
     np.random.seed(42)
     tf.random.set_seed(42)
     
     # Load data
-    X_train, y_train, X_valid, y_valid, X_test, y_test = load_data()
-    
-    # Create data generators
-    train_generator, validation_generator = create_data_generators(
-        X_train, y_train, X_valid, y_valid, args.batch_size
+    X_train, y_train, X_valid, y_valid, X_test, y_test, normalization = load_data(
+        args.data_uri, args.data_cache_dir
     )
     
-    # Build model
-    model = build_model(
-        conv_dropout_rate=args.dropout_rate,
-        dense_dropout_rate=args.dense_dropout_rate,
-        learning_rate=args.learning_rate
-    )
+    # Optionally compare input pipeline throughput
+    if args.input_benchmark_steps > 0:
+        benchmark_input_pipelines(
+            X_train, y_train, X_valid, y_valid, global_batch_size, args.input_benchmark_steps, normalization
+        )
+    
+    # Build model; variables and optimizer state are created per replica
+    with strategy.scope():
+        model = build_model(
+            conv_dropout_rate=args.dropout_rate,
+            dense_dropout_rate=args.dense_dropout_rate,
+            learning_rate=args.learning_rate
+        )
     
     # Create callbacks
-    callbacks = create_callbacks(args.model_dir)
+    callbacks = create_callbacks(output_dir)
+    callbacks.append(ThroughputCallback(global_batch_size, len(X_train) // global_batch_size))
+    
+    # Resume from the latest training-state checkpoint, if any; every worker
+    # restores, only the chief writes
+    checkpoint_dir = args.checkpoint_dir or os.path.join(args.model_dir, 'checkpoints')
+    state_checkpoint = TrainingStateCheckpoint(
+        checkpoint_dir,
+        every_n_epochs=args.checkpoint_every_epochs,
+        keep=args.checkpoints_to_keep,
+        callbacks=callbacks,
+        write=is_chief(strategy)
+    )
+    callbacks.append(state_checkpoint)
+    with strategy.scope():
+        initial_epoch = state_checkpoint.restore(model)
+    
+    # Create input pipelines; the tf.data pipeline resumes at the restored
+    # epoch's batches, since its shuffle and augmentation are seeded per batch
+    if args.input_pipeline == 'tfdata':
+        train_generator, validation_generator = create_tf_datasets(
+            X_train, y_train, X_valid, y_valid, global_batch_size, normalization,
+            initial_epoch=initial_epoch
+        )
+        if args.distribution == 'multi_worker':
+            # Workers read disjoint TFRecord shards when there are enough of them
+            if isinstance(X_train, RecordSplit) and len(X_train.files) >= num_workers(strategy):
+                train_generator = shard_by_file(train_generator)
+            else:
+                train_generator = shard_by_data(train_generator)
+            validation_generator = shard_by_data(validation_generator)
+    else:
+        train_generator, validation_generator = create_data_generators(
+            X_train, y_train, X_valid, y_valid, args.batch_size, normalization
+        )
     
     # Train model
     history = train_model(
@@ -245,16 +457,38 @@ def main():
         validation_generator, 
         args.epochs, 
         callbacks, 
-        args.batch_size,
+        global_batch_size,
         X_train,
-        X_valid
+        X_valid,
+        initial_epoch
     )
     
     # Evaluate model
-    test_accuracy, test_loss = evaluate_model(model, X_test, y_test)
+    test_accuracy, test_loss = evaluate_model(model, X_test, y_test, normalization)
+    
+    # Export quantized TFLite model; workers stay in lockstep so the
+    # collective model.save below is reached by all of them together
+    tflite_info = None
+    if args.tflite_quantization != 'none':
+        # Streamed training records are not in memory; calibrate on the validation split
+        X_calibration_pool = X_valid if isinstance(X_train, RecordSplit) else X_train
+        calibration_indices = np.random.choice(
+            len(X_calibration_pool), min(args.calibration_samples, len(X_calibration_pool)), replace=False
+        )
+        tflite_info = export_tflite(
+            model,
+            output_dir,
+            args.tflite_quantization,
+            X_calibration_pool[calibration_indices],
+            X_test,
+            y_test,
+            test_accuracy,
+            normalization
+        )
     
-    # Save model
-    save_model(model, args.model_dir, test_accuracy)
+    # Save model; every worker takes part, only the chief's copy is kept
+    save_model(model, output_dir, test_accuracy, tflite_info, normalization)
+    cleanup_worker_output_dir(args.model_dir, strategy)
     
     print("Training job completed successfully")
 
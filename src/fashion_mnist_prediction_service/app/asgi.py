@@ -0,0 +1,175 @@
+"""
+Asyncio-native entry point with the same /, /ready and /predict contract as main.py.
+
+Run with:  uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+Upload bodies are awaited on the event loop, so slow clients hold a
+connection rather than a thread. /predict answers 503 until the warm-up has
+loaded the model. Image decoding, cache lookups and normalization run on a
+bounded executor, and inference is awaited through the shared micro-batcher,
+whose scheduler thread also makes any remote-endpoint calls.
+"""
+
+import io
+import os
+import time
+import asyncio
+import logging
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.middleware import Middleware
+from starlette.routing import Route
+from preprocess import decode_image
+from wire import (JSON_MIMETYPE, negotiate_response_mimetype, is_tensor_payload,
+                  decode_tensor_payload, encode_probabilities)
+from service import (CLASS_NAMES, cache, batcher, readiness, start_warmup,
+                     lookup_cached, store_misses, normalize_for_backend, format_prediction)
+from metrics import timed, record_request, render
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Threads available for CPU-bound preprocessing
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", 4))
+
+executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="asgi-cpu")
+
+
+async def run_cpu(func, *args):
+    """Run CPU-bound work on the bounded executor without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware counting requests by route and status."""
+
+    ROUTES = ('/', '/ready', '/predict')
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == '/metrics':
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope["path"] if scope["path"] in self.ROUTES else "unmatched"
+            record_request(route, status, time.perf_counter() - start_time)
+
+
+async def metrics(request):
+    body, content_type = render()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+async def hello(request):
+    # Liveness: answers as soon as the process is up, even while the model loads
+    return JSONResponse({
+        "service": "Fashion MNIST Prediction API",
+        "status": "healthy",
+        "ready": readiness.ready.is_set(),
+        "cache": cache.stats(),
+        "usage": "POST an image to /predict for fashion item classification. "
+                 "It also accepts a uint8 tensor as an application/x-npy or raw "
+                 "application/octet-stream body, and honours Accept for binary output"
+    })
+
+
+async def ready(request):
+    # Readiness: 503 until the model is loaded and warmed
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def predict(request):
+    # The backend lock is held while the model loads; never wait on it from the event loop
+    if not readiness.ready.is_set():
+        return JSONResponse({"error": "Model is not ready", **readiness.status()},
+                            status_code=503, headers={"Retry-After": "1"})
+    
+    mimetype = request.headers.get("content-type", "").split(";")[0].strip()
+
+    try:
+        if is_tensor_payload(mimetype):
+            # Binary tensor body: no image decoding needed
+            with timed("parse"):
+                body = await request.body()
+            with timed("decode"):
+                images = decode_tensor_payload(body, mimetype)
+            if len(images) != 1:
+                return JSONResponse({"error": f"/predict takes one image, got {len(images)}"}, status_code=400)
+        else:
+            with timed("parse"):
+                form = await request.form()
+                file = form.get("file")
+            if file is None or isinstance(file, str):
+                return JSONResponse({"error": "No file part in the request"}, status_code=400)
+            if file.filename == '':
+                return JSONResponse({"error": "No file selected"}, status_code=400)
+
+            with timed("parse"):
+                contents = await file.read()
+            logger.info("Preprocessing image...")
+            with timed("decode"):
+                images = (await run_cpu(decode_image, io.BytesIO(contents)))[None]
+
+        # Cache hashing and normalization are CPU work: keep them off the event loop
+        lookup = await run_cpu(lookup_cached, images)
+        if lookup.misses:
+            with timed("preprocess"):
+                normalized = await run_cpu(normalize_for_backend, images[0])
+            # Awaiting the batcher's future keeps the event loop free during inference
+            probabilities = await asyncio.wrap_future(batcher.submit(normalized))
+            store_misses(lookup, probabilities[None])
+        probabilities = lookup.probabilities[0]
+
+        with timed("serialize"):
+            response_mimetype = negotiate_response_mimetype(request.headers.get("accept"))
+            if response_mimetype != JSON_MIMETYPE:
+                return Response(
+                    encode_probabilities(probabilities, response_mimetype),
+                    media_type=response_mimetype,
+                    headers={"X-Class-Names": ",".join(CLASS_NAMES)}
+                )
+
+            return JSONResponse(format_prediction(probabilities))
+
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Error during prediction: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Startup hook: begin loading the model before the first request arrives
+    start_warmup()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route('/', hello, methods=['GET']),
+        Route('/ready', ready, methods=['GET']),
+        Route('/predict', predict, methods=['POST']),
+        Route('/metrics', metrics, methods=['GET']),
+    ],
+    middleware=[Middleware(RequestMetricsMiddleware)],
+    lifespan=lifespan
+)
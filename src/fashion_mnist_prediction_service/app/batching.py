@@ -0,0 +1,103 @@
+import os
+import queue
+import time
+import logging
+import threading
+from concurrent.futures import Future
+import numpy as np
+from metrics import BATCH_SIZE, observe_stage, timed
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-image requests into batched forward passes.
+
+    Request threads call `predict`, which enqueues the image and blocks on a
+    future. A single scheduler thread takes the first queued image, keeps
+    collecting until either `max_batch_size` images are queued or
+    `max_wait_ms` has elapsed, runs one call to `predict_fn` on the stacked
+    batch and fans the rows of the result back out to the waiting callers.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        """
+        Args:
+            predict_fn: Callable mapping an (N, 28, 28, 1) batch to (N, 10) probabilities
+            max_batch_size (int): Largest batch sent to `predict_fn`
+            max_wait_ms (float): Longest time the first queued request waits for company
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started lazily so the thread lives in the serving process, not a pre-fork parent
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="micro-batcher", daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, image):
+        """Queue a single (28, 28, 1) image and return a future for its probabilities."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((image, future, time.perf_counter()))
+        return future
+
+    def predict(self, image, timeout=None):
+        """Blocking convenience wrapper around `submit`."""
+        return self.submit(image).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Still take anything already queued, without waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future, _ in batch]
+
+            batch_start = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                observe_stage("queue_wait", batch_start - enqueued_at)
+            BATCH_SIZE.observe(len(batch))
+
+            try:
+                images = np.stack([image for image, _, _ in batch])
+                with timed("inference"):
+                    probabilities = self.predict_fn(images)
+            except Exception as e:
+                logger.error(f"Batched inference failed for {len(batch)} requests: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, row in zip(futures, probabilities):
+                future.set_result(row)
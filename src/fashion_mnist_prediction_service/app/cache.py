@@ -0,0 +1,104 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Configuration (0 disables the cache / the TTL)
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 50000))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", 0))
+
+
+class PredictionCache:
+    """
+    Content-addressed LRU cache of class probabilities.
+
+    Entries are keyed by a hash of the preprocessed 28x28 uint8 image, so
+    re-encodes of the same picture (PNG vs JPEG, different source sizes that
+    resize to identical pixels) share an entry. Every lookup carries the
+    serving model's version; when it differs from the version the cache was
+    filled under, all entries are dropped.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        """
+        Args:
+            max_entries (int): Entries kept before evicting the least recently used
+            ttl_seconds (float): Age after which an entry is treated as a miss; 0 for no expiry
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.model_version = None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(image):
+        """Hash a uint8 (28, 28) image into a cache key."""
+        return hashlib.blake2b(np.ascontiguousarray(image, dtype=np.uint8), digest_size=16).digest()
+
+    def _sync_version(self, model_version):
+        # Caller holds the lock
+        if model_version != self.model_version:
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, key, model_version):
+        """Return cached probabilities for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            self._sync_version(model_version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                probabilities, stored_at = entry
+                if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return probabilities
+
+    def put(self, key, probabilities, model_version):
+        """Store probabilities computed by `model_version`."""
+        if not self.enabled:
+            return
+
+        # Copy so a cached row does not keep a whole batch result alive
+        probabilities = np.array(probabilities, dtype=np.float32)
+        with self._lock:
+            self._sync_version(model_version)
+            self._entries[key] = (probabilities, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "model_version": self.model_version
+            }
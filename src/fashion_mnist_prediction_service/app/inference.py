@@ -0,0 +1,288 @@
+import os
+import glob
+import json
+import logging
+import threading
+import numpy as np
+from batching import BATCH_MAX_SIZE
+from wire import encode_b64_instances
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "local")
+MODEL_DIR = os.environ.get("MODEL_DIR", "/app/model")
+PROJECT_ID = os.environ.get("PROJECT_ID", "fashion-mnist-gcp")
+LOCATION = os.environ.get("LOCATION", "us-central1")
+ENDPOINT_ID = os.environ.get("ENDPOINT_ID", "3671617870330068992")
+# Mapping from uint8 pixels to model inputs, (pixel - offset) / scale, unless
+# the export's metadata records its own
+DEFAULT_INPUT_NORMALIZATION = {"scale": 255.0, "offset": 0.0}
+# "float_list" matches the current deployed signature; "b64_uint8" sends ~10x smaller payloads
+VERTEX_INSTANCE_FORMAT = os.environ.get("VERTEX_INSTANCE_FORMAT", "float_list")
+# Batch sizes the TFLite interpreter is allocated for; smaller batches are padded up
+TFLITE_BATCH_BUCKETS = (1, 8, 32)
+
+
+def _saved_model_dir(path):
+    """The SavedModel in `path` itself or in the trainer's `<export>/model` layout, if any."""
+    for candidate in (path, os.path.join(path, "model")):
+        if os.path.exists(os.path.join(candidate, "saved_model.pb")):
+            return candidate
+    return None
+
+
+def resolve_model_dir(model_dir):
+    """
+    Locate the SavedModel to serve.
+
+    `model_dir` may point directly at a SavedModel directory, at a training
+    export holding it in `model/`, or at a parent holding several
+    `fashion_mnist_model_<timestamp>` exports, in which case the most
+    recent export is used.
+    """
+    saved_model_dir = _saved_model_dir(model_dir)
+    if saved_model_dir is not None:
+        return saved_model_dir
+
+    candidates = sorted(
+        path for path in map(_saved_model_dir, glob.glob(os.path.join(model_dir, "fashion_mnist_model_*")))
+        if path is not None
+    )
+    if not candidates:
+        raise FileNotFoundError(f"No SavedModel found under {model_dir}")
+    return candidates[-1]
+
+
+def resolve_tflite_path(model_dir):
+    """
+    Locate the TFLite export to serve.
+
+    `model_dir` may be the .tflite file itself, a directory containing
+    `model.tflite`, or a parent of `fashion_mnist_model_<timestamp>` exports.
+    """
+    if model_dir.endswith(".tflite"):
+        return model_dir
+    if os.path.exists(os.path.join(model_dir, "model.tflite")):
+        return os.path.join(model_dir, "model.tflite")
+
+    candidates = sorted(glob.glob(os.path.join(model_dir, "fashion_mnist_model_*", "model.tflite")))
+    if not candidates:
+        raise FileNotFoundError(f"No model.tflite found under {model_dir}")
+    return candidates[-1]
+
+
+def load_metadata(model_dir):
+    """
+    Read the training metadata written next to an export, if any.
+
+    The trainer writes metadata.json beside the SavedModel's `model/`
+    directory, so the parent of `model_dir` is checked too.
+    """
+    for directory in (model_dir, os.path.dirname(os.path.normpath(model_dir))):
+        for filename in ("model_metadata.json", "metadata.json"):
+            metadata_path = os.path.join(directory, filename)
+            if os.path.exists(metadata_path):
+                with open(metadata_path) as f:
+                    return json.load(f)
+    return {}
+
+
+def export_name(model_dir):
+    """Name of the export a SavedModel belongs to, the version used when its metadata has none."""
+    model_dir = os.path.normpath(model_dir)
+    if os.path.basename(model_dir) == "model":
+        model_dir = os.path.dirname(model_dir)
+    return os.path.basename(model_dir)
+
+
+class InferenceBackend:
+    """
+    Common interface for prediction backends.
+
+    `predict` takes a float32 batch shaped (N, 28, 28, 1), normalized with
+    `input_normalization`, and returns an (N, 10) array of class probabilities.
+    """
+
+    name = "base"
+    version = None
+    input_normalization = DEFAULT_INPUT_NORMALIZATION
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+    def warm_up(self, batch_sizes=(1,)):
+        """Run dummy batches so graph tracing and allocation happen before real traffic."""
+        for batch_size in batch_sizes:
+            self.predict(np.zeros((batch_size, 28, 28, 1), dtype=np.float32))
+
+
+class LocalModelBackend(InferenceBackend):
+    """Runs forward passes in-process against a SavedModel loaded once per worker."""
+
+    name = "local"
+
+    def __init__(self, model_dir):
+        import tensorflow as tf
+
+        self.model_dir = resolve_model_dir(model_dir)
+        self.metadata = load_metadata(self.model_dir)
+        self.version = self.metadata.get("version", export_name(self.model_dir))
+        self.input_normalization = self.metadata.get("input_normalization", DEFAULT_INPUT_NORMALIZATION)
+
+        logger.info(f"Loading SavedModel from {self.model_dir}")
+        self._model = tf.keras.models.load_model(self.model_dir, compile=False)
+        # Trace a single graph for every batch size instead of retracing per shape
+        self._forward = tf.function(
+            lambda x: self._model(x, training=False),
+            input_signature=[tf.TensorSpec([None, 28, 28, 1], tf.float32)]
+        )
+        logger.info(f"Loaded model version {self.version}")
+
+    def predict(self, batch):
+        return self._forward(np.asarray(batch, dtype=np.float32)).numpy()
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    Runs a quantized TFLite export through the lightweight interpreter.
+
+    Uses `tflite_runtime` when installed so the container does not need the
+    full TensorFlow package, falling back to `tf.lite`.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_dir, max_batch_size=BATCH_MAX_SIZE):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.model_path = resolve_tflite_path(model_dir)
+        self.metadata = load_metadata(os.path.dirname(self.model_path))
+        quantization = self.metadata.get("tflite", {}).get("quantization", "unknown")
+        base_version = self.metadata.get("version", os.path.basename(os.path.dirname(self.model_path)))
+        self.version = f"{base_version}-tflite-{quantization}"
+        self.input_normalization = self.metadata.get("input_normalization", DEFAULT_INPUT_NORMALIZATION)
+        self.batch_buckets = sorted({size for size in TFLITE_BATCH_BUCKETS if size < max_batch_size}
+                                    | {max(1, max_batch_size)})
+
+        logger.info(f"Loading TFLite model from {self.model_path}")
+        self._interpreter_class = Interpreter
+        # One interpreter per bucket, each allocated once for its batch size
+        self._interpreters = {}
+        # The interpreter is not thread-safe
+        self._lock = threading.Lock()
+        self._bucket_interpreter(self.batch_buckets[0])
+        logger.info(f"Loaded model version {self.version}")
+
+    def _bucket_interpreter(self, bucket):
+        """Interpreter allocated for batches of exactly `bucket` images, with its input and output indices."""
+        if bucket not in self._interpreters:
+            interpreter = self._interpreter_class(model_path=self.model_path)
+            input_index = interpreter.get_input_details()[0]["index"]
+            output_index = interpreter.get_output_details()[0]["index"]
+            interpreter.resize_tensor_input(input_index, [bucket, 28, 28, 1])
+            interpreter.allocate_tensors()
+            self._interpreters[bucket] = (interpreter, input_index, output_index)
+        return self._interpreters[bucket]
+
+    def bucket_for(self, batch_size):
+        """Smallest bucket holding `batch_size` images."""
+        for bucket in self.batch_buckets:
+            if batch_size <= bucket:
+                return bucket
+        return self.batch_buckets[-1]
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        max_bucket = self.batch_buckets[-1]
+        if len(batch) > max_bucket:
+            return np.concatenate([self.predict(batch[start:start + max_bucket])
+                                   for start in range(0, len(batch), max_bucket)])
+
+        # Pad up to the bucket so the interpreter never resizes and reallocates
+        batch_size = len(batch)
+        bucket = self.bucket_for(batch_size)
+        if bucket != batch_size:
+            padded = np.zeros((bucket,) + batch.shape[1:], dtype=np.float32)
+            padded[:batch_size] = batch
+            batch = padded
+        batch = np.ascontiguousarray(batch)
+        with self._lock:
+            interpreter, input_index, output_index = self._bucket_interpreter(bucket)
+            interpreter.set_tensor(input_index, batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index)[:batch_size].copy()
+
+    def warm_up(self, batch_sizes=(1,)):
+        """Allocate every bucket up front; `batch_sizes` all fall into one of them."""
+        super().warm_up(self.batch_buckets)
+
+
+class VertexEndpointBackend(InferenceBackend):
+    """Forwards batches to a deployed Vertex AI endpoint."""
+
+    name = "vertex"
+
+    def __init__(self, project_id, location, endpoint_id, instance_format=VERTEX_INSTANCE_FORMAT):
+        if instance_format not in ("float_list", "b64_uint8"):
+            raise ValueError(f"Unknown Vertex instance format: {instance_format}")
+        self.project_id = project_id
+        self.location = location
+        self.version = endpoint_id
+        self.instance_format = instance_format
+        self._endpoint = None
+        self._endpoint_lock = threading.Lock()
+
+    def _get_endpoint(self):
+        # The aiplatform import and client setup cost seconds, so pay them on first use
+        if self._endpoint is None:
+            with self._endpoint_lock:
+                if self._endpoint is None:
+                    from google.cloud import aiplatform
+                    aiplatform.init(project=self.project_id, location=self.location)
+                    self._endpoint = aiplatform.Endpoint(self.version)
+        return self._endpoint
+
+    def warm_up(self, batch_sizes=(1,)):
+        # Dummy predictions would be billed remote calls; the client is built on first request
+        pass
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if self.instance_format == "b64_uint8":
+            # Pixels originated as uint8, so rounding back is lossless
+            pixels = batch * self.input_normalization["scale"] + self.input_normalization["offset"]
+            instances = encode_b64_instances(np.rint(pixels).reshape(len(batch), -1))
+        else:
+            instances = batch.reshape(len(batch), -1).tolist()
+        response = self._get_endpoint().predict(instances=instances)
+        return np.asarray(response.predictions, dtype=np.float32)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name=INFERENCE_BACKEND):
+    """Construct the backend selected by name ("local", "tflite" or "vertex")."""
+    if name == "local":
+        return LocalModelBackend(MODEL_DIR)
+    if name == "tflite":
+        return TFLiteBackend(MODEL_DIR)
+    if name == "vertex":
+        return VertexEndpointBackend(PROJECT_ID, LOCATION, ENDPOINT_ID)
+    raise ValueError(f"Unknown inference backend: {name}")
+
+
+def get_backend():
+    """Return the process-wide backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
@@ -1,9 +1,14 @@
 import os
+import time
 import numpy as np
 import logging
-from flask import Flask, request, jsonify
-from google.cloud import aiplatform
-from preprocess import preprocess_image
+from flask import Flask, Response, g, request, jsonify
+from preprocess import ArchiveLimitError, decode_image, decode_images, extract_archive
+from wire import (JSON_MIMETYPE, RESPONSE_MIMETYPES, is_tensor_payload,
+                  decode_tensor_payload, encode_probabilities)
+from service import (CLASS_NAMES, MAX_BATCH_IMAGES, cache, batcher, readiness, start_warmup,
+                     cached_predict, predict_chunked, format_prediction)
+from metrics import timed, record_request, render
 
 app = Flask(__name__)
 
@@ -11,74 +16,159 @@ app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuration
-PROJECT_ID = os.environ.get("PROJECT_ID", "fashion-mnist-gcp")
-LOCATION = os.environ.get("LOCATION", "us-central1")
-ENDPOINT_ID = os.environ.get("ENDPOINT_ID", "3671617870330068992")
+# Gunicorn imports this module in each worker, so this is the worker startup hook
+start_warmup()
 
-# Class names for Fashion MNIST
-CLASS_NAMES = [
-    "T-shirt/top", "Trouser", "Pullover", "Dress", "Coat",
-    "Sandal", "Shirt", "Sneaker", "Bag", "Ankle boot"
-]
+def binary_response_mimetype():
+    """Return the negotiated binary response type, or None to answer with JSON."""
+    mimetype = request.accept_mimetypes.best_match(RESPONSE_MIMETYPES, default=JSON_MIMETYPE)
+    return None if mimetype == JSON_MIMETYPE else mimetype
 
-# Initialize Vertex AI client
-aiplatform.init(project=PROJECT_ID, location=LOCATION)
-endpoint = aiplatform.Endpoint(ENDPOINT_ID)
+def binary_response(probabilities, mimetype):
+    """Return raw class probabilities, with the class order in a header."""
+    return Response(
+        encode_probabilities(probabilities, mimetype),
+        mimetype=mimetype,
+        headers={"X-Class-Names": ",".join(CLASS_NAMES)}
+    )
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def count_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if route != '/metrics':
+        record_request(route, response.status_code, time.perf_counter() - g.start_time)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render()
+    return Response(body, content_type=content_type)
 
 @app.route('/', methods=['GET'])
 def hello():
+    # Liveness: answers as soon as the process is up, even while the model loads
     return jsonify({
         "service": "Fashion MNIST Prediction API",
         "status": "healthy",
-        "usage": "POST an image to /predict for fashion item classification"
+        "ready": readiness.ready.is_set(),
+        "cache": cache.stats(),
+        "usage": "POST an image to /predict for fashion item classification, "
+                 "or several images (or a zip/tar archive) to /predict_batch. "
+                 "Both also accept uint8 tensors as application/x-npy or raw "
+                 "application/octet-stream bodies, and honour Accept for binary output"
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    # Readiness: 503 until the model is loaded and warmed
+    status = readiness.status()
+    return jsonify(status), (200 if status["ready"] else 503)
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part in the request"}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
-    
     try:
-        # Preprocess image
-        logger.info("Preprocessing image...")
-        preprocessed_image = preprocess_image(file)
-        
-        logger.info("Using manual prediction instead of endpoint...")
-        # For demonstration, let's assume this is a "Bag" with high confidence
-        # In a real scenario, you would integrate with your model properly
+        if is_tensor_payload(request.mimetype):
+            # Binary tensor body: no image decoding needed
+            with timed("parse"):
+                body = request.get_data()
+            with timed("decode"):
+                images = decode_tensor_payload(body, request.mimetype)
+            if len(images) != 1:
+                return jsonify({"error": f"/predict takes one image, got {len(images)}; use /predict_batch"}), 400
+        else:
+            with timed("parse"):
+                files = request.files
+            if 'file' not in files:
+                return jsonify({"error": "No file part in the request"}), 400
+            
+            file = files['file']
+            if file.filename == '':
+                return jsonify({"error": "No file selected"}), 400
+            
+            # Preprocess image
+            logger.info("Preprocessing image...")
+            with timed("decode"):
+                images = decode_image(file)[np.newaxis]
         
-        # Create a mock prediction result
-        # This simulates the model's response for testing
-        # Replace this with actual model integration in production
-        results = []
-        for i, class_name in enumerate(CLASS_NAMES):
-            # Set high probability for "Bag" class (index 8)
-            probability = 0.95 if i == 8 else 0.05 / 9
-            results.append({
-                "class": class_name,
-                "probability": float(probability)
-            })
+        # On a miss, queue for the next batched forward pass
+        probabilities = cached_predict(images, lambda batch: batcher.predict(batch[0])[np.newaxis])[0]
         
-        # Sort by probability (highest first)
-        results.sort(key=lambda x: x["probability"], reverse=True)
+        with timed("serialize"):
+            mimetype = binary_response_mimetype()
+            if mimetype:
+                return binary_response(probabilities, mimetype)
+            
+            response = format_prediction(probabilities)
+            
+            return jsonify(response)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error during prediction: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    try:
+        if is_tensor_payload(request.mimetype):
+            with timed("parse"):
+                body = request.get_data()
+            with timed("decode"):
+                images = decode_tensor_payload(body, request.mimetype)
+            names = [str(i) for i in range(len(images))]
+            if len(images) > MAX_BATCH_IMAGES:
+                return jsonify({"error": f"Too many images: {len(images)} > {MAX_BATCH_IMAGES}"}), 413
+        else:
+            with timed("parse"):
+                uploads = [f for f in request.files.getlist('files') if f.filename != '']
+            if not uploads:
+                return jsonify({"error": "No files in the request"}), 400
+            
+            # Expand archives in place so results stay in upload order; each
+            # archive may only fill what is left of MAX_BATCH_IMAGES
+            with timed("parse"):
+                uploaded = []
+                for upload in uploads:
+                    members = extract_archive(upload.stream, max_members=max(0, MAX_BATCH_IMAGES - len(uploaded)))
+                    if members is None:
+                        uploaded.append((upload.filename, upload.stream))
+                    else:
+                        uploaded.extend(members)
+            
+            if len(uploaded) > MAX_BATCH_IMAGES:
+                return jsonify({"error": f"Too many images: {len(uploaded)} > {MAX_BATCH_IMAGES}"}), 413
+            
+            logger.info(f"Preprocessing {len(uploaded)} images...")
+            names = [name for name, _ in uploaded]
+            with timed("decode"):
+                images = decode_images([stream for _, stream in uploaded])
         
-        # Create a user-friendly response
-        top_prediction = results[0]
-        response = {
-            "prediction": top_prediction["class"],
-            "confidence": top_prediction["probability"],
-            "all_results": results
-        }
+        probabilities = cached_predict(images, predict_chunked)
         
-        return jsonify(response)
+        with timed("serialize"):
+            mimetype = binary_response_mimetype()
+            if mimetype:
+                return binary_response(probabilities, mimetype)
+            
+            predictions = []
+            for name, row in zip(names, probabilities):
+                result = format_prediction(row)
+                result["filename"] = name
+                predictions.append(result)
+            
+            return jsonify({"count": len(predictions), "predictions": predictions})
     
+    except ArchiveLimitError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error during prediction: {str(e)}")
+        logger.error(f"Error during batch prediction: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Per-stage latency, from sub-millisecond preprocessing up to slow remote calls
+STAGES = ("parse", "decode", "preprocess", "queue_wait", "inference", "serialize", "total")
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+STAGE_SECONDS = Histogram(
+    "prediction_stage_seconds", "Time spent in each request-handling stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter("prediction_requests_total", "HTTP requests handled", ["route", "status"])
+ERRORS = Counter("prediction_errors_total", "HTTP requests answered with a 4xx/5xx status", ["route", "status"])
+IMAGES = Counter("prediction_images_total", "Images received for prediction")
+BATCH_SIZE = Histogram("prediction_batch_size", "Images per forward pass", buckets=BATCH_SIZE_BUCKETS)
+CACHE_HITS = Counter("prediction_cache_hits_total", "Images answered from the prediction cache")
+CACHE_MISSES = Counter("prediction_cache_misses_total", "Images that needed inference")
+
+# Resolve label children once; observe() on a bound child is a lock and two adds
+_stage_children = {stage: STAGE_SECONDS.labels(stage=stage) for stage in STAGES}
+
+
+def observe_stage(stage, seconds):
+    _stage_children[stage].observe(seconds)
+
+
+@contextmanager
+def timed(stage):
+    """Record the duration of the enclosed block under `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_children[stage].observe(time.perf_counter() - start)
+
+
+def record_request(route, status, seconds):
+    """Count a finished request and its end-to-end latency."""
+    REQUESTS.labels(route=route, status=status).inc()
+    if status >= 400:
+        ERRORS.labels(route=route, status=status).inc()
+    _stage_children["total"].observe(seconds)
+
+
+def render():
+    """Return the Prometheus text exposition and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
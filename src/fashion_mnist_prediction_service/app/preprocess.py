@@ -1,6 +1,112 @@
 import numpy as np
 from PIL import Image
 import io
+import os
+import tarfile
+import zipfile
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_SIZE = (28, 28)
+
+# Pillow's default for resize(), pinned so library upgrades cannot shift model inputs
+RESAMPLE_FILTER = Image.BICUBIC
+
+# Decode threads per worker; PIL releases the GIL while decoding and resizing
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", 4))
+
+# Largest archive member read into memory; Fashion MNIST uploads are a few KiB
+MAX_ARCHIVE_MEMBER_BYTES = int(os.environ.get("MAX_ARCHIVE_MEMBER_BYTES", 10 * 1024 * 1024))
+
+_decode_pool = None
+_decode_pool_lock = threading.Lock()
+
+
+def _get_decode_pool():
+    global _decode_pool
+    if _decode_pool is None:
+        with _decode_pool_lock:
+            if _decode_pool is None:
+                _decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+    return _decode_pool
+
+
+def decode_image(file_stream, out=None):
+    """
+    Decode an uploaded image into Fashion MNIST's 28x28 grayscale layout.
+    
+    Images that are already 28x28 grayscale skip conversion and resizing.
+    
+    Args:
+        file_stream: An image file object
+        out: Optional uint8 (28, 28) array to write into
+    
+    Returns:
+        uint8 array of shape (28, 28)
+    """
+    img = Image.open(file_stream)
+    
+    # Convert to grayscale
+    if img.mode != 'L':
+        img = img.convert('L')
+    
+    # Resize to 28x28 (Fashion MNIST size)
+    if img.size != IMAGE_SIZE:
+        img = img.resize(IMAGE_SIZE, RESAMPLE_FILTER)
+    
+    if out is None:
+        return np.asarray(img, dtype=np.uint8)
+    out[...] = np.asarray(img, dtype=np.uint8)
+    return out
+
+
+def decode_images(file_streams):
+    """
+    Decode a list of uploads into one preallocated uint8 buffer.
+    
+    Args:
+        file_streams: Image file objects
+    
+    Returns:
+        uint8 array of shape (N, 28, 28), in input order
+    """
+    images = np.empty((len(file_streams),) + IMAGE_SIZE, dtype=np.uint8)
+    if len(file_streams) == 1:
+        decode_image(file_streams[0], out=images[0])
+        return images
+    
+    # Each task writes its own row, so results need no reassembly
+    list(_get_decode_pool().map(
+        lambda i: decode_image(file_streams[i], out=images[i]),
+        range(len(file_streams))
+    ))
+    return images
+
+
+def normalize_images(images, scale=255.0, offset=0.0):
+    """
+    Map uint8 pixels to model inputs as (pixel - offset) / scale and add the
+    channel dimension expected by the model.
+    
+    Args:
+        images: uint8 array shaped (28, 28) or (N, 28, 28)
+        scale (float): Divisor recorded in the model's input_normalization
+        offset (float): Pixel value mapped to zero
+    
+    Returns:
+        float32 array shaped (28, 28, 1) or (N, 28, 28, 1)
+    """
+    normalized = np.empty(images.shape + (1,), dtype=np.float32)
+    # Vectorized passes straight into the model's layout; float32 arithmetic
+    # matches the training pipeline (astype('float32') / 255.0 by default) bit for bit
+    if offset:
+        np.subtract(images, offset, out=normalized[..., 0], dtype=np.float32)
+        np.divide(normalized[..., 0], scale, out=normalized[..., 0], dtype=np.float32)
+    else:
+        np.divide(images, scale, out=normalized[..., 0], dtype=np.float32)
+    return normalized
+
 
 def preprocess_image(file_stream):
     """
@@ -10,24 +116,88 @@ def preprocess_image(file_stream):
         file_stream: An image file object
     
     Returns:
-        Normalized list ready for prediction
+        float32 array of shape (28, 28, 1) ready for prediction
     """
-    # Read image from file stream
-    img = Image.open(file_stream).convert('L')  # Convert to grayscale
+    return normalize_images(decode_image(file_stream))
+
+
+def preprocess_batch(file_streams):
+    """
+    Preprocess a list of uploads for Fashion MNIST prediction.
     
-    # Resize to 28x28 (Fashion MNIST size)
-    img = img.resize((28, 28))
+    Args:
+        file_streams: Image file objects
     
-    # Convert to numpy array
-    img_array = np.array(img)
+    Returns:
+        float32 array of shape (N, 28, 28, 1) ready for prediction
+    """
+    return normalize_images(decode_images(file_streams))
+
+
+def _is_image_member(name):
+    """Skip directories and archive housekeeping entries such as __MACOSX/ or ._ files."""
+    base = os.path.basename(name)
+    return bool(base) and not base.startswith('.') and '__MACOSX' not in name
+
+
+class ArchiveLimitError(ValueError):
+    """An archive upload holds more images, or larger members, than the service accepts."""
+
+
+def extract_archive(file_stream, max_members=None, max_member_bytes=MAX_ARCHIVE_MEMBER_BYTES):
+    """
+    Expand a zip or tar upload into its image members.
     
-    # Normalize pixel values to [0, 1] range
-    img_array = img_array.astype('float32') / 255.0
+    Limits are checked before member data is read: a zip's member count and
+    sizes come from its central directory, and a tar's from each header as
+    the archive is walked, stopping at the first member over a limit. Only
+    regular tar files are read; links, devices and other special members
+    are skipped.
+    
+    Args:
+        file_stream: An uploaded file object
+        max_members (int): Most image members accepted; None for no limit
+        max_member_bytes (int): Largest uncompressed size of one member
     
-    # Flatten the array to a 1D list (784 elements)
-    flattened = img_array.flatten().tolist()
+    Returns:
+        List of (name, stream) pairs in archive order, or None if the upload
+        is not an archive
+    
+    Raises:
+        ArchiveLimitError: If a limit is exceeded
+        ValueError: If a zip archive is corrupt
+    """
+    def check_member(name, size, count):
+        if max_members is not None and count > max_members:
+            raise ArchiveLimitError(f"Too many images: archive holds more than the {max_members} still allowed")
+        if size > max_member_bytes:
+            raise ArchiveLimitError(f"Archive member {name} is {size} bytes, over the {max_member_bytes} byte limit")
     
-    # Ensure we're not exceeding size limits
-    print(f"Processed image size: {len(str(flattened))} characters")
+    if zipfile.is_zipfile(file_stream):
+        file_stream.seek(0)
+        try:
+            with zipfile.ZipFile(file_stream) as archive:
+                infos = [info for info in archive.infolist() if not info.is_dir() and _is_image_member(info.filename)]
+                for count, info in enumerate(infos, 1):
+                    check_member(info.filename, info.file_size, count)
+                # Reads are bounded by the checked file_size
+                return [(info.filename, io.BytesIO(archive.read(info))) for info in infos]
+        except (zipfile.BadZipFile, zlib.error) as e:
+            # A client error (bad CRC, truncated or undecompressable member), not a server one
+            raise ValueError(f"Corrupt zip archive: {e}") from e
     
-    return flattened
+    file_stream.seek(0)
+    try:
+        with tarfile.open(fileobj=file_stream, mode='r:*') as archive:
+            members = []
+            # Walk the headers lazily rather than via getmembers(), so an
+            # oversized archive is rejected without indexing all of it
+            for member in archive:
+                if not member.isreg() or not _is_image_member(member.name):
+                    continue
+                check_member(member.name, member.size, len(members) + 1)
+                members.append((member.name, io.BytesIO(archive.extractfile(member).read())))
+            return members
+    except tarfile.ReadError:
+        file_stream.seek(0)
+        return None
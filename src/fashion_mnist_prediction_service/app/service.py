@@ -0,0 +1,170 @@
+"""
+Serving state shared by the Flask (main.py) and ASGI (asgi.py) entry points.
+"""
+
+import os
+import time
+import logging
+import threading
+import numpy as np
+from preprocess import normalize_images
+from inference import get_backend
+from batching import MicroBatcher
+from cache import PredictionCache
+from metrics import BATCH_SIZE, CACHE_HITS, CACHE_MISSES, IMAGES, timed
+
+logger = logging.getLogger(__name__)
+
+# Class names for Fashion MNIST
+CLASS_NAMES = [
+    "T-shirt/top", "Trouser", "Pullover", "Dress", "Coat",
+    "Sandal", "Shirt", "Sneaker", "Bag", "Ankle boot"
+]
+
+# Largest number of images accepted by /predict_batch
+MAX_BATCH_IMAGES = int(os.environ.get("MAX_BATCH_IMAGES", 1024))
+
+# Concurrent /predict requests share batched forward passes; the backend is
+# resolved per batch so the first batch waits for a model still loading
+batcher = MicroBatcher(lambda batch: get_backend().predict(batch))
+
+# Repeated images skip inference entirely
+cache = PredictionCache()
+
+class Readiness:
+    """Tracks the background warm-up that loads the model before traffic is routed."""
+    
+    def __init__(self):
+        self.ready = threading.Event()
+        self.error = None
+        self.seconds = None
+    
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "warmup_seconds": self.seconds,
+            "error": self.error
+        }
+
+readiness = Readiness()
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+def _warm_up():
+    start_time = time.perf_counter()
+    try:
+        backend = get_backend()
+        # Trace the graph for single requests and for full micro-batches
+        backend.warm_up(batch_sizes=sorted({1, batcher.max_batch_size}))
+        readiness.seconds = time.perf_counter() - start_time
+        readiness.ready.set()
+        logger.info(f"Warm-up of {backend.name} backend (model {backend.version}) "
+                    f"finished in {readiness.seconds:.2f} s")
+    except Exception as e:
+        readiness.error = str(e)
+        logger.error(f"Warm-up failed: {e}")
+
+def start_warmup():
+    """Load and warm the backend in the background; liveness is served meanwhile."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+            _warmup_thread.start()
+
+class CacheLookup:
+    """Result of checking a batch of images against the prediction cache."""
+    
+    def __init__(self, keys, probabilities, misses, model_version):
+        self.keys = keys
+        self.probabilities = probabilities
+        self.misses = misses
+        self.model_version = model_version
+
+def lookup_cached(images):
+    """
+    Fill in cached probabilities for uint8 (N, 28, 28) images.
+    
+    Returns:
+        CacheLookup whose `misses` lists the rows that still need inference
+    """
+    model_version = get_backend().version
+    keys = [cache.key(image) for image in images]
+    probabilities = np.empty((len(images), len(CLASS_NAMES)), dtype=np.float32)
+    
+    misses = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key, model_version)
+        if cached is None:
+            misses.append(i)
+        else:
+            probabilities[i] = cached
+    
+    IMAGES.inc(len(images))
+    CACHE_HITS.inc(len(images) - len(misses))
+    CACHE_MISSES.inc(len(misses))
+    return CacheLookup(keys, probabilities, misses, model_version)
+
+def store_misses(lookup, miss_probabilities):
+    """Record freshly computed probabilities for the rows in `lookup.misses`."""
+    lookup.probabilities[lookup.misses] = miss_probabilities
+    for i in lookup.misses:
+        cache.put(lookup.keys[i], lookup.probabilities[i], lookup.model_version)
+
+def normalize_for_backend(images):
+    """Normalize uint8 images with the scale/offset the serving model was trained with."""
+    normalization = get_backend().input_normalization
+    return normalize_images(images, scale=normalization["scale"], offset=normalization["offset"])
+
+def cached_predict(images, run_inference):
+    """
+    Predict uint8 images, running inference only for cache misses.
+    
+    Args:
+        images: uint8 array of shape (N, 28, 28)
+        run_inference: Callable mapping a normalized (M, 28, 28, 1) batch to (M, 10) probabilities
+    
+    Returns:
+        (N, 10) array of probabilities
+    """
+    lookup = lookup_cached(images)
+    if lookup.misses:
+        with timed("preprocess"):
+            batch = normalize_for_backend(images[lookup.misses])
+        start_time = time.perf_counter()
+        miss_probabilities = run_inference(batch)
+        inference_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(f"Inference ({get_backend().name}, model {lookup.model_version}) took {inference_ms:.2f} ms "
+                    f"for {len(lookup.misses)} of {len(images)} images")
+        store_misses(lookup, miss_probabilities)
+    
+    return lookup.probabilities
+
+def predict_chunked(batch):
+    """Run an already assembled batch directly through the backend in model-sized chunks."""
+    backend = get_backend()
+    chunk_size = batcher.max_batch_size
+    results = []
+    for i in range(0, len(batch), chunk_size):
+        chunk = batch[i:i + chunk_size]
+        BATCH_SIZE.observe(len(chunk))
+        with timed("inference"):
+            results.append(backend.predict(chunk))
+    return np.concatenate(results)
+
+def format_prediction(probabilities):
+    """Turn a probability vector into the API's response structure."""
+    results = [
+        {"class": class_name, "probability": float(probability)}
+        for class_name, probability in zip(CLASS_NAMES, probabilities)
+    ]
+    
+    # Sort by probability (highest first)
+    results.sort(key=lambda x: x["probability"], reverse=True)
+    
+    top_prediction = results[0]
+    return {
+        "prediction": top_prediction["class"],
+        "confidence": top_prediction["probability"],
+        "all_results": results
+    }
@@ -0,0 +1,98 @@
+import io
+import base64
+import numpy as np
+
+# Binary content types understood by the service, in addition to image uploads
+NPY_MIMETYPES = ("application/x-npy", "application/npy")
+RAW_MIMETYPE = "application/octet-stream"
+JSON_MIMETYPE = "application/json"
+
+# Response formats offered during content negotiation; JSON stays the default
+RESPONSE_MIMETYPES = (JSON_MIMETYPE, NPY_MIMETYPES[0], RAW_MIMETYPE)
+
+IMAGE_SHAPE = (28, 28)
+IMAGE_PIXELS = IMAGE_SHAPE[0] * IMAGE_SHAPE[1]
+
+
+def negotiate_response_mimetype(accept_header):
+    """
+    Pick a response type from a raw Accept header, for servers without a parser of their own.
+
+    Returns the highest-quality entry of RESPONSE_MIMETYPES, preferring
+    earlier entries on ties; JSON when nothing matches.
+    """
+    best, best_quality = JSON_MIMETYPE, 0.0
+    for entry in (accept_header or "").split(","):
+        mimetype, _, params = entry.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if mimetype in ("*/*", "application/*"):
+            mimetype = JSON_MIMETYPE
+        if mimetype in RESPONSE_MIMETYPES and (
+                quality > best_quality or
+                (quality == best_quality and RESPONSE_MIMETYPES.index(mimetype) < RESPONSE_MIMETYPES.index(best))):
+            best, best_quality = mimetype, quality
+    return best
+
+
+def is_tensor_payload(mimetype):
+    """Return True if a request body is a binary tensor rather than an image upload."""
+    return mimetype in NPY_MIMETYPES or mimetype == RAW_MIMETYPE
+
+
+def _is_image_batch_shape(shape):
+    """Return True for the npy layouts decode_tensor_payload accepts, with N > 0."""
+    if shape == IMAGE_SHAPE:
+        return True
+    if not shape or shape[0] == 0:
+        return False
+    return shape[1:] in (IMAGE_SHAPE, IMAGE_SHAPE + (1,), (IMAGE_PIXELS,))
+
+
+def decode_tensor_payload(body, mimetype):
+    """
+    Decode a binary request body into uint8 images.
+
+    Accepted payloads:
+        application/octet-stream: N * 784 raw uint8 pixels, row-major
+        application/x-npy: a uint8 .npy array shaped (28, 28), (N, 28, 28),
+            (N, 28, 28, 1) or (N, 784)
+
+    Returns:
+        uint8 array of shape (N, 28, 28), viewing the request body where possible
+    """
+    if mimetype == RAW_MIMETYPE:
+        if not body or len(body) % IMAGE_PIXELS:
+            raise ValueError(f"Raw payload must be a non-empty multiple of {IMAGE_PIXELS} bytes, got {len(body)}")
+        return np.frombuffer(body, dtype=np.uint8).reshape(-1, *IMAGE_SHAPE)
+
+    array = np.load(io.BytesIO(body), allow_pickle=False)
+    if array.dtype != np.uint8:
+        raise ValueError(f"npy payload must be uint8, got {array.dtype}")
+    if not _is_image_batch_shape(array.shape):
+        raise ValueError(f"npy payload shape {array.shape} is not one of (28, 28), (N, 28, 28), "
+                         f"(N, 28, 28, 1) or (N, 784)")
+    return array.reshape(-1, *IMAGE_SHAPE)
+
+
+def encode_probabilities(probabilities, mimetype):
+    """Serialize a probability array as .npy or raw little-endian float32 bytes."""
+    probabilities = np.ascontiguousarray(probabilities, dtype='<f4')
+    if mimetype == RAW_MIMETYPE:
+        return probabilities.tobytes()
+
+    buffer = io.BytesIO()
+    np.save(buffer, probabilities, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def encode_b64_instances(images):
+    """Encode uint8 images as Vertex AI `{"b64": ...}` instances, one per image."""
+    images = np.ascontiguousarray(images, dtype=np.uint8)
+    return [{"b64": base64.b64encode(image.tobytes()).decode('ascii')} for image in images]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stage a training export into the serving image's build context.
+
+The Dockerfile copies the build context's model/ directory (or the
+directory named by --build-arg MODEL_EXPORT) into the image as
+/app/model. This script fills model/ from one
+`fashion_mnist_model_<timestamp>` export written by the training job,
+keeping the export's layout (model/ SavedModel, model.tflite,
+metadata.json) and only the files the chosen backend needs:
+
+    python stage_model.py --export ../../artifacts/custom_model/fashion_mnist_model_20250101-120000
+    docker build -t fashion-mnist-serving .
+
+Without --export the newest export under --exports-dir is staged. Exports
+in Cloud Storage are copied down first, e.g.
+gsutil -m cp -r gs://fashion-mnist-dev/custom-model/fashion_mnist_model_<timestamp> ../../artifacts/custom_model/
+
+--backend tflite stages only model.tflite and metadata.json, for images
+built with requirements-tflite.txt; --backend vertex stages an empty
+model/, since that backend forwards requests to an endpoint.
+"""
+
+import os
+import glob
+import shutil
+import argparse
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_EXPORTS_DIR = os.path.join(SERVICE_DIR, "..", "..", "artifacts", "custom_model")
+DEFAULT_OUTPUT_DIR = os.path.join(SERVICE_DIR, "model")
+
+# Files of an export each backend reads
+BACKEND_FILES = {
+    "local": ("model", "metadata.json", "model.tflite"),
+    "tflite": ("model.tflite", "metadata.json"),
+    "vertex": ()
+}
+REQUIRED_FILES = {"local": "model/saved_model.pb", "tflite": "model.tflite"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Copy a training export into the Docker build context")
+    parser.add_argument("--export", type=str, default=None,
+                        help="Export directory to stage (default: newest fashion_mnist_model_* in --exports-dir)")
+    parser.add_argument("--exports-dir", type=str, default=DEFAULT_EXPORTS_DIR,
+                        help="Directory holding fashion_mnist_model_* exports")
+    parser.add_argument("--backend", type=str, default="local", choices=sorted(BACKEND_FILES),
+                        help="INFERENCE_BACKEND the image is built for")
+    parser.add_argument("--output-dir", type=str, default=DEFAULT_OUTPUT_DIR,
+                        help="Staging directory inside the build context")
+    return parser.parse_args()
+
+
+def find_export(exports_dir):
+    """Newest fashion_mnist_model_* export in `exports_dir`."""
+    candidates = sorted(path for path in glob.glob(os.path.join(exports_dir, "fashion_mnist_model_*"))
+                        if os.path.isdir(path))
+    if not candidates:
+        raise FileNotFoundError(f"No fashion_mnist_model_* exports in {exports_dir}")
+    return candidates[-1]
+
+
+def stage_export(export_dir, output_dir, backend):
+    """
+    Replace `output_dir` with the files of `export_dir` that `backend` needs.
+
+    Returns:
+        list: Names of the staged files and directories
+    """
+    required = REQUIRED_FILES.get(backend)
+    if required and not os.path.exists(os.path.join(export_dir, required)):
+        raise FileNotFoundError(f"{export_dir} has no {required}, which the {backend} backend needs")
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    staged = []
+    for name in BACKEND_FILES[backend]:
+        source = os.path.join(export_dir, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(output_dir, name))
+        elif os.path.exists(source):
+            shutil.copy2(source, os.path.join(output_dir, name))
+        else:
+            continue
+        staged.append(name)
+    return staged
+
+
+def main():
+    args = parse_args()
+    export_dir = args.export
+    if export_dir is None and args.backend != "vertex":
+        export_dir = find_export(args.exports_dir)
+
+    staged = stage_export(export_dir, args.output_dir, args.backend)
+    if staged:
+        print(f"Staged {staged} from {export_dir} into {args.output_dir}")
+    else:
+        print(f"Staged an empty model directory into {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app modules import each other by bare name, as they do when run from app/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+# Scripts that run against a live setup on import, not pytest modules
+collect_ignore = ["test_local.py"]
@@ -0,0 +1,149 @@
+"""
+Load test for the prediction service.
+
+Sends concurrent multipart uploads to /predict on one or more running
+servers and reports throughput and latency percentiles as JSON, e.g. to
+compare the Flask and ASGI entry points side by side:
+
+    gunicorn --bind 0.0.0.0:8080 --workers 1 --threads 8 --timeout 0 main:app
+    uvicorn asgi:app --host 0.0.0.0 --port 8081
+    python load_test.py http://localhost:8080 http://localhost:8081 \
+        --concurrency 64 --requests 2000 --slow-upload-ms 200
+
+--slow-upload-ms trickles each request body over that many milliseconds,
+simulating slow mobile clients that tie up a server thread per connection.
+"""
+
+import io
+import json
+import time
+import uuid
+import argparse
+import http.client
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the Fashion MNIST prediction service')
+    parser.add_argument('urls', nargs='+', help='Base URLs of running servers')
+    parser.add_argument('--image', type=str, default=None, help='Image to upload (default: synthetic 64x64 PNG)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per server')
+    parser.add_argument('--slow-upload-ms', type=float, default=0, help='Spread each upload over this many ms')
+    parser.add_argument('--unique', action='store_true', help='Make every image unique to bypass the prediction cache')
+    return parser.parse_args()
+
+
+def load_image_bytes(path):
+    if path:
+        with open(path, 'rb') as f:
+            return f.read()
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 256, (64, 64), dtype=np.uint8)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def unique_png(counter):
+    # Vary a few pixels so the 28x28 cache key differs per request
+    pixels = np.zeros((28, 28), dtype=np.uint8)
+    pixels.flat[:8] = np.frombuffer(counter.to_bytes(8, 'little'), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def multipart_body(image_bytes):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="image.png"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode() + image_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def send_request(url, body, content_type, slow_upload_s):
+    """POST one request and return its latency in seconds."""
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=120)
+    start = time.perf_counter()
+    try:
+        connection.putrequest('POST', '/predict')
+        connection.putheader('Content-Type', content_type)
+        connection.putheader('Content-Length', str(len(body)))
+        connection.endheaders()
+
+        if slow_upload_s > 0:
+            chunks = 10
+            step = max(1, len(body) // chunks)
+            for offset in range(0, len(body), step):
+                connection.send(body[offset:offset + step])
+                time.sleep(slow_upload_s / chunks)
+        else:
+            connection.send(body)
+
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        return time.perf_counter() - start
+    finally:
+        connection.close()
+
+
+def run_load(url, args, image_bytes):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker(_):
+        nonlocal errors
+        with lock:
+            index = next(counter)
+        body, content_type = multipart_body(unique_png(index) if args.unique else image_bytes)
+        try:
+            latency = send_request(url, body, content_type, args.slow_upload_ms / 1000.0)
+            with lock:
+                latencies.append(latency)
+        except Exception:
+            with lock:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "url": url,
+        "requests": args.requests,
+        "errors": errors,
+        "concurrency": args.concurrency,
+        "slow_upload_ms": args.slow_upload_ms,
+        "elapsed_s": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+            "p95": float(np.percentile(latencies_ms, 95)) if len(latencies) else None,
+            "p99": float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+            "max": float(latencies_ms.max()) if len(latencies) else None
+        }
+    }
+
+
+def main():
+    args = parse_args()
+    image_bytes = load_image_bytes(args.image)
+
+    results = [run_load(url, args, image_bytes) for url in args.urls]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Cold-start benchmark for the prediction service.
+
+Starts the server from scratch several times and measures, per run:
+  - seconds until the liveness route (/) answers
+  - seconds until the readiness route (/ready) answers 200
+  - latency of the first /predict once ready
+
+Each invocation appends one JSON line to --history so cold-start time can be
+tracked across commits:
+
+    python startup_benchmark.py --runs 5 --history startup_history.jsonl
+    python startup_benchmark.py --command "uvicorn asgi:app --port {port}"
+"""
+
+import os
+import json
+import time
+import shlex
+import argparse
+import datetime
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+DEFAULT_COMMAND = "gunicorn --bind 127.0.0.1:{port} --workers 1 --threads 8 --timeout 0 main:app"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure prediction service cold-start time')
+    parser.add_argument('--command', type=str, default=DEFAULT_COMMAND, help='Server command; {port} is substituted')
+    parser.add_argument('--port', type=int, default=8090, help='Port to serve on')
+    parser.add_argument('--runs', type=int, default=3, help='Number of cold starts')
+    parser.add_argument('--timeout', type=float, default=300, help='Seconds to wait for readiness')
+    parser.add_argument('--history', type=str, default=None, help='JSON-lines file to append the summary to')
+    return parser.parse_args()
+
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def wait_for(url, start_time, timeout, expected=(200,)):
+    while time.perf_counter() - start_time < timeout:
+        if get_status(url) in expected:
+            return time.perf_counter() - start_time
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not available after {timeout} s")
+
+
+def first_prediction_ms(base_url):
+    request = urllib.request.Request(
+        f"{base_url}/predict",
+        data=bytes(28 * 28),
+        headers={"Content-Type": "application/octet-stream"}
+    )
+    start_time = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+    return (time.perf_counter() - start_time) * 1000
+
+
+def cold_start(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    command = shlex.split(args.command.format(port=args.port))
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command, cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Liveness answers 200 whatever the readiness state
+        live_s = wait_for(f"{base_url}/", start_time, args.timeout)
+        ready_s = wait_for(f"{base_url}/ready", start_time, args.timeout)
+        predict_ms = first_prediction_ms(base_url)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    return {"live_s": live_s, "ready_s": ready_s, "first_predict_ms": predict_ms}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        result = cold_start(args)
+        print(f"Run {i + 1}/{args.runs}: live {result['live_s']:.2f} s, ready {result['ready_s']:.2f} s, "
+              f"first predict {result['first_predict_ms']:.1f} ms")
+        runs.append(result)
+
+    summary = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "commit": git_commit(),
+        "command": args.command,
+        "backend": os.environ.get("INFERENCE_BACKEND", "local"),
+        "runs": runs,
+        "median": {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.history:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Tests for the MicroBatcher used by /predict."""
+
+import threading
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+def image(value):
+    return np.full((28, 28, 1), value, dtype=np.float32)
+
+
+class RecordingModel:
+    """Returns each image's first pixel as every probability, and records the batch sizes."""
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self.lock:
+            self.batch_sizes.append(len(batch))
+        return np.repeat(batch[:, 0, 0, :], 10, axis=1)
+
+
+def test_concurrent_requests_share_a_forward_pass():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=2000)
+
+    futures = [batcher.submit(image(i)) for i in range(8)]
+    results = [future.result(timeout=10) for future in futures]
+
+    assert model.batch_sizes == [8]
+    for i, probabilities in enumerate(results):
+        np.testing.assert_array_equal(probabilities, np.full(10, i, dtype=np.float32))
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=50)
+
+    futures = [batcher.submit(image(i)) for i in range(10)]
+    results = [future.result(timeout=10) for future in futures]
+
+    assert sum(model.batch_sizes) == 10
+    assert max(model.batch_sizes) <= 4
+    assert [float(probabilities[0]) for probabilities in results] == list(range(10))
+
+
+def test_lone_request_is_not_held_past_max_wait():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=32, max_wait_ms=1)
+
+    probabilities = batcher.predict(image(3), timeout=10)
+
+    assert model.batch_sizes == [1]
+    assert float(probabilities[0]) == 3
+
+
+def test_inference_error_fails_every_request_in_the_batch():
+    def failing_model(batch):
+        raise RuntimeError("model unavailable")
+
+    batcher = MicroBatcher(failing_model, max_batch_size=4, max_wait_ms=500)
+    futures = [batcher.submit(image(i)) for i in range(4)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model unavailable"):
+            future.result(timeout=10)
+
+    # The scheduler thread keeps serving after a failure
+    batcher.predict_fn = RecordingModel()
+    assert float(batcher.predict(image(5), timeout=10)[0]) == 5
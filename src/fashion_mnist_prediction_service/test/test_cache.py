@@ -0,0 +1,106 @@
+"""Tests for the prediction cache and its invalidation."""
+
+import numpy as np
+import pytest
+
+import cache as cache_module
+import service
+from cache import PredictionCache
+
+
+def image(value):
+    return np.full((28, 28), value, dtype=np.uint8)
+
+
+def probabilities(value):
+    return np.full(10, value, dtype=np.float32)
+
+
+def test_hit_after_put_for_same_pixels():
+    cache = PredictionCache(max_entries=10)
+    cache.put(cache.key(image(1)), probabilities(0.1), "v1")
+
+    # A different array with the same pixels shares the entry
+    np.testing.assert_array_equal(cache.get(cache.key(image(1).copy()), "v1"), probabilities(0.1))
+    assert cache.get(cache.key(image(2)), "v1") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_model_version_change_drops_every_entry():
+    cache = PredictionCache(max_entries=10)
+    for value in range(3):
+        cache.put(cache.key(image(value)), probabilities(value), "v1")
+
+    assert cache.get(cache.key(image(0)), "v2") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["model_version"] == "v2"
+
+    # Entries stored under the new version are served again
+    cache.put(cache.key(image(0)), probabilities(5), "v2")
+    np.testing.assert_array_equal(cache.get(cache.key(image(0)), "v2"), probabilities(5))
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    cache.put(cache.key(image(1)), probabilities(0.1), "v1")
+
+    now[0] += 59
+    assert cache.get(cache.key(image(1)), "v1") is not None
+    now[0] += 2
+    assert cache.get(cache.key(image(1)), "v1") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put(cache.key(image(0)), probabilities(0), "v1")
+    cache.put(cache.key(image(1)), probabilities(1), "v1")
+    cache.get(cache.key(image(0)), "v1")
+    cache.put(cache.key(image(2)), probabilities(2), "v1")
+
+    assert cache.get(cache.key(image(1)), "v1") is None
+    assert cache.get(cache.key(image(0)), "v1") is not None
+    assert cache.evictions == 1
+
+
+def test_disabled_cache_never_hits():
+    cache = PredictionCache(max_entries=0)
+    cache.put(cache.key(image(0)), probabilities(0), "v1")
+    assert cache.get(cache.key(image(0)), "v1") is None
+    assert not cache.stats()["enabled"]
+
+
+class FakeBackend:
+    name = "fake"
+    input_normalization = {"scale": 255.0, "offset": 0.0}
+
+    def __init__(self, version):
+        self.version = version
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(service, "cache", PredictionCache(max_entries=100))
+
+
+def test_cached_predict_reruns_inference_after_a_model_update(monkeypatch, fresh_cache):
+    images = np.stack([image(1), image(2)])
+    calls = []
+
+    def run_inference(batch):
+        calls.append(len(batch))
+        return np.tile(probabilities(len(calls)), (len(batch), 1))
+
+    monkeypatch.setattr(service, "get_backend", lambda: FakeBackend("v1"))
+    first = service.cached_predict(images, run_inference)
+    again = service.cached_predict(images, run_inference)
+    assert calls == [2]
+    np.testing.assert_array_equal(again, first)
+
+    # A new export is served: nothing computed by the old model is reused
+    monkeypatch.setattr(service, "get_backend", lambda: FakeBackend("v2"))
+    updated = service.cached_predict(images, run_inference)
+    assert calls == [2, 2]
+    np.testing.assert_array_equal(updated, np.tile(probabilities(2), (2, 1)))
@@ -0,0 +1,220 @@
+"""Tests for the Flask and ASGI entry points, served by a stub backend."""
+
+import io
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+from prometheus_client import REGISTRY
+from starlette.testclient import TestClient
+
+import service
+from cache import PredictionCache
+from inference import InferenceBackend
+from wire import NPY_MIMETYPES
+
+
+class StubBackend(InferenceBackend):
+    """Predicts class (mean pixel * 10) with probability 0.91 and counts forward passes."""
+
+    name = "stub"
+    version = "stub-1"
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, batch):
+        self.batches.append(len(batch))
+        classes = np.clip((batch.reshape(len(batch), -1).mean(axis=1) * 10).astype(int), 0, 9)
+        probabilities = np.full((len(batch), 10), 0.01, dtype=np.float32)
+        probabilities[np.arange(len(batch)), classes] = 0.91
+        return probabilities
+
+
+@pytest.fixture(scope="module")
+def apps():
+    # Import the entry points without the real warm-up, which would load TensorFlow
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(service, "start_warmup", lambda: None)
+        import main
+        import asgi
+    return main.app, asgi.app
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = StubBackend()
+    monkeypatch.setattr(service, "get_backend", lambda: backend)
+    monkeypatch.setattr(service, "cache", PredictionCache(max_entries=100))
+    ready = threading.Event()
+    ready.set()
+    monkeypatch.setattr(service.readiness, "ready", ready)
+    return backend
+
+
+@pytest.fixture
+def flask_client(apps, backend):
+    return apps[0].test_client()
+
+
+@pytest.fixture
+def asgi_client(apps, backend):
+    # Not entered as a context manager, so the lifespan warm-up never runs
+    return TestClient(apps[1])
+
+
+def json_of(response):
+    """Response body as JSON, from either test client."""
+    return response.get_json() if hasattr(response, "get_json") else response.json()
+
+
+def text_of(response):
+    """Response body as text, from either test client."""
+    return response.get_data(as_text=True) if hasattr(response, "get_data") else response.text
+
+
+def post_body(client, path, body, content_type):
+    """POST a raw body with either test client."""
+    if isinstance(client, TestClient):
+        return client.post(path, content=body, headers={"Content-Type": content_type})
+    return client.post(path, data=body, content_type=content_type)
+
+
+def png_bytes(value):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((28, 28), value, dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def test_flask_predict(flask_client, backend):
+    response = flask_client.post('/predict', data={"file": (io.BytesIO(png_bytes(160)), "shirt.png")})
+
+    assert response.status_code == 200
+    assert response.get_json()["prediction"] == "Shirt"
+    assert response.get_json()["confidence"] == pytest.approx(0.91)
+    assert backend.batches == [1]
+
+
+def test_flask_predict_rejects_missing_file(flask_client, backend):
+    response = flask_client.post('/predict', data={})
+    assert response.status_code == 400
+    assert backend.batches == []
+
+
+def test_flask_predict_batch(flask_client, backend):
+    images = np.stack([np.full((28, 28), value, dtype=np.uint8) for value in (0, 26, 128)])
+    response = flask_client.post('/predict_batch', data=npy_bytes(images),
+                                 content_type=NPY_MIMETYPES[0], headers={"Accept": NPY_MIMETYPES[0]})
+
+    assert response.status_code == 200
+    assert response.headers["X-Class-Names"].split(",")[1] == "Trouser"
+    probabilities = np.load(io.BytesIO(response.data))
+    assert probabilities.shape == (3, 10)
+    np.testing.assert_array_equal(probabilities.argmax(axis=1), [0, 1, 5])
+    assert backend.batches == [3]
+
+
+def test_flask_predict_batch_rejects_bad_shapes(flask_client, backend):
+    response = flask_client.post('/predict_batch', data=npy_bytes(np.zeros((56, 28), dtype=np.uint8)),
+                                 content_type=NPY_MIMETYPES[0])
+    assert response.status_code == 400
+
+
+def test_asgi_predict(asgi_client, backend):
+    response = asgi_client.post('/predict', files={"file": ("sneaker.png", png_bytes(190), "image/png")})
+
+    assert response.status_code == 200
+    assert response.json()["prediction"] == "Sneaker"
+    assert backend.batches == [1]
+
+
+def test_asgi_predict_tensor_payload(asgi_client, backend):
+    response = asgi_client.post('/predict', content=np.full((28, 28), 230, dtype=np.uint8).tobytes(),
+                                headers={"Content-Type": "application/octet-stream",
+                                         "Accept": "application/octet-stream"})
+
+    assert response.status_code == 200
+    probabilities = np.frombuffer(response.content, dtype='<f4')
+    assert probabilities.argmax() == 9
+
+
+@pytest.mark.parametrize("app", ["flask", "asgi"])
+def test_ready_is_503_until_warmed(request, app, backend, monkeypatch):
+    client = request.getfixturevalue(f"{app}_client")
+    monkeypatch.setattr(service.readiness, "ready", threading.Event())
+
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert json_of(response)["ready"] is False
+
+    service.readiness.ready.set()
+    assert client.get('/ready').status_code == 200
+
+
+def test_asgi_predict_is_503_until_warmed(asgi_client, backend, monkeypatch):
+    monkeypatch.setattr(service.readiness, "ready", threading.Event())
+
+    response = asgi_client.post('/predict', files={"file": ("shirt.png", png_bytes(160), "image/png")})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert backend.batches == []
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.parametrize("app", ["flask", "asgi"])
+def test_metrics_exposition(request, app, backend):
+    client = request.getfixturevalue(f"{app}_client")
+    client.get('/')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    body = text_of(response)
+    assert 'prediction_requests_total{route="/",status="200"}' in body
+    assert 'prediction_stage_seconds_bucket{le="0.0001",stage="total"}' in body
+    # Scrapes are not counted as requests
+    assert 'route="/metrics"' not in body
+
+
+@pytest.mark.parametrize("app", ["flask", "asgi"])
+def test_requests_and_cache_hits_are_counted(request, app, backend):
+    client = request.getfixturevalue(f"{app}_client")
+    before = {name: sample(name) for name in
+              ("prediction_images_total", "prediction_cache_hits_total", "prediction_cache_misses_total")}
+    requests_before = sample("prediction_requests_total", route="/predict", status="200")
+
+    for _ in range(3):
+        response = post_body(client, '/predict', np.full((28, 28), 7, dtype=np.uint8).tobytes(),
+                             "application/octet-stream")
+        assert response.status_code == 200
+
+    assert backend.batches == [1]
+    assert sample("prediction_requests_total", route="/predict", status="200") - requests_before == 3
+    assert sample("prediction_images_total") - before["prediction_images_total"] == 3
+    assert sample("prediction_cache_misses_total") - before["prediction_cache_misses_total"] == 1
+    assert sample("prediction_cache_hits_total") - before["prediction_cache_hits_total"] == 2
+
+
+@pytest.mark.parametrize("app", ["flask", "asgi"])
+def test_errors_are_counted_by_route_and_status(request, app, backend):
+    client = request.getfixturevalue(f"{app}_client")
+    before = sample("prediction_errors_total", route="/predict", status="400")
+    unmatched_before = sample("prediction_errors_total", route="unmatched", status="404")
+
+    assert post_body(client, '/predict', b"\0" * 100, "application/octet-stream").status_code == 400
+    assert client.get('/no-such-route').status_code == 404
+
+    assert sample("prediction_errors_total", route="/predict", status="400") - before == 1
+    assert sample("prediction_errors_total", route="unmatched", status="404") - unmatched_before == 1
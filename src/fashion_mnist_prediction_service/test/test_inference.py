@@ -0,0 +1,82 @@
+"""Tests for locating a training export and its metadata, and for the TFLite backend."""
+
+import json
+
+import numpy as np
+import pytest
+
+from inference import resolve_model_dir, resolve_tflite_path, load_metadata, export_name, TFLiteBackend
+
+
+def write_export(export_dir, version=None):
+    """The layout written by trainer.train.save_model."""
+    (export_dir / "model").mkdir(parents=True)
+    (export_dir / "model" / "saved_model.pb").write_bytes(b"")
+    (export_dir / "model.tflite").write_bytes(b"")
+    metadata = {"framework": "tensorflow", "input_normalization": {"scale": 255.0, "offset": 0.0}}
+    if version is not None:
+        metadata["version"] = version
+    (export_dir / "metadata.json").write_text(json.dumps(metadata))
+
+
+def test_resolves_the_saved_model_of_an_export(tmp_path):
+    write_export(tmp_path / "fashion_mnist_model_20260101")
+    export_dir = tmp_path / "fashion_mnist_model_20260101"
+    assert resolve_model_dir(str(export_dir)) == str(export_dir / "model")
+    assert resolve_model_dir(str(export_dir / "model")) == str(export_dir / "model")
+
+
+def test_resolves_the_newest_export_under_a_parent(tmp_path):
+    write_export(tmp_path / "fashion_mnist_model_20260101")
+    write_export(tmp_path / "fashion_mnist_model_20260202")
+    assert resolve_model_dir(str(tmp_path)) == str(tmp_path / "fashion_mnist_model_20260202" / "model")
+    assert resolve_tflite_path(str(tmp_path)) == str(tmp_path / "fashion_mnist_model_20260202" / "model.tflite")
+
+
+def test_missing_saved_model_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        resolve_model_dir(str(tmp_path))
+
+
+def test_metadata_is_read_from_beside_the_saved_model(tmp_path):
+    write_export(tmp_path / "export", version="20260101T000000Z-abcd1234")
+    model_dir = resolve_model_dir(str(tmp_path / "export"))
+    assert load_metadata(model_dir)["version"] == "20260101T000000Z-abcd1234"
+    assert load_metadata(str(tmp_path / "export"))["version"] == "20260101T000000Z-abcd1234"
+
+
+def test_export_name_is_the_fallback_version(tmp_path):
+    write_export(tmp_path / "fashion_mnist_model_20260101")
+    model_dir = resolve_model_dir(str(tmp_path))
+    assert "version" not in load_metadata(model_dir)
+    assert export_name(model_dir) == "fashion_mnist_model_20260101"
+    assert export_name(str(tmp_path / "saved_model_dir")) == "saved_model_dir"
+
+
+@pytest.fixture(scope="module")
+def tflite_export(tmp_path_factory):
+    tf = pytest.importorskip("tensorflow")
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.layers.Flatten(input_shape=(28, 28, 1)),
+        tf.keras.layers.Dense(10, activation="softmax")
+    ])
+    export_dir = tmp_path_factory.mktemp("export")
+    (export_dir / "model.tflite").write_bytes(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+    return model, export_dir
+
+
+def test_tflite_pads_batches_to_fixed_buckets(tflite_export):
+    model, export_dir = tflite_export
+    backend = TFLiteBackend(str(export_dir), max_batch_size=20)
+    assert backend.batch_buckets == [1, 8, 20]
+
+    images = np.random.default_rng(0).random((45, 28, 28, 1)).astype(np.float32)
+    expected = model.predict(images, verbose=0)
+    for batch_size in (1, 3, 8, 13, 20, 45, 5):
+        probabilities = backend.predict(images[:batch_size])
+        assert probabilities.shape == (batch_size, 10)
+        np.testing.assert_allclose(probabilities, expected[:batch_size], rtol=1e-5, atol=1e-6)
+
+    # Every batch size ran on one of the interpreters allocated per bucket
+    assert sorted(backend._interpreters) == [1, 8, 20]
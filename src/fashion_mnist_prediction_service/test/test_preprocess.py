@@ -0,0 +1,103 @@
+"""Tests for archive uploads and image decoding."""
+
+import io
+import tarfile
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from preprocess import ArchiveLimitError, decode_images, extract_archive
+
+
+def png_bytes(value):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((28, 28), value, dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def zip_upload(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def tar_upload(files, symlinks=(), mode='w:gz'):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        for name, target in symlinks:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            archive.addfile(info)
+    buffer.seek(0)
+    return buffer
+
+
+IMAGES = {f"img_{i}.png": png_bytes(i * 10) for i in range(5)}
+
+
+@pytest.mark.parametrize("upload", [zip_upload, tar_upload])
+def test_extracts_image_members_in_order(upload):
+    files = dict(IMAGES, **{"__MACOSX/._img_0.png": b"junk", ".DS_Store": b"junk"})
+    members = extract_archive(upload(files))
+
+    assert [name for name, _ in members] == list(IMAGES)
+    images = decode_images([stream for _, stream in members])
+    np.testing.assert_array_equal(images[:, 0, 0], [0, 10, 20, 30, 40])
+
+
+@pytest.mark.parametrize("upload", [zip_upload, tar_upload])
+def test_rejects_archives_with_too_many_images(upload):
+    with pytest.raises(ArchiveLimitError, match="Too many images"):
+        extract_archive(upload(IMAGES), max_members=4)
+    assert len(extract_archive(upload(IMAGES), max_members=5)) == 5
+
+
+@pytest.mark.parametrize("upload", [zip_upload, tar_upload])
+def test_rejects_oversized_members(upload):
+    files = dict(IMAGES, **{"huge.png": b"\0" * 4096})
+    with pytest.raises(ArchiveLimitError, match="huge.png"):
+        extract_archive(upload(files), max_member_bytes=1024)
+
+
+def test_zip_limits_are_checked_before_reading(monkeypatch):
+    reads = []
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda self, name: reads.append(name))
+    with pytest.raises(ArchiveLimitError):
+        extract_archive(zip_upload(IMAGES), max_members=2)
+    assert reads == []
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_corrupt_zip_is_a_client_error(compression):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as archive:
+        archive.writestr("img_0.png", png_bytes(0))
+    data = bytearray(buffer.getvalue())
+    # Damage the member data; the local header is 30 bytes plus the name
+    for offset in range(30 + len("img_0.png"), 30 + len("img_0.png") + 16):
+        data[offset] ^= 0xff
+
+    with pytest.raises(ValueError, match="Corrupt zip archive") as error:
+        extract_archive(io.BytesIO(bytes(data)))
+    assert not isinstance(error.value, ArchiveLimitError)
+
+
+def test_tar_skips_links_and_other_special_members():
+    members = extract_archive(tar_upload(IMAGES, symlinks=[("link.png", "/etc/passwd")], mode='w'))
+    assert [name for name, _ in members] == list(IMAGES)
+
+
+def test_plain_image_is_not_an_archive():
+    upload = io.BytesIO(png_bytes(0))
+    assert extract_archive(upload) is None
+    assert upload.tell() == 0
@@ -0,0 +1,97 @@
+"""Tests for the binary request and response formats."""
+
+import io
+import base64
+
+import numpy as np
+import pytest
+
+from wire import (decode_tensor_payload, encode_probabilities, encode_b64_instances,
+                  negotiate_response_mimetype, is_tensor_payload, JSON_MIMETYPE, NPY_MIMETYPES, RAW_MIMETYPE)
+
+
+def npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def images():
+    return np.random.default_rng(0).integers(0, 256, (3, 28, 28), dtype=np.uint8)
+
+
+def test_decode_raw_pixels(images):
+    decoded = decode_tensor_payload(images.tobytes(), RAW_MIMETYPE)
+    assert decoded.dtype == np.uint8
+    np.testing.assert_array_equal(decoded, images)
+
+
+@pytest.mark.parametrize("shape", [(28, 28), (3, 28, 28), (3, 28, 28, 1), (3, 784)])
+def test_decode_npy_shapes(images, shape):
+    array = images[:1].reshape(shape) if shape == (28, 28) else images.reshape(shape)
+    decoded = decode_tensor_payload(npy_bytes(array), NPY_MIMETYPES[0])
+    np.testing.assert_array_equal(decoded, images[:len(decoded)])
+    assert decoded.shape[1:] == (28, 28)
+
+
+@pytest.mark.parametrize("body", [b"", b"\0" * 783, b"\0" * 785])
+def test_decode_raw_rejects_partial_images(body):
+    with pytest.raises(ValueError):
+        decode_tensor_payload(body, RAW_MIMETYPE)
+
+
+@pytest.mark.parametrize("array", [
+    np.zeros((2, 28, 28), dtype=np.float32),
+    np.zeros((2, 28, 27), dtype=np.uint8),
+    np.zeros((0, 28, 28), dtype=np.uint8),
+    np.zeros((2, 28, 28, 3), dtype=np.uint8),
+    # Right number of pixels, but not one of the accepted layouts
+    np.zeros((28, 28, 1), dtype=np.uint8),
+    np.zeros((784,), dtype=np.uint8),
+    np.zeros((1568, 1), dtype=np.uint8),
+    np.zeros((56, 28), dtype=np.uint8),
+    np.zeros((2, 1, 784), dtype=np.uint8),
+    np.zeros((2, 784, 1), dtype=np.uint8),
+    np.zeros((1, 2, 28, 28), dtype=np.uint8),
+])
+def test_decode_npy_rejects_other_arrays(array):
+    with pytest.raises(ValueError):
+        decode_tensor_payload(npy_bytes(array), NPY_MIMETYPES[0])
+
+
+def test_decode_npy_rejects_pickles():
+    with pytest.raises(ValueError):
+        decode_tensor_payload(npy_bytes(np.array([{"a": 1}], dtype=object)), NPY_MIMETYPES[0])
+
+
+def test_is_tensor_payload():
+    assert is_tensor_payload(RAW_MIMETYPE)
+    assert all(is_tensor_payload(mimetype) for mimetype in NPY_MIMETYPES)
+    assert not is_tensor_payload("image/png")
+
+
+def test_probabilities_round_trip():
+    probabilities = np.random.default_rng(0).random((4, 10)).astype(np.float32)
+    np.testing.assert_array_equal(np.load(io.BytesIO(encode_probabilities(probabilities, NPY_MIMETYPES[0]))),
+                                  probabilities)
+    raw = encode_probabilities(probabilities, RAW_MIMETYPE)
+    np.testing.assert_array_equal(np.frombuffer(raw, dtype='<f4').reshape(4, 10), probabilities)
+
+
+def test_b64_instances_round_trip(images):
+    instances = encode_b64_instances(images.reshape(3, -1))
+    decoded = [np.frombuffer(base64.b64decode(instance["b64"]), dtype=np.uint8) for instance in instances]
+    np.testing.assert_array_equal(np.stack(decoded).reshape(images.shape), images)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON_MIMETYPE),
+    ("*/*", JSON_MIMETYPE),
+    ("application/x-npy", "application/x-npy"),
+    ("application/json;q=0.5, application/octet-stream", RAW_MIMETYPE),
+    ("application/x-npy;q=0.8, application/octet-stream;q=0.8", "application/x-npy"),
+    ("text/html", JSON_MIMETYPE),
+])
+def test_negotiate_response_mimetype(accept, expected):
+    assert negotiate_response_mimetype(accept) == expected